@@ -12,6 +12,7 @@ from .extractorlist import *
 from . import example_datasets
 from .extraction_tools import load_probe_file, save_to_probe_file, read_binary, write_to_binary_dat_format,\
     write_to_h5_dataset_format, get_sub_extractors_by_property, load_extractor_from_json, load_extractor_from_dict, \
-    load_extractor_from_pickle
+    load_extractor_from_pickle, extract_unit_waveforms, compute_unit_templates, \
+    memmap_h5_dataset, read_channel_traces
 
 from .version import version as __version__
@@ -7,6 +7,7 @@ import datetime
 from copy import deepcopy
 import tempfile
 import pickle
+import warnings
 
 from .exceptions import NotDumpableExtractorError
 
@@ -24,6 +25,7 @@ class BaseExtractor:
         self._key_properties = {}
         self._properties = {}
         self._features = {}
+        self._feature_arrays = {}
         self.is_dumpable = True
         self.is_filtered = False
 
@@ -126,6 +128,8 @@ class BaseExtractor:
         '''
         Dumps recording extractor to a pickle file.
         The extractor can be re-loaded with spikeextractors.load_extractor_from_json(json_file)
+        Features stored in contiguous arrays are saved as .npy files in the '<file_name>_features' folder
+        and they are memory-mapped when the extractor is re-loaded.
 
         Parameters
         ----------
@@ -145,7 +149,9 @@ class BaseExtractor:
                 dump_dict['properties'] = self._properties
         if include_features:
             if len(self._features.keys()) > 0:
-                dump_dict['features'] = self._features
+                dump_dict['features'], feature_arrays = self._dump_feature_arrays(file_path)
+                if len(feature_arrays) > 0:
+                    dump_dict['feature_arrays'] = feature_arrays
 
         file_path.write_bytes(pickle.dumps(dump_dict))
 
@@ -227,6 +233,117 @@ class BaseExtractor:
         from .extraction_tools import cast_start_end_frame
         return cast_start_end_frame(start_frame, end_frame)
 
+    # Columnar property store: self._properties[property_name] = {'values': array, 'mask': bool array}, where the
+    # first axis of both arrays is the index of the id (channel or unit) in the extractor
+    def _get_property_entry(self, property_name, num_ids):
+        entry = self._properties.get(property_name)
+        if entry is not None and len(entry['mask']) < num_ids:
+            # ids were added after the property was set
+            pad = num_ids - len(entry['mask'])
+            values = entry['values']
+            entry['values'] = np.concatenate([values, np.zeros((pad,) + values.shape[1:], dtype=values.dtype)])
+            entry['mask'] = np.concatenate([entry['mask'], np.zeros(pad, dtype='bool')])
+        return entry
+
+    def _set_property_column(self, property_name, idxs, values, num_ids):
+        column = _to_property_column(values, len(idxs))
+        if column.ndim > 1 and not isinstance(values, np.ndarray):
+            # per-id lists/arrays are kept as they were given, not stacked in a typed array
+            column = _to_object_column(values, len(idxs))
+        entry = self._get_property_entry(property_name, num_ids)
+        if entry is None:
+            entry = {'values': np.zeros((num_ids,) + column.shape[1:], dtype=column.dtype),
+                     'mask': np.zeros(num_ids, dtype='bool')}
+            self._properties[property_name] = entry
+        stored = entry['values']
+        if stored.dtype != column.dtype or stored.shape[1:] != column.shape[1:]:
+            if stored.dtype.kind == column.dtype.kind and stored.shape[1:] == column.shape[1:] \
+                    and stored.dtype.kind != 'O':
+                stored = stored.astype(np.result_type(stored, column))
+            else:
+                # heterogeneous values are kept as they are in an object column
+                stored = _to_object_column(stored)
+                column = _to_object_column(column)
+            entry['values'] = stored
+        stored[idxs] = column
+        entry['mask'][idxs] = True
+
+    def _get_property_mask(self, property_name, idxs, num_ids):
+        entry = self._get_property_entry(property_name, num_ids)
+        if entry is None:
+            return np.zeros(len(idxs), dtype='bool')
+        return entry['mask'][idxs]
+
+    def _get_property_names(self, idxs, num_ids, shared=False):
+        property_names = []
+        for property_name in self._properties.keys():
+            mask = self._get_property_mask(property_name, idxs, num_ids)
+            if (shared and np.all(mask)) or (not shared and np.any(mask)):
+                property_names.append(property_name)
+        return property_names
+
+    # Features set for many ids at once are stored in one contiguous array (possibly a memmap):
+    # self._features[id][feature_name] are views on the slices in self._feature_arrays[feature_name]
+    def _set_feature_array(self, feature_name, values, ids, starts, ends):
+        slices = {}
+        for (id, start, end) in zip(ids, starts, ends):
+            if id not in self._features.keys():
+                self._features[id] = {}
+            self._features[id][feature_name] = values[start:end]
+            self._features[id].pop(feature_name + '_idxs', None)
+            slices[id] = (int(start), int(end))
+        self._feature_arrays[feature_name] = {'values': values, 'slices': slices}
+
+    def _detach_feature_array(self, id, feature_name):
+        # the feature of this id is no longer a slice of the contiguous array
+        for name in (feature_name, feature_name + '_idxs'):
+            if name in self._feature_arrays.keys():
+                self._feature_arrays[name]['slices'].pop(id, None)
+
+    def _dump_feature_arrays(self, file_path):
+        features = {id: dict(id_features) for (id, id_features) in self._features.items()}
+        feature_arrays = {}
+        for feature_name, feature_array in self._feature_arrays.items():
+            slices = {id: s for (id, s) in feature_array['slices'].items()
+                      if id in features.keys() and feature_name in features[id].keys()}
+            if len(slices) == 0:
+                continue
+            folder = file_path.parent / (file_path.stem + '_features')
+            if not folder.is_dir():
+                os.makedirs(str(folder))
+            npy_file = folder / (feature_name + '.npy')
+            values = feature_array['values']
+            # an array re-loaded from this same file is already saved
+            if not (isinstance(values, np.memmap) and values.filename is not None
+                    and Path(values.filename).resolve() == npy_file.resolve()):
+                np.save(str(npy_file), values)
+            for id in slices.keys():
+                del features[id][feature_name]
+            feature_arrays[feature_name] = {'file': str(npy_file.relative_to(file_path.parent)), 'slices': slices}
+        return features, feature_arrays
+
+    def _remap_property_columns(self, old_idxs, num_old_ids):
+        # old_idxs[i] is the previous row of the id now at row i (-1 for new ids)
+        old_idxs = np.asarray(old_idxs, dtype='int64')
+        has_row = old_idxs >= 0
+        for property_name in list(self._properties.keys()):
+            entry = self._get_property_entry(property_name, num_old_ids)
+            values = np.zeros((len(old_idxs),) + entry['values'].shape[1:], dtype=entry['values'].dtype)
+            mask = np.zeros(len(old_idxs), dtype='bool')
+            values[has_row] = entry['values'][old_idxs[has_row]]
+            mask[has_row] = entry['mask'][old_idxs[has_row]]
+            if np.any(mask):
+                self._properties[property_name] = {'values': values, 'mask': mask}
+            else:
+                del self._properties[property_name]
+
+    def _clear_property_column(self, property_name, idxs, num_ids):
+        entry = self._get_property_entry(property_name, num_ids)
+        if entry is not None:
+            entry['mask'][idxs] = False
+            if not np.any(entry['mask']):
+                del self._properties[property_name]
+
 
     @staticmethod
     def load_extractor_from_json(json_file):
@@ -272,6 +389,12 @@ class BaseExtractor:
             extractor._properties = d['properties']
         if 'features' in d.keys():
             extractor._features = d['features']
+        if 'feature_arrays' in d.keys():
+            for feature_name, feature_array in d['feature_arrays'].items():
+                values = np.load(str(pkl_file.parent / feature_array['file']), mmap_mode='r')
+                ids = list(feature_array['slices'].keys())
+                starts, ends = np.array(list(feature_array['slices'].values()), dtype='int64').T
+                extractor._set_feature_array(feature_name, values, ids, starts, ends)
         return extractor
 
     @staticmethod
@@ -381,6 +504,42 @@ def _check_if_dumpable(d):
         return d['dumpable']
 
 
+def _to_property_column(values, num_values):
+    # values that stack into a regular array (numbers, strings, equally shaped arrays) are stored in a typed array,
+    # anything else in a 1D object array
+    if isinstance(values, np.ndarray):
+        column = values
+    else:
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('error')
+                column = np.asarray(values)
+        except (ValueError, TypeError, Warning):
+            column = None
+    if column is None or column.dtype.kind == 'O' or column.ndim == 0 or len(column) != num_values:
+        column = _to_object_column(values, num_values)
+    return column
+
+
+def _to_property_list(column):
+    # values of typed 1D columns are returned as python scalars, like the values they were set with, any other
+    # value (object, array row) as it is stored
+    if column.ndim == 1 and column.dtype.kind != 'O':
+        return column.tolist()
+    return list(column)
+
+
+def _to_object_column(values, num_values=None):
+    if num_values is None:
+        num_values = len(values)
+    if isinstance(values, np.ndarray) and values.dtype.kind == 'O' and values.ndim == 1:
+        return values
+    column = np.empty(num_values, dtype='object')
+    for i, value in enumerate(values):
+        column[i] = value
+    return column
+
+
 def _check_json(d):
     # quick hack to ensure json writable
     for k, v in d.items():
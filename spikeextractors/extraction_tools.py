@@ -265,8 +265,41 @@ def read_binary(file, numchan, dtype, time_axis=0, offset=0):
     return samples
 
 
+def get_chunk_size(recording, chunk_size=None, chunk_mb=None, num_channels=None):
+    '''Returns the number of frames of each chunk used to iterate over a recording.
+
+    Parameters
+    ----------
+    recording: RecordingExtractor
+        The recording extractor to be chunked
+    chunk_size: None or int
+        Number of frames of each chunk. If given, it is returned as is
+    chunk_mb: None or int
+        If 'chunk_size' is None, the chunk size is computed so that each chunk is of 'chunk_mb' Mb.
+        If both 'chunk_size' and 'chunk_mb' are None, the number of frames of the recording is returned
+    num_channels: None or int
+        Number of channels in each chunk. If None, all channels of the recording are used
+
+    Returns
+    -------
+    chunk_size: int
+        Number of frames of each chunk
+    '''
+    if chunk_size is not None:
+        chunk_size = int(chunk_size)
+    elif chunk_mb is not None:
+        if num_channels is None:
+            num_channels = recording.get_num_channels()
+        n_bytes = np.dtype(recording.get_dtype()).itemsize
+        max_size = int(chunk_mb * 1e6)  # set Mb per chunk
+        chunk_size = max_size // (num_channels * n_bytes)
+    else:
+        chunk_size = recording.get_num_frames()
+    return max(chunk_size, 1)
+
+
 def write_to_binary_dat_format(recording, save_path=None, file_handle=None,
-                               time_axis=0, dtype=None, chunk_size=None, chunk_mb=500):
+                               time_axis=0, dtype=None, chunk_size=None, chunk_mb=500, n_jobs=1):
     '''Saves the traces of a recording extractor in binary .dat format.
 
     Parameters
@@ -288,6 +321,9 @@ def write_to_binary_dat_format(recording, save_path=None, file_handle=None,
         If None and 'chunk_mb' is given, the file is saved in chunks of 'chunk_mb' Mb (default 500Mb)
     chunk_mb: None or int
         Chunk size in Mb (default 500Mb)
+    n_jobs: int
+        Number of threads used to read, cast, and write chunks in parallel (default 1). If -1, all cpus are used.
+        Each chunk is written at its own offset in the file, so the output is the same as with n_jobs=1.
     '''
     assert save_path is not None or file_handle is not None, "Provide 'save_path' or 'file handle'"
 
@@ -303,53 +339,67 @@ def write_to_binary_dat_format(recording, save_path=None, file_handle=None,
             chunk_size = None
             chunk_mb = None
 
-    # set chunk size
-    if chunk_size is not None:
-        chunk_size = int(chunk_size)
-    elif chunk_mb is not None:
-        n_bytes = np.dtype(recording.get_dtype()).itemsize
-        max_size = int(chunk_mb * 1e6)  # set Mb per chunk
-        chunk_size = max_size // (recording.get_num_channels() * n_bytes)
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+    if n_jobs > 1 and (time_axis == 1 or not hasattr(os, 'pwrite')):
+        print("Parallel writing disabled: it requires 'time_axis' == 0 and os.pwrite")
+        n_jobs = 1
 
-    if chunk_size is None:
-        traces = recording.get_traces()
-        if dtype is not None:
-            traces = traces.astype(dtype)
-        if time_axis == 0:
-            traces = traces.T
-        if save_path is not None:
-            with save_path.open('wb') as f:
-                traces.tofile(f)
-        else:
-            traces.tofile(file_handle)
+    if save_path is not None:
+        f = save_path.open('wb')
     else:
-        # chunk size is not None
-        n_sample = recording.get_num_frames()
-        n_chunk = n_sample // chunk_size
-        if n_sample % chunk_size > 0:
-            n_chunk += 1
-        if save_path is not None:
-            with save_path.open('wb') as f:
-                for i in range(n_chunk):
-                    traces = recording.get_traces(start_frame=i * chunk_size,
-                                                  end_frame=min((i + 1) * chunk_size, n_sample))
-                    if dtype is not None:
-                        traces = traces.astype(dtype)
-                    if time_axis == 0:
-                        traces = traces.T
-                    f.write(traces.tobytes())
+        f = file_handle
+    try:
+        if n_jobs > 1:
+            _write_to_binary_dat_format_parallel(recording, f, dtype=dtype, chunk_size=chunk_size,
+                                                 chunk_mb=chunk_mb, n_jobs=n_jobs)
         else:
-            for i in range(n_chunk):
-                traces = recording.get_traces(start_frame=i * chunk_size,
-                                              end_frame=min((i + 1) * chunk_size, n_sample))
+            for _, _, traces in recording.iter_traces(chunk_size=chunk_size, chunk_mb=chunk_mb):
                 if dtype is not None:
                     traces = traces.astype(dtype)
                 if time_axis == 0:
                     traces = traces.T
-                file_handle.write(traces.tobytes())
+                f.write(traces.tobytes())
+    finally:
+        if save_path is not None:
+            f.close()
     return save_path
 
 
+def _write_to_binary_dat_format_parallel(recording, f, dtype, chunk_size, chunk_mb, n_jobs):
+    from concurrent.futures import ThreadPoolExecutor
+
+    num_channels = recording.get_num_channels()
+    num_frames = recording.get_num_frames()
+    if dtype is None:
+        dtype = recording.get_dtype()
+    dtype = np.dtype(dtype)
+    frame_bytes = num_channels * dtype.itemsize
+    chunk_size = get_chunk_size(recording, chunk_size=chunk_size, chunk_mb=chunk_mb)
+
+    # preallocate the file after the current position (e.g. after a header)
+    f.flush()
+    fd = f.fileno()
+    data_offset = f.tell()
+    os.ftruncate(fd, data_offset + num_frames * frame_bytes)
+
+    def _write_chunk(start_frame):
+        end_frame = min(start_frame + chunk_size, num_frames)
+        traces = recording.get_traces(start_frame=start_frame, end_frame=end_frame)
+        traces = np.ascontiguousarray(traces.astype(dtype, copy=False).T)
+        buffer = memoryview(traces.reshape(-1).view('uint8'))
+        offset = data_offset + start_frame * frame_bytes
+        while len(buffer) > 0:
+            n_written = os.pwrite(fd, buffer, offset)
+            buffer = buffer[n_written:]
+            offset += n_written
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        # consume results to propagate exceptions
+        list(executor.map(_write_chunk, range(0, num_frames, chunk_size)))
+    f.seek(data_offset + num_frames * frame_bytes)
+
+
 def write_to_h5_dataset_format(recording, dataset_path, save_path=None, file_handle=None,
                                time_axis=0, dtype=None, chunk_size=None, chunk_mb=500):
     '''Saves the traces of a recording extractor in an h5 dataset.
@@ -403,44 +453,438 @@ def write_to_h5_dataset_format(recording, dataset_path, save_path=None, file_han
     else:
         dset = file_handle.create_dataset(dataset_path, shape=(num_channels, num_frames), dtype=dtype_file)
 
-    # set chunk size
-    if chunk_size is not None:
-        chunk_size = int(chunk_size)
-    elif chunk_mb is not None:
-        n_bytes = np.dtype(recording.get_dtype()).itemsize
-        max_size = int(chunk_mb * 1e6)  # set Mb per chunk
-        chunk_size = max_size // (num_channels * n_bytes)
-
-    if chunk_size is None:
-        traces = recording.get_traces()
+    for start_frame, end_frame, traces in recording.iter_traces(chunk_size=chunk_size, chunk_mb=chunk_mb):
         if dtype is not None:
             traces = traces.astype(dtype_file)
         if time_axis == 0:
-            traces = traces.T
-        dset[:] = traces
-    else:
-        chunk_start = 0
-        # chunk size is not None
-        n_chunk = num_frames // chunk_size
-        if num_frames % chunk_size > 0:
-            n_chunk += 1
-        for i in range(n_chunk):
-            traces = recording.get_traces(start_frame=i * chunk_size,
-                                          end_frame=min((i + 1) * chunk_size, num_frames))
-            chunk_frames = traces.shape[1]
-            if dtype is not None:
-                traces = traces.astype(dtype_file)
-            if time_axis == 0:
-                dset[chunk_start:chunk_start + chunk_frames] = traces.T
-            else:
-                dset[:, chunk_start:chunk_start + chunk_frames] = traces
-            chunk_start += chunk_frames
+            dset[start_frame:end_frame] = traces.T
+        else:
+            dset[:, start_frame:end_frame] = traces
 
     if save_path is not None:
         file_handle.close()
     return save_path
 
 
+def memmap_h5_dataset(dataset):
+    '''Returns a copy-on-write memory mapped numpy array of an h5py dataset if it is stored contiguously and
+    uncompressed in its file, so that it can be sliced (also with unsorted or non-contiguous indices) without going
+    through h5py and without copies. Otherwise (chunked or compressed datasets, in-memory files, ...) the dataset is
+    returned as is. The array is writable, but writes never reach the file: they are only seen through this same
+    array, so extractors returning views of it should map the dataset for each read.
+
+    Parameters
+    ----------
+    dataset: h5py.Dataset
+        The dataset to be memory mapped. Other objects (e.g. numpy arrays) are returned as is
+
+    Returns
+    -------
+    data: numpy.ndarray or h5py.Dataset
+        The memory mapped dataset (a plain ndarray view of a numpy.memmap), or the input dataset if it cannot be
+        memory mapped
+    '''
+    if not HAVE_H5 or not isinstance(dataset, h5py.Dataset):
+        return dataset
+    if dataset.chunks is not None or dataset.compression is not None or dataset.size == 0 \
+            or dataset.dtype.kind not in 'biuf' or dataset.file.driver not in ('sec2', 'stdio') \
+            or dataset.file.userblock_size != 0:
+        return dataset
+    offset = dataset.id.get_offset()
+    if offset is None:
+        # the dataset has not been written yet
+        return dataset
+    return np.memmap(dataset.file.filename, mode='c', dtype=dataset.dtype, offset=offset,
+                     shape=dataset.shape).view(np.ndarray)
+
+
+def read_channel_traces(data, channel_idxs, start_frame=None, end_frame=None, time_axis=1, request_cost=2 ** 16):
+    '''Reads the traces of a list of channels (in any order, possibly repeated) from a 2D dataset that is efficiently
+    read by slices (e.g. an h5py dataset, which only supports increasing indices and is slow with fancy indexing).
+
+    The requested channels are split in runs of contiguous channels, and runs separated by small gaps are merged
+    into a single read: a gap of channels is read (and discarded) when reading it costs less than 'request_cost'
+    bytes, i.e. less than issuing another read request. With time_axis=0 the channels are interleaved in each frame,
+    so a gap costs its samples of one frame. The rows are returned in the requested order.
+
+    Parameters
+    ----------
+    data: array_like
+        The 2D dataset (h5py.Dataset, numpy array, ...)
+    channel_idxs: array_like
+        The indices of the channels in the channel axis of the dataset
+    start_frame: int
+        The starting frame of the traces (default 0)
+    end_frame: int
+        The ending frame of the traces (exclusive, default the number of frames of the dataset)
+    time_axis: 0 or 1
+        The axis of the frames in the dataset (default 1, i.e. the dataset is (num_channels, num_frames))
+    request_cost: int
+        Cost of a read request in bytes (default 64Kb). If 0, only contiguous channels are read together
+
+    Returns
+    -------
+    traces: numpy.ndarray
+        The traces (num_channels x num_frames). If the channels are a contiguous increasing run, this is the block
+        read from the dataset (a view for numpy arrays)
+    '''
+    channel_idxs = np.asarray(channel_idxs, dtype='int64')
+    num_frames = data.shape[time_axis]
+    start_frame = 0 if start_frame is None else int(start_frame)
+    end_frame = num_frames if end_frame is None else int(end_frame)
+
+    def _read_block(first, last):
+        if time_axis == 1:
+            return data[first:last, start_frame:end_frame]
+        else:
+            return data[start_frame:end_frame, first:last].T
+
+    if len(channel_idxs) > 0 and np.all(np.diff(channel_idxs) == 1):
+        return _read_block(channel_idxs[0], channel_idxs[-1] + 1)
+    if isinstance(data, np.ndarray):
+        if time_axis == 1:
+            return data[channel_idxs, start_frame:end_frame]
+        else:
+            return data[start_frame:end_frame, channel_idxs].T
+
+    traces = np.empty((len(channel_idxs), end_frame - start_frame), dtype=data.dtype)
+    if len(channel_idxs) == 0:
+        return traces
+    sorted_idxs = np.unique(channel_idxs)
+    if time_axis == 1:
+        # a gap channel is a row of the dataset
+        channel_bytes = max((end_frame - start_frame) * np.dtype(data.dtype).itemsize, 1)
+    else:
+        # the channels are interleaved in each frame: a gap channel only costs one sample per frame, while each
+        # separate read is strided over all the frames
+        channel_bytes = np.dtype(data.dtype).itemsize
+    max_gap = request_cost // channel_bytes
+    breaks = np.flatnonzero(np.diff(sorted_idxs) > max_gap + 1) + 1
+    firsts = sorted_idxs[np.concatenate(([0], breaks))]
+    lasts = sorted_idxs[np.concatenate((breaks - 1, [len(sorted_idxs) - 1]))] + 1
+    for first, last in zip(firsts, lasts):
+        block = _read_block(first, last)
+        in_block = (channel_idxs >= first) & (channel_idxs < last)
+        traces[in_block] = block[channel_idxs[in_block] - first]
+    return traces
+
+
+def extract_unit_waveforms(recording, sorting, unit_ids=None, snippet_len=(10, 40), channel_ids=None,
+                           grouping_property=None, unit_channel_ids=None, max_spikes_per_unit=None, seed=0,
+                           memmap=False, dtype=None, chunk_size=None, chunk_mb=500, n_jobs=1, return_idxs=False):
+    '''Extracts the waveforms of the spikes of a sorting from a recording.
+
+    The spikes of all units are sorted in time and the recording is read once, in large chunks: the snippets of
+    all the spikes of each chunk are scattered in preallocated (optionally memmapped) arrays, one per unit.
+    Snippets that cross the borders of the recording are filled with zeros and spikes out of the recording
+    have all-zero snippets, as in RecordingExtractor.get_snippets.
+
+    Parameters
+    ----------
+    recording: RecordingExtractor
+        The recording from which the waveforms are extracted
+    sorting: SortingExtractor
+        The sorting with the spike trains
+    unit_ids: list
+        The unit ids for which waveforms are extracted. If None, all units are used
+    snippet_len: int or tuple
+        If int, the snippet is centered on the spike frame. If tuple, number of frames before and after the
+        spike frame (default (10, 40))
+    channel_ids: list
+        The channel ids used for all units. If None, all channels are used
+    grouping_property: str
+        If given (e.g. 'group'), each unit only gets the channels (among channel_ids) whose channel property is
+        equal to the unit property with the same name
+    unit_channel_ids: dict
+        Sparse channel masks: dictionary with the channel ids of each unit (units not in the dictionary use
+        channel_ids or grouping_property). It has precedence over grouping_property
+    max_spikes_per_unit: int
+        If given, at most max_spikes_per_unit randomly chosen spikes per unit are extracted
+    seed: int
+        The random seed used to choose the spikes when max_spikes_per_unit is given
+    memmap: bool
+        If True, the waveforms are stored in memmap arrays in the temporary folder of the sorting
+    dtype: dtype
+        The dtype of the waveforms. If None, the dtype of the recording is used
+    chunk_size: None or int
+        Number of frames of each chunk read from the recording
+    chunk_mb: None or int
+        If 'chunk_size' is None, maximum size in Mb of each chunk (default 500Mb)
+    n_jobs: int
+        Number of threads reading and scattering chunks in parallel (default 1). If -1, all cpus are used
+    return_idxs: bool
+        If True, the spike indexes and the channel ids of each unit are also returned
+
+    Returns
+    -------
+    waveforms: list
+        List (one per unit) of arrays of shape (num_spikes, num_channels, snippet_len)
+    spike_idxs: list
+        List (one per unit) of the indexes in the spike train of the extracted spikes (if return_idxs is True)
+    channel_ids: list
+        List (one per unit) of the channel ids of the waveforms (if return_idxs is True)
+    '''
+    if unit_ids is None:
+        unit_ids = sorting.get_unit_ids()
+    if isinstance(unit_ids, (int, np.integer)):
+        unit_ids = [unit_ids]
+    frames_before, frames_after = _get_snippet_frames(snippet_len)
+    if dtype is None:
+        dtype = recording.get_dtype()
+    units_channel_ids = _get_units_channel_ids(recording, sorting, unit_ids, channel_ids, grouping_property,
+                                               unit_channel_ids)
+
+    random_state = np.random.RandomState(seed)
+    spike_trains = sorting.get_units_spike_train(unit_ids=unit_ids)
+    spike_idxs = []
+    for spike_train in spike_trains:
+        if max_spikes_per_unit is not None and len(spike_train) > max_spikes_per_unit:
+            spike_idxs.append(np.sort(random_state.choice(len(spike_train), max_spikes_per_unit, replace=False)))
+        else:
+            spike_idxs.append(np.arange(len(spike_train)))
+    spike_trains = [np.asarray(spike_train)[idxs] for (spike_train, idxs) in zip(spike_trains, spike_idxs)]
+
+    waveforms = [sorting.allocate_array(memmap=memmap, shape=(len(idxs), len(chans), frames_before + frames_after),
+                                        dtype=dtype)
+                 for (idxs, chans) in zip(spike_idxs, units_channel_ids)]
+
+    def _scatter_snippets(unit_idx, spike_positions, snippets):
+        waveforms[unit_idx][spike_positions] = snippets
+
+    # spikes out of the recording keep all-zero waveforms
+    _process_unit_snippets(recording, spike_trains, units_channel_ids, frames_before, frames_after,
+                           _scatter_snippets, chunk_size=chunk_size, chunk_mb=chunk_mb, n_jobs=n_jobs)
+
+    if return_idxs:
+        return waveforms, spike_idxs, units_channel_ids
+    else:
+        return waveforms
+
+
+def compute_unit_templates(recording, sorting, unit_ids=None, snippet_len=(10, 40), mode='mean', channel_ids=None,
+                           grouping_property=None, unit_channel_ids=None, max_spikes_for_median=1000, seed=0,
+                           save_as_property=True, property_name='template', chunk_size=None,
+                           chunk_mb=500, n_jobs=1):
+    '''Computes the templates (mean, standard deviation and/or median waveform) of the units of a sorting.
+
+    The recording is read once, in large chunks, and the snippets of each chunk are accumulated in running
+    statistics, so that the memory used does not depend on the number of spikes: running means and Welford sums
+    of squared deviations for 'mean' and 'std', and a reservoir of at most 'max_spikes_for_median' randomly
+    chosen snippets per unit for the (approximate) 'median'. Spikes out of the recording are ignored.
+
+    Parameters
+    ----------
+    recording: RecordingExtractor
+        The recording from which the templates are computed
+    sorting: SortingExtractor
+        The sorting with the spike trains
+    unit_ids: list
+        The unit ids for which templates are computed. If None, all units are used
+    snippet_len: int or tuple
+        If int, the snippet is centered on the spike frame. If tuple, number of frames before and after the
+        spike frame (default (10, 40))
+    mode: str or list
+        'mean', 'std', 'median' or a list of them (default 'mean')
+    channel_ids: list
+        The channel ids used for all units. If None, all channels are used
+    grouping_property: str
+        If given (e.g. 'group'), each unit only gets the channels (among channel_ids) whose channel property is
+        equal to the unit property with the same name
+    unit_channel_ids: dict
+        Sparse channel masks: dictionary with the channel ids of each unit. It has precedence over
+        grouping_property
+    max_spikes_for_median: int
+        Size of the reservoir of snippets of each unit used to compute the median (default 1000)
+    seed: int
+        The random seed of the reservoir sampling (results are reproducible with n_jobs=1)
+    save_as_property: bool
+        If True (default), the templates are stored as unit properties of the sorting: 'property_name' for the
+        mean, 'property_name' + '_std' and 'property_name' + '_median' for the others
+    property_name: str
+        Name of the template property (default 'template')
+    chunk_size: None or int
+        Number of frames of each chunk read from the recording
+    chunk_mb: None or int
+        If 'chunk_size' is None, maximum size in Mb of each chunk (default 500Mb)
+    n_jobs: int
+        Number of threads reading chunks in parallel (default 1). If -1, all cpus are used
+
+    Returns
+    -------
+    templates: list or dict
+        List (one per unit) of arrays of shape (num_channels, snippet_len). If mode is a list, a dictionary
+        with one such list per mode is returned
+    '''
+    from threading import Lock
+
+    modes = [mode] if isinstance(mode, str) else list(mode)
+    for m in modes:
+        if m not in ('mean', 'std', 'median'):
+            raise ValueError("'mode' must be 'mean', 'std', 'median' or a list of them")
+    if unit_ids is None:
+        unit_ids = sorting.get_unit_ids()
+    if isinstance(unit_ids, (int, np.integer)):
+        unit_ids = [unit_ids]
+    frames_before, frames_after = _get_snippet_frames(snippet_len)
+    num_frames_snippet = frames_before + frames_after
+    units_channel_ids = _get_units_channel_ids(recording, sorting, unit_ids, channel_ids, grouping_property,
+                                               unit_channel_ids)
+    spike_trains = [np.asarray(spike_train) for spike_train in sorting.get_units_spike_train(unit_ids=unit_ids)]
+    num_frames = recording.get_num_frames()
+    spike_trains = [spike_train[(spike_train >= 0) & (spike_train < num_frames)] for spike_train in spike_trains]
+
+    shapes = [(len(chans), num_frames_snippet) for chans in units_channel_ids]
+    counts = np.zeros(len(unit_ids), dtype='int64')
+    means = [np.zeros(shape) for shape in shapes]
+    m2s = [np.zeros(shape) for shape in shapes]
+    compute_median = 'median' in modes
+    if compute_median:
+        random_state = np.random.RandomState(seed)
+        reservoirs = [np.zeros((min(len(spike_train), max_spikes_for_median),) + shape)
+                      for (spike_train, shape) in zip(spike_trains, shapes)]
+    locks = [Lock() for _ in unit_ids]
+
+    def _accumulate_snippets(unit_idx, spike_positions, snippets):
+        snippets = snippets.astype('float64')
+        num_snippets = len(snippets)
+        with locks[unit_idx]:
+            # Welford / Chan et al. update of the running mean and sum of squared deviations with a batch
+            count = counts[unit_idx]
+            batch_mean = snippets.mean(axis=0)
+            delta = batch_mean - means[unit_idx]
+            new_count = count + num_snippets
+            means[unit_idx] += delta * num_snippets / new_count
+            m2s[unit_idx] += np.sum((snippets - batch_mean) ** 2, axis=0) + \
+                delta ** 2 * count * num_snippets / new_count
+            counts[unit_idx] = new_count
+            if compute_median:
+                # reservoir sampling: the i-th snippet (1-based) replaces a random slot with probability size / i
+                reservoir = reservoirs[unit_idx]
+                size = len(reservoir)
+                seen = count + np.arange(1, num_snippets + 1)
+                random_slots = (random_state.random_sample(num_snippets) * seen).astype('int64')
+                slots = np.where(seen <= size, seen - 1, random_slots)
+                keep = np.where(slots < size)[0]
+                # when a slot is drawn several times, the last snippet wins
+                _, last = np.unique(slots[keep][::-1], return_index=True)
+                keep = keep[::-1][last]
+                reservoir[slots[keep]] = snippets[keep]
+
+    _process_unit_snippets(recording, spike_trains, units_channel_ids, frames_before, frames_after,
+                           _accumulate_snippets, chunk_size=chunk_size, chunk_mb=chunk_mb, n_jobs=n_jobs)
+
+    templates = {}
+    if 'mean' in modes:
+        templates['mean'] = means
+    if 'std' in modes:
+        templates['std'] = [np.sqrt(m2 / count) if count > 0 else m2 for (m2, count) in zip(m2s, counts)]
+    if compute_median:
+        templates['median'] = [np.median(reservoir, axis=0) if len(reservoir) > 0 else np.zeros(shape)
+                               for (reservoir, shape) in zip(reservoirs, shapes)]
+
+    if save_as_property:
+        for m, unit_templates in templates.items():
+            name = property_name if m == 'mean' else property_name + '_' + m
+            for unit_id, template in zip(unit_ids, unit_templates):
+                sorting.set_unit_property(unit_id, name, template)
+
+    if isinstance(mode, str):
+        return templates[mode]
+    else:
+        return templates
+
+
+def _get_snippet_frames(snippet_len):
+    # number of frames before and after the reference frame of a snippet
+    if isinstance(snippet_len, (tuple, list, np.ndarray)):
+        return int(snippet_len[0]), int(snippet_len[1])
+    frames_before = int((snippet_len + 1) / 2)
+    return frames_before, int(snippet_len - frames_before)
+
+
+def _get_units_channel_ids(recording, sorting, unit_ids, channel_ids, grouping_property, unit_channel_ids):
+    # channel ids of each unit (see extract_unit_waveforms)
+    if channel_ids is None:
+        channel_ids = recording.get_channel_ids()
+    channel_ids = list(channel_ids)
+    if unit_channel_ids is None:
+        unit_channel_ids = {}
+    if grouping_property is not None:
+        channel_values = recording.get_channels_property(grouping_property, channel_ids)
+    units_channel_ids = []
+    for unit_id in unit_ids:
+        if unit_id in unit_channel_ids:
+            units_channel_ids.append(list(unit_channel_ids[unit_id]))
+        elif grouping_property is not None:
+            unit_value = sorting.get_unit_property(unit_id, grouping_property)
+            units_channel_ids.append([ch for (ch, value) in zip(channel_ids, channel_values) if value == unit_value])
+        else:
+            units_channel_ids.append(channel_ids)
+    return units_channel_ids
+
+
+def _process_unit_snippets(recording, spike_trains, units_channel_ids, frames_before, frames_after, func,
+                           chunk_size=None, chunk_mb=500, n_jobs=1):
+    # Reads the recording once, in chunks, and calls func(unit_idx, spike_positions, snippets) with the snippets
+    # (num_spikes x num_channels x snippet_len) of the spikes of each unit in each chunk, where spike_positions are
+    # the positions of the spikes in spike_trains[unit_idx]. Spikes out of the recording are skipped.
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+    read_channel_ids = sorted(set(ch for unit_chans in units_channel_ids for ch in unit_chans))
+    read_channel_index = {ch: i for i, ch in enumerate(read_channel_ids)}
+    units_channel_idxs = [np.array([read_channel_index[ch] for ch in unit_chans], dtype='int64')
+                          for unit_chans in units_channel_ids]
+
+    # spikes of all units sorted in time, with their unit and their position in the unit spike train
+    num_spikes = [len(spike_train) for spike_train in spike_trains]
+    if sum(num_spikes) > 0:
+        frames = np.concatenate(spike_trains).astype('int64')
+    else:
+        frames = np.array([], dtype='int64')
+    spike_unit_idxs = np.repeat(np.arange(len(spike_trains)), num_spikes)
+    spike_positions = np.concatenate([np.arange(n) for n in num_spikes] + [np.array([], dtype='int64')])
+    order = np.argsort(frames, kind='stable')
+    frames, spike_unit_idxs, spike_positions = frames[order], spike_unit_idxs[order], spike_positions[order]
+
+    num_frames = recording.get_num_frames()
+    chunk_size = get_chunk_size(recording, chunk_size=chunk_size, chunk_mb=chunk_mb,
+                                num_channels=max(len(read_channel_ids), 1))
+    chunk_bounds = np.searchsorted(frames, np.append(np.arange(0, num_frames, chunk_size), num_frames))
+    chunks = [(i * chunk_size, chunk_bounds[i], chunk_bounds[i + 1]) for i in range(len(chunk_bounds) - 1)
+              if chunk_bounds[i + 1] > chunk_bounds[i]]
+    snippet_offsets = np.arange(frames_before + frames_after)
+
+    def _process_chunk(chunk):
+        start_frame, i_start, i_end = chunk
+        end_frame = min(start_frame + chunk_size, num_frames)
+        # traces of the chunk extended by the snippet length, zero padded out of the recording
+        block_start = start_frame - frames_before
+        block_end = end_frame + frames_after
+        read_start = max(block_start, 0)
+        read_end = min(block_end, num_frames)
+        traces = recording.get_traces(channel_ids=read_channel_ids, start_frame=read_start, end_frame=read_end)
+        if read_start != block_start or read_end != block_end:
+            block = np.zeros((len(read_channel_ids), block_end - block_start), dtype=traces.dtype)
+            block[:, read_start - block_start:read_end - block_start] = traces
+            traces = block
+        chunk_unit_idxs = spike_unit_idxs[i_start:i_end]
+        gather_idxs = (frames[i_start:i_end] - frames_before - block_start)[:, None] + snippet_offsets
+        for unit_idx in np.unique(chunk_unit_idxs):
+            mask = chunk_unit_idxs == unit_idx
+            # only the snippet samples of the unit are gathered, the channels of the chunk are not copied
+            snippets = traces[units_channel_idxs[unit_idx][:, None, None], gather_idxs[mask][None]]
+            func(unit_idx, spike_positions[i_start:i_end][mask], np.transpose(snippets, (1, 0, 2)))
+
+    if n_jobs > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            # consume results to propagate exceptions
+            list(executor.map(_process_chunk, chunks))
+    else:
+        for chunk in chunks:
+            _process_chunk(chunk)
+
+
 def get_sub_extractors_by_property(extractor, property_name, return_property_list=False):
     '''Returns a list of SubRecordingExtractors from this RecordingExtractor based on the given
     property_name (e.g. group)
@@ -468,8 +912,7 @@ def get_sub_extractors_by_property(extractor, property_name, return_property_lis
         else:
             sub_list = []
             recording = extractor
-            properties = np.array([recording.get_channel_property(chan, property_name)
-                                   for chan in recording.get_channel_ids()])
+            properties = np.array(recording.get_channels_property(property_name))
             prop_list = np.unique(properties)
             for prop in prop_list:
                 prop_idx = np.where(prop == properties)
@@ -485,8 +928,7 @@ def get_sub_extractors_by_property(extractor, property_name, return_property_lis
         else:
             sub_list = []
             sorting = extractor
-            properties = np.array([sorting.get_unit_property(unit, property_name)
-                                   for unit in sorting.get_unit_ids()])
+            properties = np.array(sorting.get_units_property(property_name=property_name))
             prop_list = np.unique(properties)
             for prop in prop_list:
                 prop_idx = np.where(prop == properties)
@@ -542,8 +984,7 @@ def _export_prb_file(recording, file_name, grouping_property=None, graph=True, g
 
     if grouping_property is not None:
         if grouping_property in recording.get_shared_channel_property_names():
-            grouping_property_groups = np.array([recording.get_channel_property(chan, grouping_property)
-                                                 for chan in recording.get_channel_ids()])
+            grouping_property_groups = np.array(recording.get_channels_property(grouping_property))
             channel_groups = np.unique([grouping_property_groups])
         else:
             if verbose:
@@ -694,7 +1135,7 @@ def check_valid_unit_id(func):
             raise TypeError("get_unit_spike_train() missing 1 required positional argument: 'unit_id')")
         elif not (isinstance(unit_id, (int, np.integer))):
             raise ValueError("unit_id must be an integer")
-        elif unit_id not in sorting.get_unit_ids():
+        elif not sorting._is_valid_unit_id(unit_id):
             raise ValueError(f"{unit_id} is an invalid unit id")
         return func(*args, **kwargs)
     return check_validity
@@ -732,9 +1173,11 @@ def check_get_traces_args(func):
                 channel_ids = list([channel_ids])
             else:
                 channel_ids = channel_ids
-            if np.any([ch not in recording.get_channel_ids() for ch in channel_ids]):
-                print("Removing invalid 'channel_ids'", [ch for ch in channel_ids if ch not in recording.get_channel_ids()])
-                channel_ids = [ch for ch in channel_ids if ch in recording.get_channel_ids()]
+            channel_index = recording._get_channel_index()
+            invalid_channel_ids = [ch for ch in channel_ids if ch not in channel_index]
+            if len(invalid_channel_ids) > 0:
+                print("Removing invalid 'channel_ids'", invalid_channel_ids)
+                channel_ids = [ch for ch in channel_ids if ch in channel_index]
         else:
             channel_ids = recording.get_channel_ids()
         if start_frame is not None:
@@ -776,4 +1219,49 @@ def cast_start_end_frame(start_frame, end_frame):
         end_frame = end_frame
     else:
         raise ValueError("end_frame must be an int, float (not infinity), or None")
-    return start_frame, end_frame
\ No newline at end of file
+    return start_frame, end_frame
+
+
+def sort_spike_train(spike_train):
+    '''Returns the spike train sorted in time. If it is already sorted, it is returned unchanged (no copy).
+
+    Parameters
+    ----------
+    spike_train: np.array
+        The spike frames (or times) of a unit
+
+    Returns
+    -------
+    spike_train: np.array
+        The sorted spike train
+    '''
+    spike_train = np.asarray(spike_train)
+    if len(spike_train) > 1 and np.any(spike_train[1:] < spike_train[:-1]):
+        spike_train = np.sort(spike_train, kind='stable')
+    return spike_train
+
+
+def get_spike_train_range(spike_train, start_frame=None, end_frame=None):
+    '''Returns the spikes of a sorted spike train between start_frame (inclusive) and end_frame (exclusive).
+    The bounds are found by binary search and the returned array is a view of the spike train.
+
+    Parameters
+    ----------
+    spike_train: np.array
+        The sorted spike frames of a unit
+    start_frame: int
+        The frame above which a spike frame is returned (inclusive). If None, spikes are returned from the start
+    end_frame: int
+        The frame below which a spike frame is returned (exclusive). If None, spikes are returned until the end
+
+    Returns
+    -------
+    spike_train: np.array
+        The spike frames in the given range
+    '''
+    start_frame, end_frame = cast_start_end_frame(start_frame, end_frame)
+    if start_frame is None and end_frame is None:
+        return spike_train
+    start_idx = 0 if start_frame is None else np.searchsorted(spike_train, start_frame, side='left')
+    end_idx = len(spike_train) if end_frame is None else np.searchsorted(spike_train, end_frame, side='left')
+    return spike_train[start_idx:end_idx]
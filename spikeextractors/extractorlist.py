@@ -15,7 +15,8 @@ from .extractors.phyextractors.phyextractors import PhyRecordingExtractor, PhySo
 from .extractors.bindatrecordingextractor.bindatrecordingextractor import BinDatRecordingExtractor
 from .extractors.spykingcircusextractors.spykingcircusextractors import SpykingCircusSortingExtractor, \
     SpykingCircusRecordingExtractor
-from .extractors.spikeglxrecordingextractor.spikeglxrecordingextractor import SpikeGLXRecordingExtractor
+from .extractors.spikeglxrecordingextractor.spikeglxrecordingextractor import SpikeGLXRecordingExtractor, \
+    SpikeGLXSessionRecordingExtractor
 from .extractors.tridescloussortingextractor.tridescloussortingextractor import TridesclousSortingExtractor
 from .extractors.npzsortingextractor.npzsortingextractor import NpzSortingExtractor
 from .extractors.mcsh5recordingextractor.mcsh5recordingextractor import MCSH5RecordingExtractor
@@ -38,6 +39,7 @@ recording_extractor_full_list = [
     KiloSortRecordingExtractor,
     SpykingCircusRecordingExtractor,
     SpikeGLXRecordingExtractor,
+    SpikeGLXSessionRecordingExtractor,
     PhyRecordingExtractor,
     MaxOneRecordingExtractor,
     Mea1kRecordingExtractor,
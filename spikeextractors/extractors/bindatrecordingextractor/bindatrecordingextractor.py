@@ -1,7 +1,6 @@
 from spikeextractors import RecordingExtractor
 from spikeextractors.extraction_tools import read_binary, write_to_binary_dat_format, check_get_traces_args
 import shutil
-import numpy as np
 from pathlib import Path
 import os
 
@@ -64,7 +63,7 @@ class BinDatRecordingExtractor(RecordingExtractor):
 
     @check_get_traces_args
     def get_traces(self, channel_ids=None, start_frame=None, end_frame=None):
-        channel_idxs = np.array([self.get_channel_ids().index(ch) for ch in channel_ids])
+        channel_idxs = self.ids_to_indices(channel_ids)
         recordings = self._timeseries[:, start_frame:end_frame][channel_idxs, :]
         if self._dtype.startswith('uint'):
             exp_idx = self._dtype.find('int') + 3
@@ -74,7 +73,8 @@ class BinDatRecordingExtractor(RecordingExtractor):
             recordings = recordings * self._gain
         return recordings
 
-    def write_to_binary_dat_format(self, save_path, time_axis=0, dtype=None, chunk_size=None, chunk_mb=500):
+    def write_to_binary_dat_format(self, save_path, time_axis=0, dtype=None, chunk_size=None, chunk_mb=500,
+                                   n_jobs=1):
         '''Saves the traces of this recording extractor into binary .dat format.
 
         Parameters
@@ -92,6 +92,8 @@ class BinDatRecordingExtractor(RecordingExtractor):
             If 'auto' the file is saved in chunks of ~ 500Mb
         chunk_mb: None or int
             Chunk size in Mb (default 500Mb)
+        n_jobs: int
+            Number of threads used to write chunks in parallel (default 1). If -1, all cpus are used
         '''
         if dtype is None or dtype == self.get_dtype():
             try:
@@ -100,14 +102,14 @@ class BinDatRecordingExtractor(RecordingExtractor):
                 print('Error occurred while copying:', e)
                 print('Writing to binary')
                 write_to_binary_dat_format(self, save_path=save_path, time_axis=time_axis, dtype=dtype,
-                                           chunk_size=chunk_size, chunk_mb=chunk_mb)
+                                           chunk_size=chunk_size, chunk_mb=chunk_mb, n_jobs=n_jobs)
         else:
             write_to_binary_dat_format(self, save_path=save_path, time_axis=time_axis, dtype=dtype,
-                                       chunk_size=chunk_size, chunk_mb=chunk_mb)
+                                       chunk_size=chunk_size, chunk_mb=chunk_mb, n_jobs=n_jobs)
 
 
     @staticmethod
-    def write_recording(recording, save_path, time_axis=0, dtype=None, chunk_size=None):
+    def write_recording(recording, save_path, time_axis=0, dtype=None, chunk_size=None, n_jobs=1):
         '''Saves the traces of a recording extractor in binary .dat format.
 
         Parameters
@@ -124,5 +126,8 @@ class BinDatRecordingExtractor(RecordingExtractor):
         chunk_size: None or int
             If not None then the copy done by chunk size.
             This avoid to much memory consumption for big files.
+        n_jobs: int
+            Number of threads used to write chunks in parallel (default 1). If -1, all cpus are used
         '''
-        write_to_binary_dat_format(recording, save_path, time_axis=time_axis, dtype=dtype, chunk_size=chunk_size)
+        write_to_binary_dat_format(recording, save_path, time_axis=time_axis, dtype=dtype, chunk_size=chunk_size,
+                                   n_jobs=n_jobs)
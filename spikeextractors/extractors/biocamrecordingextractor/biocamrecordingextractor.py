@@ -1,5 +1,5 @@
 from spikeextractors import RecordingExtractor
-from spikeextractors.extraction_tools import check_get_traces_args
+from spikeextractors.extraction_tools import check_get_traces_args, memmap_h5_dataset, read_channel_traces
 import numpy as np
 from pathlib import Path
 import ctypes
@@ -47,14 +47,26 @@ class BiocamRecordingExtractor(RecordingExtractor):
 
     @check_get_traces_args
     def get_traces(self, channel_ids=None, start_frame=None, end_frame=None):
-        data = self._read_function(self._rf, start_frame, end_frame, self.get_num_channels())
-        # transform to slice if possible
-        if sorted(channel_ids) == channel_ids and np.all(np.diff(channel_ids) == 1):
-            channel_ids = slice(channel_ids[0], channel_ids[0]+len(channel_ids))
-        return data[:, channel_ids].T
+        # the raw data is mapped for each read, as the traces can be views of the map
+        raw = memmap_h5_dataset(self._rf['3BData/Raw'])
+        data = self._read_function(raw, start_frame, end_frame, self.get_num_channels(), channel_ids)
+        return data.T
 
     @staticmethod
-    def write_recording(recording, save_path):
+    def write_recording(recording, save_path, chunk_size=None, chunk_mb=500):
+        '''Saves the recording in the Biocam (.brw) format 101. The traces are written in chunks of frames.
+
+        Parameters
+        ----------
+        recording: RecordingExtractor
+            The recording extractor to be saved
+        save_path: str
+            The path to the file
+        chunk_size: None or int
+            Number of frames of each chunk. If None, the chunk size is computed from 'chunk_mb'
+        chunk_mb: None or int
+            Chunk size in Mb (default 500Mb)
+        '''
         # Convert to uV:
         # AnalogValue = MVOffset + DigitalValue * ADCCountsToMV
         # Where ADCCountsToMV is defined as:
@@ -71,10 +83,9 @@ class BiocamRecordingExtractor(RecordingExtractor):
         rf = h5py.File(save_path, 'w')
         g = rf.create_group('3BData')
         dr = rf.create_dataset('3BData/Raw', (M * N,), dtype=int)
-        dt = 50000
-        for i in range(N // dt):
-            dr[M * i * dt:M * (i + 1) * dt] = recording.get_traces(range(M), i * dt, (i + 1) * dt).T.flatten()
-        dr[M * (N // dt) * dt:] = recording.get_traces(range(M), (N // dt) * dt, N).T.flatten()
+        for start_frame, end_frame, traces in recording.iter_traces(chunk_size=chunk_size, chunk_mb=chunk_mb):
+            # frames are interleaved: channel c of frame t is at t * M + c
+            dr[M * start_frame:M * end_frame] = traces.T.ravel()
         g.attrs['Version'] = 101
         rf.create_dataset('3BRecInfo/3BRecVars/MinVolt', data=[0])
         rf.create_dataset('3BRecInfo/3BRecVars/MaxVolt', data=[1])
@@ -143,33 +154,48 @@ def openBiocamFile(filename, mea_pitch, verbose=False):
     return (rf, nFrames, samplingRate, nRecCh, chIndices, file_format, signalInv, rawIndices, read_function)
 
 
-def readHDF5t_100(rf, t0, t1, nch):
+def readHDF5t_100(raw, t0, t1, nch, channel_ids):
     if t0 <= t1:
-        return rf['3BData/Raw'][t0:t1]
+        return read_channel_traces(raw, channel_ids, t0, t1, time_axis=0).T
     else:  # Reversed read
         raise Exception('Reading backwards? Not sure about this.')
-        return rf['3BData/Raw'][t1:t0]
 
 
-def readHDF5t_100_i(rf, t0, t1, nch):
+def readHDF5t_100_i(raw, t0, t1, nch, channel_ids):
     if t0 <= t1:
-        return 4096 - rf['3BData/Raw'][t0:t1]
+        return 4096 - read_channel_traces(raw, channel_ids, t0, t1, time_axis=0).T
     else:  # Reversed read
         raise Exception('Reading backwards? Not sure about this.')
-        return 4096 - rf['3BData/Raw'][t1:t0]
 
 
-def readHDF5t_101(rf, t0, t1, nch):
+def readHDF5t_101(raw, t0, t1, nch, channel_ids):
     if t0 <= t1:
-        return rf['3BData/Raw'][nch * t0:nch * t1].reshape((t1 - t0, nch), order='C')
+        return _read_interleaved_channels(raw, t0, t1, nch, channel_ids)
     else:  # Reversed read
         raise Exception('Reading backwards? Not sure about this.')
-        return rf['3BData/Raw'][nch * t1:nch * t0].reshape((t1 - t0, nch), order='C')
 
 
-def readHDF5t_101_i(rf, t0, t1, nch):
+def readHDF5t_101_i(raw, t0, t1, nch, channel_ids):
     if t0 <= t1:
-        return 4096 - rf['3BData/Raw'][nch * t0:nch * t1].reshape((t1 - t0, nch), order='C')
+        # the signal is inverted after the channel selection
+        return 4096 - _read_interleaved_channels(raw, t0, t1, nch, channel_ids)
     else:  # Reversed read
         raise Exception('Reading backwards? Not sure about this.')
-        return 4096 - rf['3BData/Raw'][nch * t1:nch * t0].reshape((t1 - t0, nch), order='C')
+
+
+def _read_interleaved_channels(raw, t0, t1, nch, channel_ids):
+    # in formats 101/102 the frames are interleaved in a 1D dataset: channel c of frame t is at t * nch + c.
+    # Returns the (t1 - t0, len(channel_ids)) traces, reading only the requested channels when possible
+    channel_ids = np.asarray(channel_ids, dtype='int64')
+    if len(channel_ids) > 0 and np.all(np.diff(channel_ids) == 1):
+        channel_ids = slice(channel_ids[0], channel_ids[-1] + 1)
+    if isinstance(raw, np.ndarray):
+        # strided view of the memory map: only the selected columns are copied
+        return raw[nch * t0:nch * t1].reshape((t1 - t0, nch))[:, channel_ids]
+    if not isinstance(channel_ids, slice) and raw.chunks is None and len(channel_ids) * 4 <= nch:
+        # few channels of a contiguous dataset: one strided hyperslab per channel
+        data = np.empty((t1 - t0, len(channel_ids)), dtype=raw.dtype)
+        for i, ch in enumerate(channel_ids):
+            data[:, i] = raw[nch * t0 + ch:nch * t1:nch]
+        return data
+    return raw[nch * t0:nch * t1].reshape((t1 - t0, nch))[:, channel_ids]
@@ -1,6 +1,7 @@
 from spikeextractors import RecordingExtractor
 from spikeextractors import SortingExtractor
 import numpy as np
+import os
 from pathlib import Path
 from copy import copy
 from spikeextractors.extraction_tools import check_get_traces_args, check_valid_unit_id
@@ -57,137 +58,110 @@ class ExdirRecordingExtractor(RecordingExtractor):
         return self._recordings.data[np.array(channel_ids), start_frame:end_frame]
 
     @staticmethod
-    def write_recording(recording, save_path, lfp=False, mua=False):
+    def write_recording(recording, save_path, lfp=False, mua=False, chunk_size=None, chunk_mb=500, n_jobs=1):
+        '''Writes the recording to an exdir folder. The datasets are preallocated and filled in chunks of frames,
+        so that the recording is never loaded in memory at once.
+
+        Parameters
+        ----------
+        recording: RecordingExtractor
+            The recording extractor to be saved
+        save_path: str
+            The path to the exdir folder
+        lfp: bool
+            If True, the traces are saved as LFP in 'processing/electrophysiology', one dataset per channel
+        mua: bool
+            If True, the traces are saved as MUA in 'processing/electrophysiology', one dataset per channel
+        chunk_size: None or int
+            Number of frames of each chunk. If None, the chunk size is computed from 'chunk_mb'
+        chunk_mb: None or int
+            Chunk size in Mb (default 500Mb)
+        n_jobs: int
+            Number of channel groups written in parallel with LFP or MUA (default 1). If -1, all cpus are used
+        '''
         assert HAVE_EXDIR, "To use the ExdirExtractors run:\n\n pip install exdir\n\n"
-        channel_ids = recording.get_channel_ids()
-        raw = recording.get_traces()
+        channel_ids = np.array(recording.get_channel_ids())
+        num_frames = recording.get_num_frames()
+        sampling_frequency = recording.get_sampling_frequency()
+        dtype = recording.get_dtype()
         exdir_group = exdir.File(save_path, plugins=[exdir.plugins.quantities])
 
         if not lfp and not mua:
             acq = exdir_group.require_group('acquisition')
-            timeseries = acq.require_dataset('timeseries', data=raw)
-            timeseries.attrs['sample_rate'] = recording.get_sampling_frequency() * pq.Hz
-            timeseries.attrs['electrode_identities'] = np.array(channel_ids)
+            timeseries = acq.require_dataset('timeseries', shape=(len(channel_ids), num_frames), dtype=dtype)
+            timeseries.attrs['sample_rate'] = sampling_frequency * pq.Hz
+            timeseries.attrs['electrode_identities'] = channel_ids
+            _write_traces_to_datasets(recording, [(channel_ids, [timeseries])], chunk_size=chunk_size,
+                                      chunk_mb=chunk_mb, n_jobs=n_jobs)
             return
-        elif lfp:
-            ephys = exdir_group.require_group('processing').require_group('electrophysiology')
-            ephys.attrs['sample_rate'] = recording.get_sampling_frequency() * pq.Hz
-            if 'group' in recording.get_shared_channel_property_names():
-                channel_groups = np.unique(recording.get_channel_groups())
-            else:
-                channel_groups = [0]
 
-            if len(channel_groups) == 1:
-                chan = 0
-                ch_group = ephys.require_group('channel_group_' + str(chan))
-                lfp_group = ch_group.require_group('LFP')
-                ch_group.attrs['electrode_group_id'] = chan
-                ch_group.attrs['electrode_identities'] = np.array(recording.get_channel_ids())
-                ch_group.attrs['electrode_idx'] = np.arange(len(recording.get_channel_ids()))
-                ch_group.attrs['start_time'] = 0 * pq.s
-                ch_group.attrs['stop_time'] = recording.get_num_frames() / \
-                                              float(recording.get_sampling_frequency()) * pq.s
-                for i_c, ch in enumerate(recording.get_channel_ids()):
-                    ts_group = lfp_group.require_group('LFP_timeseries_' + str(ch))
-                    ts_group.attrs['electrode_group_id'] = chan
-                    ts_group.attrs['electrode_identity'] = ch
-                    ts_group.attrs['num_samples'] = recording.get_num_frames()
-                    ts_group.attrs['electrode_idx'] = i_c
-                    ts_group.attrs['start_time'] = 0 * pq.s
-                    ts_group.attrs['stop_time'] = recording.get_num_frames() / \
-                                                  float(recording.get_sampling_frequency()) * pq.s
-                    ts_group.attrs['sample_rate'] = recording.get_sampling_frequency() * pq.Hz
-                    data = ts_group.require_dataset('data', data=recording.get_traces(channel_ids=[ch]))
-                    data.attrs['sample_rate'] = recording.get_sampling_frequency() * pq.Hz
-                    data.attrs['unit'] = pq.uV
-            else:
-                channel_groups = np.unique(recording.get_channel_groups())
-                for chan in channel_groups:
-                    ch_group = ephys.require_group('channel_group_' + str(chan))
-                    lfp_group = ch_group.require_group('LFP')
-                    ch_group.attrs['electrode_group_id'] = chan
-                    ch_group.attrs['electrode_identities'] = np.array([ch for ch in recording.get_channel_ids()
-                                                                       if recording.get_channel_groups(ch) == chan])
-                    ch_group.attrs['electrode_idx'] = np.array([i_c for i_c, ch in
-                                                                enumerate(recording.get_channel_ids())
-                                                                if recording.get_channel_groups(ch) == chan])
-                    ch_group.attrs['start_time'] = 0 * pq.s
-                    ch_group.attrs['stop_time'] = recording.get_num_frames() / \
-                                                  float(recording.get_sampling_frequency()) * pq.s
-                    for i_c, ch in enumerate(recording.get_channel_ids()):
-                        if recording.get_channel_groups(ch) == chan:
-                            ts_group = lfp_group.require_group('LFP_timeseries_' + str(ch))
-                            ts_group.attrs['electrode_group_id'] = chan
-                            ts_group.attrs['electrode_identity'] = ch
-                            ts_group.attrs['num_samples'] = recording.get_num_frames()
-                            ts_group.attrs['electrode_idx'] = i_c
-                            ts_group.attrs['start_time'] = 0 * pq.s
-                            ts_group.attrs['stop_time'] = recording.get_num_frames() / \
-                                                          float(recording.get_sampling_frequency()) * pq.s
-                            ts_group.attrs['sample_rate'] = recording.get_sampling_frequency() * pq.Hz
-                            data = ts_group.require_dataset('data', data=recording.get_traces(channel_ids=[ch]))
-                            data.attrs['sample_rate'] = recording.get_sampling_frequency() * pq.Hz
-                            data.attrs['unit'] = pq.uV
-            return
-        elif mua:
-            ephys = exdir_group.require_group('processing').require_group('electrophysiology')
-            ephys.attrs['sample_rate'] = recording.get_sampling_frequency() * pq.Hz
-            if 'group' in recording.get_shared_channel_property_names():
-                channel_groups = np.unique(recording.get_channel_groups())
-            else:
-                channel_groups = [0]
+        name = 'LFP' if lfp else 'MUA'
+        ephys = exdir_group.require_group('processing').require_group('electrophysiology')
+        ephys.attrs['sample_rate'] = sampling_frequency * pq.Hz
+        if 'group' in recording.get_shared_channel_property_names():
+            channel_groups = np.array(recording.get_channel_groups())
+        else:
+            channel_groups = np.zeros(len(channel_ids), dtype='int64')
+        if len(np.unique(channel_groups)) == 1:
+            channel_groups = np.zeros(len(channel_ids), dtype='int64')
 
-            if len(channel_groups) == 1:
-                chan = 0
-                ch_group = ephys.require_group('channel_group_' + str(chan))
-                mua_group = ch_group.require_group('MUA')
-                ch_group.attrs['electrode_group_id'] = chan
-                ch_group.attrs['electrode_identities'] = np.array(recording.get_channel_ids())
-                ch_group.attrs['electrode_idx'] = np.arange(len(recording.get_channel_ids()))
-                ch_group.attrs['start_time'] = 0 * pq.s
-                ch_group.attrs['stop_time'] = recording.get_num_frames() / \
-                                              float(recording.get_sampling_frequency()) * pq.s
-                for i_c, ch in enumerate(recording.get_channel_ids()):
-                    ts_group = mua_group.require_group('MUA_timeseries_' + str(ch))
-                    ts_group.attrs['electrode_group_id'] = chan
-                    ts_group.attrs['electrode_identity'] = ch
-                    ts_group.attrs['num_samples'] = recording.get_num_frames()
-                    ts_group.attrs['electrode_idx'] = i_c
-                    ts_group.attrs['start_time'] = 0 * pq.s
-                    ts_group.attrs['stop_time'] = recording.get_num_frames() / \
-                                                  float(recording.get_sampling_frequency()) * pq.s
-                    ts_group.attrs['sample_rate'] = recording.get_sampling_frequency() * pq.Hz
-                    data = ts_group.require_dataset('data', data=recording.get_traces(channel_ids=[ch]))
-                    data.attrs['sample_rate'] = recording.get_sampling_frequency() * pq.Hz
-                    data.attrs['unit'] = pq.uV
-            else:
-                channel_groups = np.unique(recording.get_channel_groups())
-                for chan in channel_groups:
-                    ch_group = ephys.require_group('channel_group_' + str(chan))
-                    mua_group = ch_group.require_group('MUA')
-                    ch_group.attrs['electrode_group_id'] = chan
-                    ch_group.attrs['electrode_identities'] = np.array([ch for ch in recording.get_channel_ids()
-                                                                       if recording.get_channel_groups(ch) == chan])
-                    ch_group.attrs['electrode_idx'] = np.array([i_c for i_c, ch in
-                                                                enumerate(recording.get_channel_ids())
-                                                                if recording.get_channel_groups(ch) == chan])
-                    ch_group.attrs['start_time'] = 0 * pq.s
-                    ch_group.attrs['stop_time'] = recording.get_num_frames() / \
-                                                  float(recording.get_sampling_frequency()) * pq.s
-                    for i_c, ch in enumerate(recording.get_channel_ids()):
-                        if recording.get_channel_groups(ch) == chan:
-                            ts_group = mua_group.require_group('MUA_timeseries_' + str(ch))
-                            ts_group.attrs['electrode_group_id'] = chan
-                            ts_group.attrs['electrode_identity'] = ch
-                            ts_group.attrs['num_samples'] = recording.get_num_frames()
-                            ts_group.attrs['electrode_idx'] = i_c
-                            ts_group.attrs['start_time'] = 0 * pq.s
-                            ts_group.attrs['stop_time'] = recording.get_num_frames() / \
-                                                          float(recording.get_sampling_frequency()) * pq.s
-                            ts_group.attrs['sample_rate'] = recording.get_sampling_frequency() * pq.Hz
-                            data = ts_group.require_dataset('data', data=recording.get_traces(channel_ids=[ch]))
-                            data.attrs['sample_rate'] = recording.get_sampling_frequency() * pq.Hz
-                            data.attrs['unit'] = pq.uV
+        groups = []
+        for chan in np.unique(channel_groups):
+            electrode_idx = np.flatnonzero(channel_groups == chan)
+            ch_group = ephys.require_group('channel_group_' + str(chan))
+            ts_groups = ch_group.require_group(name)
+            ch_group.attrs['electrode_group_id'] = chan
+            ch_group.attrs['electrode_identities'] = channel_ids[electrode_idx]
+            ch_group.attrs['electrode_idx'] = electrode_idx
+            ch_group.attrs['start_time'] = 0 * pq.s
+            ch_group.attrs['stop_time'] = num_frames / float(sampling_frequency) * pq.s
+            datasets = []
+            for i_c in electrode_idx:
+                ch = channel_ids[i_c]
+                ts_group = ts_groups.require_group(name + '_timeseries_' + str(ch))
+                ts_group.attrs['electrode_group_id'] = chan
+                ts_group.attrs['electrode_identity'] = ch
+                ts_group.attrs['num_samples'] = num_frames
+                ts_group.attrs['electrode_idx'] = i_c
+                ts_group.attrs['start_time'] = 0 * pq.s
+                ts_group.attrs['stop_time'] = num_frames / float(sampling_frequency) * pq.s
+                ts_group.attrs['sample_rate'] = sampling_frequency * pq.Hz
+                data = ts_group.require_dataset('data', shape=(1, num_frames), dtype=dtype)
+                data.attrs['sample_rate'] = sampling_frequency * pq.Hz
+                datasets.append(data)
+            groups.append((channel_ids[electrode_idx], datasets))
+        _write_traces_to_datasets(recording, groups, chunk_size=chunk_size, chunk_mb=chunk_mb, n_jobs=n_jobs)
+        # the unit is set once the data are written, otherwise the plugin would convert the raw chunks
+        for _, datasets in groups:
+            for data in datasets:
+                data.attrs['unit'] = pq.uV
+
+
+def _write_traces_to_datasets(recording, groups, chunk_size, chunk_mb, n_jobs):
+    # groups is a list of (channel_ids, datasets): the traces of the channels are written chunk by chunk in the
+    # rows of the exdir datasets, in order. Groups are written in parallel if n_jobs > 1
+    def _write_group(group):
+        channel_ids, datasets = group
+        # the memory maps of the datasets are written directly: Dataset.__setitem__ rewrites the attributes
+        datasets = [data.data for data in datasets]
+        for start_frame, end_frame, traces in recording.iter_traces(chunk_size=chunk_size, chunk_mb=chunk_mb,
+                                                                    channel_ids=channel_ids):
+            row = 0
+            for data in datasets:
+                data[:, start_frame:end_frame] = traces[row:row + data.shape[0]]
+                row += data.shape[0]
+        for data in datasets:
+            data.flush()
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+    if n_jobs > 1 and len(groups) > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            list(executor.map(_write_group, groups))
+    else:
+        for group in groups:
+            _write_group(group)
 
 
 class ExdirSortingExtractor(SortingExtractor):
@@ -240,6 +214,7 @@ class ExdirSortingExtractor(SortingExtractor):
                 if 'UnitTimes' in channel.keys():
                     for unit, unit_times in channel['UnitTimes'].items():
                         self._unit_ids.append(current_unit)
+                        self._reset_unit_index()
                         self._spike_trains.append((unit_times['times'].data.rescale('s') * sf).magnitude)
                         attrs = unit_times.attrs
                         for k, v in attrs.items():
@@ -282,7 +257,7 @@ class ExdirSortingExtractor(SortingExtractor):
         ephys.attrs['sample_rate'] = sampling_frequency
 
         if 'group' in sorting.get_shared_unit_property_names():
-            channel_groups = np.unique([sorting.get_unit_property(unit, 'group') for unit in sorting.get_unit_ids()])
+            channel_groups = np.unique(sorting.get_units_property(property_name='group'))
         else:
             channel_groups = [0]
 
@@ -391,7 +366,7 @@ class ExdirSortingExtractor(SortingExtractor):
                         del ch_group['Clustering']
                     except Exception as e:
                         pass
-            channel_groups = np.unique([sorting.get_unit_property(unit, 'group') for unit in sorting.get_unit_ids()])
+            channel_groups = np.unique(sorting.get_units_property(property_name='group'))
             for chan in channel_groups:
                 if verbose:
                     print("Group: ", chan)
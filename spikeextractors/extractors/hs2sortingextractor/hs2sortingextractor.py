@@ -1,7 +1,7 @@
 from spikeextractors import SortingExtractor
 import numpy as np
 from pathlib import Path
-from spikeextractors.extraction_tools import check_valid_unit_id
+from spikeextractors.extraction_tools import check_valid_unit_id, get_spike_train_range, memmap_h5_dataset
 
 try:
     import h5py
@@ -29,9 +29,17 @@ class HS2SortingExtractor(SortingExtractor):
             else:
                 self._sampling_frequency = self._rf['Sampling'][()]
 
-        self._cluster_id = self._rf['cluster_id'][()]
+        # spike tables are memory mapped when possible instead of being read in memory
+        self._cluster_id = memmap_h5_dataset(self._rf['cluster_id'])[()]
         self._unit_ids = set(self._cluster_id)
-        self._times = self._rf['times'][()]
+        self._times = memmap_h5_dataset(self._rf['times'])[()]
+        # spikes are kept sorted in time so that frame ranges are found by binary search
+        if np.any(self._times[1:] < self._times[:-1]):
+            self._spike_order = np.argsort(self._times, kind='stable')
+            self._times = self._times[self._spike_order]
+            self._cluster_id = self._cluster_id[self._spike_order]
+        else:
+            self._spike_order = None
 
         if load_unit_info:
             self.load_unit_info()
@@ -41,19 +49,19 @@ class HS2SortingExtractor(SortingExtractor):
     def load_unit_info(self):
         if 'centres' in self._rf.keys() and len(self._times) > 0:
             self._unit_locs = self._rf['centres'][()]  # cache for faster access
-            for u_i, unit_id in enumerate(self._unit_ids):
-                self.set_unit_property(unit_id, property_name='unit_location', value=self._unit_locs[u_i])
-        inds = []  # get these only once
-        for unit_id in self._unit_ids:
-            inds.append(np.where(self._cluster_id == unit_id)[0])
+            unit_ids = list(self._unit_ids)
+            self.set_units_property(unit_ids=unit_ids, property_name='unit_location',
+                                    values=self._unit_locs[:len(unit_ids)])
         if 'data' in self._rf.keys() and len(self._times) > 0:
-            d = self._rf['data'][()]
-            for i, unit_id in enumerate(self._unit_ids):
-                self.set_unit_spike_features(unit_id, 'spike_location', d[:, inds[i]].T)
+            d = memmap_h5_dataset(self._rf['data'])[()].T
+            if self._spike_order is not None:
+                d = d[self._spike_order]
+            self.set_units_spike_features('spike_location', d, spike_labels=self._cluster_id)
         if 'ch' in self._rf.keys() and len(self._times) > 0:
-            d = self._rf['ch'][()]
-            for i, unit_id in enumerate(self._unit_ids):
-                self.set_unit_spike_features(unit_id, 'max_channel', d[inds[i]])
+            d = memmap_h5_dataset(self._rf['ch'])[()]
+            if self._spike_order is not None:
+                d = d[self._spike_order]
+            self.set_units_spike_features('max_channel', d, spike_labels=self._cluster_id)
 
     def get_unit_indices(self, x):
         return np.where(self._cluster_id == x)[0]
@@ -64,27 +72,21 @@ class HS2SortingExtractor(SortingExtractor):
     @check_valid_unit_id
     def get_unit_spike_train(self, unit_id, start_frame=None, end_frame=None):
         start_frame, end_frame = self._cast_start_end_frame(start_frame, end_frame)
-        if start_frame is None:
-            start_frame = 0
-        if end_frame is None:
-            end_frame = np.Inf
-        times = self._times[self.get_unit_indices(unit_id)]
-        inds = np.where((start_frame <= times) & (times < end_frame))
-        return times[inds]
+        spike_times, offsets = self.get_all_spike_trains()
+        unit_idx = self._get_unit_index()[unit_id]
+        times = spike_times[offsets[unit_idx]:offsets[unit_idx + 1]]
+        return get_spike_train_range(times, start_frame, end_frame)
+
+    def _get_spike_times_and_labels(self):
+        return self._times, self._cluster_id
 
     @staticmethod
     def write_sorting(sorting, save_path):
         assert HAVE_HS2SX, "To use the HS2SortingExtractor install h5py: \n\n pip install h5py\n\n"
         unit_ids = sorting.get_unit_ids()
-        times_list = []
-        labels_list = []
-        for i in range(len(unit_ids)):
-            unit = unit_ids[i]
-            times = sorting.get_unit_spike_train(unit_id=unit)
-            times_list.append(times)
-            labels_list.append(np.ones(times.shape, dtype=int) * unit)
-        all_times = np.concatenate(times_list)
-        all_labels = np.concatenate(labels_list)
+        # spikes grouped by unit, in the same order as the concatenated spike features
+        all_times, offsets = sorting.get_all_spike_trains()
+        all_labels = np.repeat(np.asarray(unit_ids, dtype=int), np.diff(offsets))
 
         rf = h5py.File(save_path, mode='w')
         if sorting.get_sampling_frequency() is not None:
@@ -92,8 +94,7 @@ class HS2SortingExtractor(SortingExtractor):
         else:
             rf.create_dataset("Sampling", data=0)
         if 'unit_location' in sorting.get_shared_unit_property_names():
-            spike_centres = [sorting.get_unit_property(u, 'unit_location') for u in sorting.get_unit_ids()]
-            spike_centres = np.array(spike_centres)
+            spike_centres = np.array(sorting.get_units_property(property_name='unit_location'))
             rf.create_dataset("centres", data=spike_centres)
         if 'spike_location' in sorting.get_shared_unit_spike_feature_names():
             spike_loc_x = []
@@ -7,7 +7,7 @@ from scipy.spatial.distance import cdist
 import numpy as np
 
 from spikeextractors.extractors.matsortingextractor.matsortingextractor import MATSortingExtractor, HAVE_MAT
-from spikeextractors.extraction_tools import check_valid_unit_id
+from spikeextractors.extraction_tools import check_valid_unit_id, get_spike_train_range
 
 PathType = Union[str, Path]
 
@@ -114,19 +114,20 @@ class JRCSortingExtractor(MATSortingExtractor):
 
         self._unit_ids = np.unique(spike_clusters[good_mask])
 
-        # load spike trains
+        # load spike trains (sorted in time, the spike features follow the same order)
         self._spike_trains = {}
-        self._unit_masks = {}
+        self._unit_indices = {}
         for uid in self._unit_ids:
-            mask = (spike_clusters == uid)
-            self._unit_masks[uid] = mask
+            inds = np.flatnonzero(spike_clusters == uid)
+            inds = inds[np.argsort(spike_times[inds], kind="stable")]
+            self._unit_indices[uid] = inds
 
-            self._spike_trains[uid] = spike_times[mask]
+            self._spike_trains[uid] = spike_times[inds]
 
-            self.set_unit_spike_features(uid, "amplitudes", spike_amplitudes[mask])
-            self.set_unit_spike_features(uid, "max_channels", spike_sites[mask])
-            self.set_unit_spike_features(uid, "positions", spike_positions[mask, :])
-            self.set_unit_spike_features(uid, "site_neighbors", neighbors[spike_sites[mask], :])
+            self.set_unit_spike_features(uid, "amplitudes", spike_amplitudes[inds])
+            self.set_unit_spike_features(uid, "max_channels", spike_sites[inds])
+            self.set_unit_spike_features(uid, "positions", spike_positions[inds, :])
+            self.set_unit_spike_features(uid, "site_neighbors", neighbors[spike_sites[inds], :])
 
             self.set_unit_property(uid, "centroid", unit_centroids[uid - 1, :])
             self.set_unit_property(uid, "max_channel", unit_sites[uid - 1])
@@ -155,13 +156,13 @@ class JRCSortingExtractor(MATSortingExtractor):
         if feature_name not in ("raw_traces", "filtered_traces", "cluster_features"):
             return super().get_unit_spike_features(unit_id, feature_name, start_frame, end_frame)
 
-        mask = self._unit_masks[unit_id]
+        inds = self._unit_indices[unit_id]
         if feature_name == "raw_traces":
-            return self._raw_traces[:, :, mask] * self._kwargs["bit_scaling"]
+            return self._raw_traces[:, :, inds] * self._kwargs["bit_scaling"]
         elif feature_name == "filtered_traces":
-            return self._filt_traces[:, :, mask] * self._kwargs["bit_scaling"]
+            return self._filt_traces[:, :, inds] * self._kwargs["bit_scaling"]
         else:
-            return self._cluster_features[:, :, mask]
+            return self._cluster_features[:, :, inds]
 
     @check_valid_unit_id
     def get_unit_spike_feature_names(self, unit_id):
@@ -170,12 +171,7 @@ class JRCSortingExtractor(MATSortingExtractor):
     @check_valid_unit_id
     def get_unit_spike_train(self, unit_id, start_frame=None, end_frame=None):
         start_frame, end_frame = self._cast_start_end_frame(start_frame, end_frame)
-
-        start_frame = start_frame or 0
-        end_frame = end_frame or np.infty
-
-        st = self._spike_trains[unit_id]
-        return st[(st >= start_frame) & (st < end_frame)]
+        return get_spike_train_range(self._spike_trains[unit_id], start_frame, end_frame)
 
     def get_unit_ids(self):
         return self._unit_ids.tolist()
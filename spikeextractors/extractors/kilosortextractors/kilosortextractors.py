@@ -22,18 +22,21 @@ class KiloSortSortingExtractor(PhySortingExtractor):
     mode = 'folder'
 
     def __init__(self, folder_path, exclude_cluster_groups=None, load_waveforms=False, keep_good_only=False,
-                 verbose=False):
-        PhySortingExtractor.__init__(self, folder_path, exclude_cluster_groups, load_waveforms, verbose)
+                 verbose=False, memmap=False):
+        PhySortingExtractor.__init__(self, folder_path, exclude_cluster_groups, load_waveforms, verbose, memmap)
         self._keep_good_only = keep_good_only
         self._good_units = []
 
         if keep_good_only:
-            for u in self.get_unit_ids():
-                if 'KSLabel' in self.get_unit_property_names(u):
-                    if self.get_unit_property(u, 'KSLabel') == 'good':
-                        self._good_units.append(u)
+            unit_ids = self.get_unit_ids()
+            if 'KSLabel' in self._get_units_property_names(unit_ids):
+                has_label = self._get_units_property_mask('KSLabel', unit_ids)
+                labeled_units = [u for (u, labeled) in zip(unit_ids, has_label) if labeled]
+                labels = self.get_units_property(unit_ids=labeled_units, property_name='KSLabel')
+                self._good_units = [u for (u, label) in zip(labeled_units, labels) if label == 'good']
             self._unit_ids = self._good_units
+            self._reset_unit_index()
 
         self._kwargs = {'folder_path': str(Path(folder_path).absolute()),
                         'exclude_cluster_groups': exclude_cluster_groups, 'keep_good_only': keep_good_only,
-                        'verbose': verbose}
+                        'verbose': verbose, 'memmap': memmap}
@@ -1,7 +1,7 @@
 from spikeextractors import RecordingExtractor
 from pathlib import Path
 import numpy as np
-from spikeextractors.extraction_tools import check_get_traces_args
+from spikeextractors.extraction_tools import check_get_traces_args, memmap_h5_dataset, read_channel_traces
 
 try:
     import h5py
@@ -33,6 +33,7 @@ class MaxOneRecordingExtractor(RecordingExtractor):
     def _initialize(self):
         self._filehandle = h5py.File(self._file_path, 'r')
         self._mapping = self._filehandle['mapping']
+        self._signals = memmap_h5_dataset(self._filehandle['sig'])
         if 'lsb' in self._filehandle['settings'].keys():
             self._lsb = self._filehandle['settings']['lsb'][()] * 1e6
         else:
@@ -59,14 +60,5 @@ class MaxOneRecordingExtractor(RecordingExtractor):
 
     @check_get_traces_args
     def get_traces(self, channel_ids=None, start_frame=None, end_frame=None):
-        if np.array(channel_ids).size > 1:
-            assert np.all([ch in self.get_channel_ids() for ch in channel_ids])
-            if np.any(np.diff(channel_ids) < 0):
-                sorted_idx = np.argsort(channel_ids)
-                recordings = self._signals[np.sort(channel_ids), start_frame:end_frame]
-                return (recordings[sorted_idx] * self._lsb).astype('float')
-            else:
-                return (self._signals[np.array(channel_ids), start_frame:end_frame] * self._lsb).astype('float')
-        else:
-            assert channel_ids in self.get_channel_ids()
-            return (self._signals[np.array(channel_ids), start_frame:end_frame] * self._lsb).astype('float')
+        assert np.all([self._is_valid_channel_id(ch) for ch in channel_ids])
+        return (read_channel_traces(self._signals, channel_ids, start_frame, end_frame) * self._lsb).astype('float')
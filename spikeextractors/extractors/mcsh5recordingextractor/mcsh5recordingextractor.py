@@ -1,7 +1,7 @@
 from spikeextractors import RecordingExtractor
 import numpy as np
 from pathlib import Path
-from spikeextractors.extraction_tools import check_get_traces_args
+from spikeextractors.extraction_tools import check_get_traces_args, memmap_h5_dataset, read_channel_traces
 
 try:
     import h5py
@@ -52,6 +52,8 @@ class MCSH5RecordingExtractor(RecordingExtractor):
         self._rf, self._nFrames, self._samplingRate, self._nRecCh, \
         self._channel_ids, self._electrodeLabels, self._exponent, self._convFact \
             = openMCSH5File(self._recording_file, stream_id, self._verbose)
+        stream = self._rf.require_group('/Data/Recording_0/AnalogStream/Stream_' + str(self._stream_id))
+        self._data = memmap_h5_dataset(stream.get('ChannelData'))
 
     def get_stream_id(self):
         assert hasattr(self, '_stream_id'), "Stream ID has not been set yet."
@@ -61,8 +63,8 @@ class MCSH5RecordingExtractor(RecordingExtractor):
         if hasattr(self, '_available_stream_ids'):
             return self._available_stream_ids
         else:
-            rf = h5py.File(self._recording_file, 'r')
-            analog_stream_names = list(rf.require_group('/Data/Recording_0/AnalogStream').keys())
+            with h5py.File(self._recording_file, 'r') as rf:
+                analog_stream_names = list(rf.require_group('/Data/Recording_0/AnalogStream').keys())
             return list(range(len(analog_stream_names)))
 
     @check_get_traces_args
@@ -73,23 +75,9 @@ class MCSH5RecordingExtractor(RecordingExtractor):
         if end_frame is None:
             end_frame = self.get_num_frames()
 
-        channel_idxs = []
-        for m in channel_ids:
-            assert m in self._channel_ids, 'channel_id {} not found'.format(m)
-            channel_idxs.append(np.where(np.array(self._channel_ids) == m)[0][0])
-
-        stream = self._rf.require_group('/Data/Recording_0/AnalogStream/Stream_' + str(self._stream_id))
+        channel_idxs = self.ids_to_indices(channel_ids)
         conv = self._convFact.astype(float) * (10.0 ** self._exponent)
-
-        if np.array(channel_idxs).size > 1:
-            if np.any(np.diff(channel_idxs) < 0):
-                sorted_idx = np.argsort(channel_idxs)
-                recordings = stream.get('ChannelData')[np.sort(channel_idxs), start_frame:end_frame]
-                return recordings[sorted_idx] * conv
-            else:
-                return stream.get('ChannelData')[np.sort(channel_idxs), start_frame:end_frame] * conv
-        else:
-            return stream.get('ChannelData')[np.array(channel_idxs), start_frame:end_frame] * conv
+        return read_channel_traces(self._data, channel_idxs, start_frame, end_frame) * conv
 
     @staticmethod
     def write_recording(recording, save_path):
@@ -100,7 +88,8 @@ class MCSH5RecordingExtractor(RecordingExtractor):
 
 
 def openMCSH5File(filename, stream_id, verbose=False):
-    """Open an MCS hdf5 file, read and return the recording info."""
+    """Open an MCS hdf5 file, read and return the recording info.
+    Only the metadata are read: the traces are read lazily from 'ChannelData' by get_traces."""
     rf = h5py.File(filename, 'r')
 
     stream_name = 'Stream_' + str(stream_id)
@@ -108,7 +97,7 @@ def openMCSH5File(filename, stream_id, verbose=False):
     assert stream_name in analog_stream_names, "Specified stream does not exist."
 
     stream = rf.require_group('/Data/Recording_0/AnalogStream/' + stream_name)
-    data = np.array(stream.get('ChannelData'), dtype=np.int)
+    data = stream.get('ChannelData')
     timestamps = np.array(stream.get('ChannelDataTimeStamps'))
     info = np.array(stream.get('InfoChannel'))
 
@@ -123,20 +112,16 @@ def openMCSH5File(filename, stream_id, verbose=False):
     electrodeLabels = info['Label']
 
     assert timestamps[0][0] < timestamps[0][2], 'Please check the validity of \'ChannelDataTimeStamps\' in the stream.'
-    TimeVals = np.arange(timestamps[0][0], timestamps[0][2] + 1, 1) * Tick
-
     assert Unit == b'V', 'Unexpected units found, expected volts, found {}'.format(Unit.decode('UTF-8'))
-    data_V = data * convFact.astype(float) * (10.0 ** (exponent))
 
-    timestep_avg = np.mean(TimeVals[1:] - TimeVals[0:-1])
-    timestep_std = np.std(TimeVals[1:] - TimeVals[0:-1])
-    timestep_min = np.min(TimeVals[1:] - TimeVals[0:-1])
-    timestep_max = np.min(TimeVals[1:] - TimeVals[0:-1])
-    assert all(np.abs(np.array(
-        (timestep_min, timestep_max)) - timestep_avg) / timestep_avg < 1e-6), 'Time steps vary by more than 1 ppm'
-    samplingRate = 1. / timestep_avg
+    # samples are spaced by one tick between the first and last timestamps
+    assert Tick > 0, 'Invalid \'Tick\' found in \'InfoChannel\': {}'.format(Tick)
+    samplingRate = 1e6 / float(info['Tick'][0])
 
     if verbose:
+        # the signal range is estimated on the first frames only, to avoid reading the whole file
+        num_sample_frames = min(nFrames, 10000)
+        sample_V = data[:, :num_sample_frames] * convFact.astype(float) * (10.0 ** (exponent))
         print('# MCS H5 data format')
         print('#')
         print('# File: {}'.format(rf.filename))
@@ -145,12 +130,12 @@ def openMCSH5File(filename, stream_id, verbose=False):
         for key in rf.attrs.keys():
             print('# {}: {}'.format(key, rf.attrs[key]))
         print('#')
-        print('# Signal range: {:.2f} to {:.2f} µV'.format(np.amin(data_V) * 1e6, np.amax(data_V) * 1e6))
+        print('# Signal range (first {} frames): {:.2f} to {:.2f} µV'.format(num_sample_frames,
+                                                                             np.amin(sample_V) * 1e6,
+                                                                             np.amax(sample_V) * 1e6))
         print('# Number of channels: {}'.format(nRecCh))
         print('# Number of frames: {}'.format(nFrames))
-        print('# Time step: {:.2f} µs ± {:.5f} % (range {} to {})'.format(timestep_avg * 1e6,
-                                                                          timestep_std / timestep_avg * 100,
-                                                                          timestep_min * 1e6, timestep_max * 1e6))
+        print('# Time step: {:.2f} µs'.format(Tick * 1e6))
         print('# Sampling rate: {:.2f} Hz'.format(samplingRate))
         print('#')
         print('# MCSH5RecordingExtractor currently only reads /Data/Recording_0/AnalogStream/Stream_0')
@@ -1,11 +1,12 @@
 from spikeextractors import RecordingExtractor
 from spikeextractors import SortingExtractor
-from spikeextractors.extraction_tools import write_to_binary_dat_format, check_get_traces_args, check_valid_unit_id
+from spikeextractors.extraction_tools import write_to_binary_dat_format, check_get_traces_args, check_valid_unit_id, \
+    get_spike_train_range
 
 import json
 import numpy as np
 from pathlib import Path
-from .mdaio import DiskReadMda, readmda, writemda64, MdaHeader
+from .mdaio import DiskReadMda, readmda, readmda_memmap, writemda64, MdaHeader
 import os
 import shutil
 
@@ -35,10 +36,17 @@ class MdaRecordingExtractor(RecordingExtractor):
                                                                                                X.N1()))
         self._num_channels = X.N1()
         self._num_timepoints = X.N2()
+        # the header is parsed once: each read only maps the file
+        self._header = X._header
         RecordingExtractor.__init__(self)
         self.set_channel_locations(self._geom)
         self._kwargs = {'folder_path': str(Path(folder_path).absolute())}
 
+    def _get_timeseries(self):
+        # plain ndarray view on a copy-on-write memory map, so that traces keep the ndarray type and are writable.
+        # The file is mapped for each read, so that writing to returned traces does not change the next reads
+        return readmda_memmap(self._timeseries_path, header=self._header).view(np.ndarray)
+
     def get_channel_ids(self):
         return list(range(self._num_channels))
 
@@ -50,12 +58,17 @@ class MdaRecordingExtractor(RecordingExtractor):
 
     @check_get_traces_args
     def get_traces(self, channel_ids=None, start_frame=None, end_frame=None):
-        X = DiskReadMda(self._timeseries_path)
-        recordings = X.readChunk(i1=0, i2=start_frame, N1=X.N1(), N2=end_frame - start_frame)
-        recordings = recordings[channel_ids, :]
+        X = self._get_timeseries()
+        channel_ids = np.asarray(channel_ids)
+        if len(channel_ids) > 0 and np.all(np.diff(channel_ids) == 1):
+            # contiguous channel range: a view of the memory map, nothing is read until used
+            recordings = X[channel_ids[0]:channel_ids[-1] + 1, start_frame:end_frame]
+        else:
+            recordings = X[channel_ids, start_frame:end_frame]
         return recordings
 
-    def write_to_binary_dat_format(self, save_path, time_axis=0, dtype=None, chunk_size=None, chunk_mb=500):
+    def write_to_binary_dat_format(self, save_path, time_axis=0, dtype=None, chunk_size=None, chunk_mb=500,
+                                   n_jobs=1):
         '''Saves the traces of this recording extractor into binary .dat format.
 
         Parameters
@@ -73,9 +86,10 @@ class MdaRecordingExtractor(RecordingExtractor):
             If 'auto' the file is saved in chunks of ~ 500Mb
         chunk_mb: None or int
             Chunk size in Mb (default 500Mb)
+        n_jobs: int
+            Number of threads used to write chunks in parallel (default 1). If -1, all cpus are used
         '''
-        X = DiskReadMda(self._timeseries_path)
-        header_size = X._header.header_size
+        header_size = self._header.header_size
         if dtype is None or dtype == self.get_dtype():
             try:
                 with open(self._timeseries_path, 'rb') as src, open(save_path, 'wb') as dst:
@@ -85,14 +99,14 @@ class MdaRecordingExtractor(RecordingExtractor):
                 print('Error occurred while copying:', e)
                 print('Writing to binary')
                 write_to_binary_dat_format(self, save_path=save_path, time_axis=time_axis, dtype=dtype,
-                                           chunk_size=chunk_size, chunk_mb=chunk_mb)
+                                           chunk_size=chunk_size, chunk_mb=chunk_mb, n_jobs=n_jobs)
         else:
             write_to_binary_dat_format(self, save_path=save_path, time_axis=time_axis, dtype=dtype,
-                                       chunk_size=chunk_size, chunk_mb=chunk_mb)
+                                       chunk_size=chunk_size, chunk_mb=chunk_mb, n_jobs=n_jobs)
 
     @staticmethod
     def write_recording(recording, save_path, params=dict(), raw_fname='raw.mda', params_fname='params.json',
-                        geom_fname='geom.csv', dtype=None, chunk_size=None, chunk_mb=500):
+                        geom_fname='geom.csv', dtype=None, chunk_size=None, chunk_mb=500, n_jobs=1):
         '''
 
         Parameters
@@ -116,6 +130,8 @@ class MdaRecordingExtractor(RecordingExtractor):
             If None and 'chunk_mb' is given, the file is saved in chunks of 'chunk_mb' Mb (default 500Mb)
         chunk_mb: None or int
             Chunk size in Mb (default 500Mb)
+        n_jobs: int
+            Number of threads used to write chunks in parallel (default 1). If -1, all cpus are used
         '''
         save_path = Path(save_path)
         if not save_path.exists():
@@ -145,7 +161,7 @@ class MdaRecordingExtractor(RecordingExtractor):
             header.write(f)
             # takes care of the chunking
             write_to_binary_dat_format(recording, file_handle=f, dtype=dtype, chunk_size=chunk_size,
-                                       chunk_mb=chunk_mb)
+                                       chunk_mb=chunk_mb, n_jobs=n_jobs)
 
         params["samplerate"] = recording.get_sampling_frequency()
         with (parent_dir / params_fname).open('w') as f:
@@ -160,21 +176,28 @@ class MdaSortingExtractor(SortingExtractor):
     mode = 'file'
     installation_mesg = ""  # error message when not installed
 
-    def __init__(self, file_path, sampling_frequency=None):
+    def __init__(self, file_path, sampling_frequency=None, memmap=False):
 
         SortingExtractor.__init__(self)
         self._firings_path = file_path
-        self._firings = readmda(self._firings_path)
-        self._max_channels = self._firings[0, :]
-        self._times = self._firings[1, :]
-        self._labels = self._firings[2, :]
-        self._unit_ids = np.unique(self._labels).astype(int)
+        if memmap:
+            firings = readmda_memmap(self._firings_path)
+        else:
+            firings = readmda(self._firings_path)
+        times = np.rint(firings[1, :]).astype('int64')
+        labels = firings[2, :].astype('int64')
+        # spikes grouped by unit (and sorted in time within each unit) with a single sort: the spike train of the
+        # i-th unit is self._spike_times[self._offsets[i]:self._offsets[i + 1]]
+        order = np.lexsort((times, labels))
+        self._spike_times = times[order]
+        self._unit_ids, first_inds = np.unique(labels, return_index=True)
+        self._offsets = np.append(np.searchsorted(labels[order], self._unit_ids), len(labels))
         self._sampling_frequency = sampling_frequency
-        for unit_id in self._unit_ids:
-            inds = np.where(self._labels == unit_id)
-            max_channels = self._max_channels[inds].astype(int)
-            self.set_unit_property(unit_id, 'mda_max_channel', max_channels[0])
-        self._kwargs = {'file_path': str(Path(file_path).absolute()), 'sampling_frequency': sampling_frequency}
+        if len(self._unit_ids) > 0:
+            self.set_units_property(unit_ids=list(self._unit_ids), property_name='mda_max_channel',
+                                    values=firings[0, first_inds].astype(int))
+        self._kwargs = {'file_path': str(Path(file_path).absolute()), 'sampling_frequency': sampling_frequency,
+                        'memmap': memmap}
 
     def get_unit_ids(self):
         return list(self._unit_ids)
@@ -182,40 +205,32 @@ class MdaSortingExtractor(SortingExtractor):
     @check_valid_unit_id
     def get_unit_spike_train(self, unit_id, start_frame=None, end_frame=None):
         start_frame, end_frame = self._cast_start_end_frame(start_frame, end_frame)
-        if start_frame is None:
-            start_frame = 0
-        if end_frame is None:
-            end_frame = np.Inf
-        inds = np.where((self._labels == unit_id) & (start_frame <= self._times) & (self._times < end_frame))
-        return np.rint(self._times[inds]).astype(int)
+        unit_idx = self._get_unit_index()[unit_id]
+        spike_times = self._spike_times[self._offsets[unit_idx]:self._offsets[unit_idx + 1]]
+        return get_spike_train_range(spike_times, start_frame, end_frame)
+
+    def get_all_spike_trains(self):
+        # the spikes are stored grouped by unit, following get_unit_ids()
+        self._cache_spike_trains(self._spike_times, self._offsets)
+        return self._spike_times, self._offsets
 
     @staticmethod
     def write_sorting(sorting, save_path, write_primary_channels=False):
         unit_ids = sorting.get_unit_ids()
-        times_list = []
-        labels_list = []
-        primary_channels_list = []
-        for unit_id in unit_ids:
-            times = sorting.get_unit_spike_train(unit_id=unit_id)
-            times_list.append(times)
-            labels_list.append(np.ones(times.shape) * unit_id)
-            if write_primary_channels:
-                if 'max_channel' in sorting.get_unit_property_names(unit_id):
-                    primary_channels_list.append([sorting.get_unit_property(unit_id, 'max_channel')]*times.shape[0])
-                else:
+        # spikes ordered by time
+        all_times, spike_unit_indices = sorting.to_spike_vector()
+        L = len(all_times)
+        all_labels = np.asarray(unit_ids)[spike_unit_indices] if len(unit_ids) > 0 else np.zeros(L)
+        if write_primary_channels:
+            for unit_id in unit_ids:
+                if 'max_channel' not in sorting.get_unit_property_names(unit_id):
                     raise ValueError(
                         "Unable to write primary channels because 'max_channel' spike feature not set in unit " + str(
                             unit_id))
-            else:
-                primary_channels_list.append(np.zeros(times.shape))
-        all_times = _concatenate(times_list)
-        all_labels = _concatenate(labels_list)
-        all_primary_channels = _concatenate(primary_channels_list)
-        sort_inds = np.argsort(all_times)
-        all_times = all_times[sort_inds]
-        all_labels = all_labels[sort_inds]
-        all_primary_channels = all_primary_channels[sort_inds]
-        L = len(all_times)
+            max_channels = np.asarray(sorting.get_units_property(unit_ids=unit_ids, property_name='max_channel'))
+            all_primary_channels = max_channels[spike_unit_indices] if len(unit_ids) > 0 else np.zeros(L)
+        else:
+            all_primary_channels = np.zeros(L)
         firings = np.zeros((3, L))
         firings[0, :] = all_primary_channels
         firings[1, :] = all_times
@@ -224,12 +239,6 @@ class MdaSortingExtractor(SortingExtractor):
         writemda64(firings, save_path)
 
 
-def _concatenate(list):
-    if len(list) == 0:
-        return np.array([])
-    return np.concatenate(list)
-
-
 def read_dataset_params(dsdir, params_fname):
     fname1 = dsdir / params_fname
     if not os.path.exists(fname1):
@@ -1,8 +1,15 @@
 import numpy as np
 import struct
 import os
+import atexit
+import io
+import shutil
 import tempfile
+import threading
 import traceback
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
 
 
 class MdaHeader:
@@ -93,6 +100,8 @@ class DiskReadMda:
 
     def readChunk(self, i1=-1, i2=-1, i3=-1, N1=1, N2=1, N3=1):
         # print("Reading chunk {} {} {} {} {} {}".format(i1,i2,i3,N1,N2,N3))
+        if not self._npy_mode and not is_url(self._path):
+            return self._read_chunk_memmap(i1, i2, i3, N1, N2, N3)
         if i2 < 0:
             if self._npy_mode:
                 A = np.load(self._path, mmap_mode='r')
@@ -123,16 +132,45 @@ class DiskReadMda:
             X = self._read_chunk_1d(i1 + N1 * i2 + N1 * N2 * i3, N1 * N2 * N3)
             return np.reshape(X, (N1, N2, N3), order='F')
 
+    def _get_memmap(self):
+        # the whole payload is mapped and chunks are returned as views of the flat (column-major) data. The map is
+        # copy-on-write and opened for each read, so that writing to a returned chunk changes neither the file nor
+        # the next chunks
+        H = self._header
+        return np.memmap(self._path, dtype=H.dt, mode='c', offset=H.header_size, shape=(int(H.dimprod),))
+
+    def _read_chunk_memmap(self, i1, i2, i3, N1, N2, N3):
+        if i2 < 0:
+            return self._get_memmap()[i1:i1 + N1]
+        if N1 != self.N1():
+            print("Unable to support N1 {} != {}".format(N1, self.N1()))
+            return None
+        if i3 < 0:
+            i, shape = i1 + N1 * i2, (N1, N2)
+        else:
+            if N2 != self.N2():
+                print("Unable to support N2 {} != {}".format(N2, self.N2()))
+                return None
+            i, shape = i1 + N1 * i2 + N1 * N2 * i3, (N1, N2, N3)
+        X = self._get_memmap()[i:i + int(np.prod(shape))]
+        if X.size != np.prod(shape):
+            print('Problem reading chunk from file: ' + self._path)
+            return None
+        return np.reshape(X, shape, order='F')
+
     def _read_chunk_1d(self, i, N):
         offset = self._header.header_size + self._header.num_bytes_per_entry * i
         if is_url(self._path):
-            tmp_fname = _download_bytes_to_tmpfile(self._path, offset, offset + self._header.num_bytes_per_entry * N)
+            file_size = self._header.header_size + self._header.num_bytes_per_entry * int(self._header.dimprod)
             try:
-                ret = self._read_chunk_1d_helper(tmp_fname, N, offset=0)
-            except:
-                ret = None
-            # os.remove(tmp_fname)
-            return ret
+                buf = get_remote_block_cache().read(self._path, offset,
+                                                    offset + self._header.num_bytes_per_entry * N,
+                                                    file_size=file_size)
+                # copied out of the cached blocks, so that the chunk is writable
+                return np.frombuffer(buf, dtype=self._header.dt, count=N).copy()
+            except Exception as e:
+                print(e)
+                return None
         return self._read_chunk_1d_helper(self._path, N, offset=offset)
 
     def _read_chunk_1d_helper(self, path0, N, *, offset):
@@ -152,34 +190,182 @@ def is_url(path):
     return path.startswith('http://') or path.startswith('https://')
 
 
-def _download_bytes_to_tmpfile(url, start, end):
-    try:
-        import requests
-    except:
-        raise Exception('Unable to import module: requests')
-    headers = {"Range": "bytes={}-{}".format(start, end - 1)}
-    r = requests.get(url, headers=headers, stream=True)
-    fd, tmp_fname = tempfile.mkstemp()
-    with open(tmp_fname, 'wb') as f:
-        for chunk in r.iter_content(chunk_size=1024):
-            if chunk:
-                f.write(chunk)
-    return tmp_fname
+def _download_bytes(url, start, end):
+    request = urllib.request.Request(url, headers={"Range": "bytes={}-{}".format(start, end - 1)})
+    with urllib.request.urlopen(request) as r:
+        if r.status != 206 and start > 0:
+            raise Exception('Server does not support range requests: {}'.format(url))
+        return r.read(end - start)
+
+
+class RemoteBlockCache:
+    '''Local LRU cache of fixed-size blocks of remote files, fetched with HTTP range requests.
+
+    Blocks are stored in files of a temporary folder (removed at interpreter exit), and the least
+    recently used ones are deleted when the cache exceeds max_size bytes. When a read ends on a block,
+    the following blocks are downloaded in the background so that sequential reads do not wait for the
+    network. Block files are read and written outside of the lock, which only guards the bookkeeping.
+
+    Parameters
+    ----------
+    block_size: int
+        Size of the blocks in bytes (default 4Mb)
+    max_size: int
+        Maximum size of the cache on disk in bytes (default 1Gb)
+    num_prefetch: int
+        Number of blocks fetched ahead of the last read one (default 2)
+    cache_dir: str or None
+        Folder of the blocks. If None, a temporary folder is created
+    '''
+    def __init__(self, block_size=2 ** 22, max_size=2 ** 30, num_prefetch=2, cache_dir=None):
+        self.block_size = int(block_size)
+        self.max_size = int(max_size)
+        self.num_prefetch = num_prefetch
+        self._cache_dir = cache_dir
+        self._blocks = OrderedDict()
+        self._pending = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self._executor = None
+        self.num_downloads = 0
+
+    def read(self, url, start, end, file_size=None):
+        '''Returns the bytes [start, end) of the remote file as a bytearray.
+
+        Parameters
+        ----------
+        url: str
+            The url of the file
+        start: int
+            First byte to read
+        end: int
+            Byte after the last one to read
+        file_size: int or None
+            Size of the remote file, used to bound the prefetch. If None, nothing is prefetched
+        '''
+        if end <= start:
+            return bytearray()
+        first_block = start // self.block_size
+        last_block = (end - 1) // self.block_size
+        if file_size is not None:
+            last_prefetch = min(last_block + self.num_prefetch, (file_size - 1) // self.block_size)
+            for block in range(last_block + 1, last_prefetch + 1):
+                self._request_block(url, block, prefetch=True)
+        out = bytearray()
+        for block in range(first_block, last_block + 1):
+            data = self._get_block(url, block)
+            block_start = block * self.block_size
+            out += data[max(start - block_start, 0):end - block_start]
+            if len(data) < self.block_size:
+                break
+        return out
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+            self._size = 0
+            cache_dir = self._cache_dir
+            self._cache_dir = None
+        if cache_dir is not None and os.path.isdir(cache_dir):
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    def _get_block(self, url, block):
+        key = (url, block)
+        while True:
+            with self._lock:
+                fname = None
+                if key in self._blocks:
+                    self._blocks.move_to_end(key)
+                    fname = self._blocks[key][0]
+            if fname is not None:
+                try:
+                    with open(fname, 'rb') as f:
+                        return f.read()
+                except OSError:
+                    # evicted (or cleared) after the lookup: the block is requested again
+                    continue
+            future = self._request_block(url, block)
+            if future is not None:
+                return future.result()
+
+    def _request_block(self, url, block, prefetch=False):
+        # downloads of the same block share a single future
+        key = (url, block)
+        with self._lock:
+            if key in self._pending:
+                return self._pending[key]
+            if key in self._blocks:
+                return None
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=max(self.num_prefetch, 1))
+            if prefetch:
+                future = self._executor.submit(self._fetch_block, url, block)
+            else:
+                future = Future()
+            self._pending[key] = future
+        if not prefetch:
+            # blocks that are needed now are downloaded in the calling thread
+            try:
+                future.set_result(self._fetch_block(url, block))
+            except Exception as e:
+                future.set_exception(e)
+        return future
+
+    def _fetch_block(self, url, block):
+        key = (url, block)
+        try:
+            data = _download_bytes(url, block * self.block_size, (block + 1) * self.block_size)
+            with self._lock:
+                self.num_downloads += 1
+                if self._cache_dir is None:
+                    self._cache_dir = tempfile.mkdtemp(prefix='mda_cache_')
+                    atexit.register(shutil.rmtree, self._cache_dir, ignore_errors=True)
+                cache_dir = self._cache_dir
+            try:
+                fd, fname = tempfile.mkstemp(dir=cache_dir)
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+            except OSError:
+                # the cache was cleared during the download: the block is returned without being cached
+                return data
+            removed = []
+            with self._lock:
+                if self._cache_dir != cache_dir:
+                    removed.append(fname)
+                else:
+                    self._blocks[key] = (fname, len(data))
+                    self._size += len(data)
+                    while self._size > self.max_size and len(self._blocks) > 1:
+                        _, (old_fname, old_size) = self._blocks.popitem(last=False)
+                        removed.append(old_fname)
+                        self._size -= old_size
+            for old_fname in removed:
+                try:
+                    os.remove(old_fname)
+                except OSError:
+                    pass
+            return data
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+
+_remote_block_cache = None
+
+
+def get_remote_block_cache():
+    '''Returns the RemoteBlockCache shared by the readers of remote .mda files.'''
+    global _remote_block_cache
+    if _remote_block_cache is None:
+        _remote_block_cache = RemoteBlockCache()
+    return _remote_block_cache
 
 
 def _read_header(path):
     if is_url(path):
-        tmp_fname = _download_bytes_to_tmpfile(path, 0, 200)
-        if not tmp_fname:
-            raise Exception('Problem downloading bytes from ' + path)
-        try:
-            ret = _read_header(tmp_fname)
-        except:
-            ret = None
-        os.remove(tmp_fname)
-        return ret
-
-    f = open(path, "rb")
+        f = io.BytesIO(get_remote_block_cache().read(path, 0, 200))
+    else:
+        f = open(path, "rb")
     try:
         dt_code = _read_int32(f)
         num_bytes_per_entry = _read_int32(f)
@@ -328,6 +514,21 @@ def readmda(path):
         return None
 
 
+def readmda_memmap(path, header=None):
+    # opens a local .mda (or .npy) file as a copy-on-write memory map instead of loading it in memory: the array is
+    # writable, but the file is never modified. If the (already parsed) header of the .mda file is given, the file
+    # is only mapped
+    if file_extension(path) == '.npy':
+        return np.load(path, mmap_mode='c')
+    if is_url(path):
+        raise Exception('Cannot memory map a remote file: {}'.format(path))
+    H = _read_header(path) if header is None else header
+    if H is None:
+        print("Problem reading header of: {}".format(path))
+        return None
+    return np.memmap(path, dtype=H.dt, mode='c', offset=H.header_size, shape=tuple(H.dims), order='F')
+
+
 def writemda32(X, fname):
     if file_extension(fname) == '.npy':
         return writenpy32(X, fname)
@@ -1,7 +1,7 @@
 from spikeextractors import RecordingExtractor
 from pathlib import Path
 import numpy as np
-from spikeextractors.extraction_tools import check_get_traces_args
+from spikeextractors.extraction_tools import check_get_traces_args, memmap_h5_dataset, read_channel_traces
 
 try:
     import h5py
@@ -44,7 +44,7 @@ class Mea1kRecordingExtractor(RecordingExtractor):
         print(f"Chip version: {self._version}")
         self._lsb = 1
         if int(self._version) == 20160704:
-            self._signals = self._filehandle.get('sig')
+            self._signals = memmap_h5_dataset(self._filehandle.get('sig'))
             try:
                 self._gain = self._filehandle.get('settings/gain')
             except:
@@ -65,7 +65,7 @@ class Mea1kRecordingExtractor(RecordingExtractor):
         elif int(self._version) >= 20161003:
             self._mapping = self._filehandle['ephys']['mapping']
             self._fs = float(self._filehandle['ephys']['frame_rate'][()])
-            self._signals = self._filehandle['ephys']['signal']
+            self._signals = memmap_h5_dataset(self._filehandle['ephys']['signal'])
         else:
             raise NotImplementedError(f"Version {self._version} of the Mea1k chip is not supported")
 
@@ -90,17 +90,8 @@ class Mea1kRecordingExtractor(RecordingExtractor):
 
     @check_get_traces_args
     def get_traces(self, channel_ids=None, start_frame=None, end_frame=None):
-        if np.array(channel_ids).size > 1:
-            assert np.all([ch in self.get_channel_ids() for ch in channel_ids])
-            if np.any(np.diff(channel_ids) < 0):
-                sorted_idx = np.argsort(channel_ids)
-                recordings = self._signals[np.sort(channel_ids), start_frame:end_frame]
-                return recordings[sorted_idx].astype('float')
-            else:
-                return self._signals[np.array(channel_ids), start_frame:end_frame].astype('float')
-        else:
-            assert channel_ids in self.get_channel_ids()
-            return self._signals[np.array(channel_ids), start_frame:end_frame].astype('float')
+        assert np.all([self._is_valid_channel_id(ch) for ch in channel_ids])
+        return read_channel_traces(self._signals, channel_ids, start_frame, end_frame).astype('float')
 
     @staticmethod
     def write_recording(recording, save_path, chunk_size=None, chunk_mb=500):
@@ -1,6 +1,7 @@
 from spikeextractors import RecordingExtractor
 from spikeextractors import SortingExtractor
-from spikeextractors.extraction_tools import check_get_traces_args, check_valid_unit_id
+from spikeextractors.extraction_tools import check_get_traces_args, check_valid_unit_id, sort_spike_train, \
+    get_spike_train_range, memmap_h5_dataset, read_channel_traces
 
 import numpy as np
 from pathlib import Path
@@ -71,14 +72,8 @@ class MEArecRecordingExtractor(RecordingExtractor):
 
     @check_get_traces_args
     def get_traces(self, channel_ids=None, start_frame=None, end_frame=None):
-        if np.any(np.diff(channel_ids) < 0):
-            sorted_idx = np.argsort(channel_ids)
-            recordings = self._recordings[np.sort(channel_ids), start_frame:end_frame]
-            return recordings[sorted_idx]
-        else:
-            if sorted(channel_ids) == channel_ids and np.all(np.diff(channel_ids) == 1):
-                channel_ids = slice(channel_ids[0], channel_ids[0] + len(channel_ids))
-            return self._recordings[channel_ids, start_frame:end_frame]
+        # the dataset is mapped for each read, as the traces can be views of the map
+        return read_channel_traces(memmap_h5_dataset(self._recordings), channel_ids, start_frame, end_frame)
         
     @staticmethod
     def write_recording(recording, save_path, check_suffix=True):
@@ -135,6 +130,7 @@ class MEArecSortingExtractor(SortingExtractor):
         else:
             self._unit_ids = list(range(self._num_units))
         self._spike_trains = recgen.spiketrains
+        self._spike_frames = {}  # sorted spike frames, computed once per unit
         self._fs = recgen.info['recordings']['fs'] * pq.Hz  # fs is in kHz
         self._sampling_frequency = recgen.info['recordings']['fs']
 
@@ -155,16 +151,13 @@ class MEArecSortingExtractor(SortingExtractor):
     @check_valid_unit_id
     def get_unit_spike_train(self, unit_id, start_frame=None, end_frame=None):
         start_frame, end_frame = self._cast_start_end_frame(start_frame, end_frame)
-        if start_frame is None:
-            start_frame = 0
-        if end_frame is None:
-            end_frame = np.Inf
         if self._spike_trains is None:
             self._initialize()
-        times = (self._spike_trains[self.get_unit_ids().index(unit_id)].times.rescale('s') *
-                 self._fs.rescale('Hz')).magnitude
-        inds = np.where((start_frame <= times) & (times < end_frame))
-        return np.rint(times[inds]).astype(int)
+        unit_idx = self._get_unit_index()[unit_id]
+        if unit_idx not in self._spike_frames:
+            times = (self._spike_trains[unit_idx].times.rescale('s') * self._fs.rescale('Hz')).magnitude
+            self._spike_frames[unit_idx] = sort_spike_train(np.rint(times).astype(int))
+        return get_spike_train_range(self._spike_frames[unit_idx], start_frame, end_frame)
 
     @staticmethod
     def write_sorting(sorting, save_path, sampling_frequency, check_suffix=True):
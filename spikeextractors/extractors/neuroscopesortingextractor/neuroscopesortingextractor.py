@@ -1,7 +1,7 @@
 from spikeextractors import SortingExtractor
 import numpy as np
 from pathlib import Path
-from spikeextractors.extraction_tools import check_valid_unit_id
+from spikeextractors.extraction_tools import check_valid_unit_id, sort_spike_train, get_spike_train_range
 
 
 class NeuroscopeSortingExtractor(SortingExtractor):
@@ -36,7 +36,7 @@ class NeuroscopeSortingExtractor(SortingExtractor):
             self._spiketrains = []
             self._unit_ids = list(x + 1 for x in range(n_clu))
             for s_id in self._unit_ids:
-                self._spiketrains.append(res[(clu == s_id).nonzero()])
+                self._spiketrains.append(sort_spike_train(res[(clu == s_id).nonzero()]))
         else:
             self._spiketrains = []
             self._unit_ids = []
@@ -50,13 +50,8 @@ class NeuroscopeSortingExtractor(SortingExtractor):
     @check_valid_unit_id
     def get_unit_spike_train(self, unit_id, start_frame=None, end_frame=None):
         start_frame, end_frame = self._cast_start_end_frame(start_frame, end_frame)
-        if start_frame is None:
-            start_frame = 0
-        if end_frame is None:
-            end_frame = np.Inf
-        times = self._spiketrains[self.get_unit_ids().index(unit_id)]
-        inds = np.where((start_frame <= times) & (times < end_frame))
-        return times[inds]
+        times = self._spiketrains[self._get_unit_index()[unit_id]]
+        return get_spike_train_range(times, start_frame, end_frame)
 
     @staticmethod
     def write_sorting(sorting, save_path):
@@ -1,6 +1,6 @@
 from spikeextractors import SortingExtractor
 from pathlib import Path
-from spikeextractors.extraction_tools import check_valid_unit_id
+from spikeextractors.extraction_tools import check_valid_unit_id, get_spike_train_range
 import numpy as np
 
 
@@ -29,6 +29,11 @@ class NpzSortingExtractor(SortingExtractor):
         self.unit_ids = npz['unit_ids']
         self.spike_indexes = npz['spike_indexes']
         self.spike_labels = npz['spike_labels']
+        # spikes are kept sorted in time so that frame ranges are found by binary search
+        if np.any(self.spike_indexes[1:] < self.spike_indexes[:-1]):
+            order = np.argsort(self.spike_indexes, kind='stable')
+            self.spike_indexes = self.spike_indexes[order]
+            self.spike_labels = self.spike_labels[order]
 
         if 'sampling_frequency' in npz:
             self._sampling_frequency = float(npz['sampling_frequency'][0])
@@ -42,34 +47,23 @@ class NpzSortingExtractor(SortingExtractor):
     @check_valid_unit_id
     def get_unit_spike_train(self, unit_id, start_frame=None, end_frame=None):
         start_frame, end_frame = self._cast_start_end_frame(start_frame, end_frame)
-        spike_times = self.spike_indexes[self.spike_labels == unit_id]
-        if start_frame is not None:
-            spike_times = spike_times[spike_times >= start_frame]
-        if end_frame is not None:
-            spike_times = spike_times[spike_times < end_frame]
-        return spike_times.astype('int64')
+        spike_times, offsets = self.get_all_spike_trains()
+        unit_idx = self._get_unit_index()[unit_id]
+        return get_spike_train_range(spike_times[offsets[unit_idx]:offsets[unit_idx + 1]], start_frame, end_frame)
+
+    def _get_spike_times_and_labels(self):
+        return self.spike_indexes, self.spike_labels
 
     @staticmethod
     def write_sorting(sorting, save_path):
         d = {}
         units_ids = np.array(sorting.get_unit_ids())
         d['unit_ids'] = units_ids
-        spike_indexes = []
-        spike_labels = []
-        for unit_id in units_ids:
-            sp_ind = sorting.get_unit_spike_train(unit_id)
-            spike_indexes.append(sp_ind)
-            spike_labels.append(np.ones(sp_ind.size, dtype='int64')*unit_id)
-
-        # order times
-        if len(spike_indexes) > 0:
-            spike_indexes = np.concatenate(spike_indexes)
-            spike_labels = np.concatenate(spike_labels)
-            order = np.argsort(spike_indexes)
-            spike_indexes = spike_indexes[order]
-            spike_labels = spike_labels[order]
+        # spikes ordered by time
+        spike_indexes, spike_unit_indices = sorting.to_spike_vector()
+        if len(units_ids) > 0:
+            spike_labels = units_ids[spike_unit_indices]
         else:
-            spike_indexes = np.array([], dtype='int64')
             spike_labels = np.array([], dtype='int64')
 
         d['spike_indexes'] = spike_indexes
@@ -3,7 +3,7 @@ from spikeextractors import SortingExtractor
 from pathlib import Path
 import numpy as np
 from functools import wraps
-from spikeextractors.extraction_tools import check_get_traces_args, check_valid_unit_id
+from spikeextractors.extraction_tools import check_get_traces_args, check_valid_unit_id, get_spike_train_range
 
 '''
 The NumpyExtractors can be constructed and used to encapsulate custom file formats and data structures which
@@ -118,7 +118,11 @@ class NumpySortingExtractor(SortingExtractor):
         times: np.array
             An array of spike times (in frames).
         '''
-        self._units[unit_id] = dict(times=times)
+        times = np.asarray(times)
+        # the given spike order is kept: frame ranges are found by binary search only for sorted trains
+        is_sorted = not np.any(times[1:] < times[:-1])
+        self._units[unit_id] = dict(times=times, is_sorted=is_sorted)
+        self._reset_unit_index()
 
     def get_unit_ids(self):
         return list(self._units.keys())
@@ -126,10 +130,12 @@ class NumpySortingExtractor(SortingExtractor):
     @check_valid_unit_id
     def get_unit_spike_train(self, unit_id, start_frame=None, end_frame=None):
         start_frame, end_frame = self._cast_start_end_frame(start_frame, end_frame)
-        if start_frame is None:
-            start_frame = 0
-        if end_frame is None:
-            end_frame = np.Inf
         times = self._units[unit_id]['times']
-        inds = np.where((start_frame <= times) & (times < end_frame))[0]
-        return np.rint(times[inds]).astype(int)
+        if self._units[unit_id]['is_sorted']:
+            times = get_spike_train_range(times, start_frame, end_frame)
+        else:
+            if start_frame is not None:
+                times = times[times >= start_frame]
+            if end_frame is not None:
+                times = times[times < end_frame]
+        return np.rint(times).astype(int)
@@ -7,7 +7,8 @@ import numpy as np
 import distutils.version
 
 import spikeextractors as se
-from spikeextractors.extraction_tools import check_get_traces_args, check_valid_unit_id
+from spikeextractors.extraction_tools import check_get_traces_args, check_valid_unit_id, get_spike_train_range, \
+    get_chunk_size, read_channel_traces
 
 try:
     import pynwb
@@ -15,13 +16,56 @@ try:
     from pynwb import NWBFile
     from pynwb.ecephys import ElectricalSeries
     from pynwb.ecephys import ElectrodeGroup
-    from hdmf.data_utils import DataChunkIterator
+    from hdmf.data_utils import AbstractDataChunkIterator, DataChunk
+    from hdmf.backends.hdf5.h5_utils import H5DataIO
+    from hdmf.common.table import DynamicTableRegion
+    import h5py
 
     HAVE_NWB = True
 except ModuleNotFoundError:
     HAVE_NWB = False
 
 
+if HAVE_NWB:
+    class TracesChunkIterator(AbstractDataChunkIterator):
+        """
+        Iterates over the traces of a recording in time chunks (all channels x chunk_size frames), so that an
+        ElectricalSeries (frames x channels) is written in a single sequential pass over the recording.
+        """
+        def __init__(self, recording, channel_ids=None, chunk_size=None, chunk_mb=500, dtype=None, chunk_shape=None):
+            if channel_ids is None:
+                channel_ids = recording.get_channel_ids()
+            self._num_frames = recording.get_num_frames()
+            self._num_channels = len(channel_ids)
+            self._dtype = np.dtype(dtype if dtype is not None else recording.get_dtype())
+            self._chunk_shape = chunk_shape
+            chunk_size = get_chunk_size(recording, chunk_size=chunk_size, chunk_mb=chunk_mb,
+                                        num_channels=max(self._num_channels, 1))
+            self._traces_iterator = recording.iter_traces(chunk_size=chunk_size, channel_ids=channel_ids)
+
+        def __iter__(self):
+            return self
+
+        def __next__(self):
+            start_frame, end_frame, traces = next(self._traces_iterator)
+            return DataChunk(data=np.ascontiguousarray(traces.T, dtype=self._dtype),
+                             selection=np.s_[start_frame:end_frame, :])
+
+        def recommended_chunk_shape(self):
+            return self._chunk_shape
+
+        def recommended_data_shape(self):
+            return self.maxshape
+
+        @property
+        def dtype(self):
+            return self._dtype
+
+        @property
+        def maxshape(self):
+            return self._num_frames, self._num_channels
+
+
 def check_nwb_install():
     assert HAVE_NWB, "To use the Nwb extractors, install pynwb: \n\n pip install pynwb\n\n"
 
@@ -32,7 +76,8 @@ def set_dynamic_table_property(dynamic_table, row_ids, property_name, values, in
     if not isinstance(row_ids, list) or not all(isinstance(x, int) for x in row_ids):
         raise TypeError("'ids' must be a list of integers")
     ids = list(dynamic_table.id[:])
-    if any([i not in ids for i in row_ids]):
+    id_index = {row_id: i for (i, row_id) in enumerate(ids)}
+    if any([i not in id_index for i in row_ids]):
         raise ValueError("'ids' contains values outside the range of existing ids")
     if not isinstance(property_name, str):
         raise TypeError("'property_name' must be a string")
@@ -42,11 +87,11 @@ def set_dynamic_table_property(dynamic_table, row_ids, property_name, values, in
     if index is False:
         if property_name in dynamic_table:
             for (row_id, value) in zip(row_ids, values):
-                dynamic_table[property_name].data[ids.index(row_id)] = value
+                dynamic_table[property_name].data[id_index[row_id]] = value
         else:
             col_data = [default_value] * len(ids)  # init with default val
             for (row_id, value) in zip(row_ids, values):
-                col_data[ids.index(row_id)] = value
+                col_data[id_index[row_id]] = value
             dynamic_table.add_column(
                 name=property_name,
                 description=description,
@@ -78,9 +123,8 @@ def find_all_unit_property_names(properties_dict: dict, features_dict: dict):
     Finds all existing units properties and units spikes features in the sorting
     dictionaries.
     """
-    properties_set = set()
-    for k, v in properties_dict.items():
-        properties_set.update(list(v.keys()))
+    # unit properties are stored in one column per property name
+    properties_set = set(properties_dict.keys())
 
     features_set = set()
     for k, v in features_dict.items():
@@ -171,6 +215,12 @@ class NwbRecordingExtractor(se.RecordingExtractor):
 
             self.num_frames = int(es.data.shape[0])
             num_channels = len(es.electrodes.table.id[:])
+            # the traces are read directly from the h5py dataset, which is opened for each read so that the file is
+            # not kept open (and locked) while the extractor is alive
+            self._data_path = es.data.name
+            # column of each channel id in the data
+            es_channel_ids = np.array(es.electrodes.table.id[:])[es.electrodes.data[:]].tolist()
+            self._channel_columns = {ch: col for col, ch in enumerate(es_channel_ids)}
 
             # Channels gains - for RecordingExtractor, these are values to cast traces to uV
             if es.channel_conversion is not None:
@@ -252,22 +302,9 @@ class NwbRecordingExtractor(se.RecordingExtractor):
 
     @check_get_traces_args
     def get_traces(self, channel_ids=None, start_frame=None, end_frame=None):
-        with NWBHDF5IO(self._path, 'r') as io:
-            nwbfile = io.read()
-            es = nwbfile.acquisition[self._electrical_series_name]
-            es_channel_ids = np.array(es.electrodes.table.id[:])[es.electrodes.data[:]].tolist()
-            table_ids = [es_channel_ids.index(id) for id in channel_ids]
-            if np.array(channel_ids).size > 1 and np.any(np.diff(channel_ids) < 0):
-                sorted_idx = np.argsort(table_ids)
-                recordings = es.data[start_frame:end_frame, np.sort(table_ids)].T
-                traces = recordings[sorted_idx, :]
-            else:
-                traces = es.data[start_frame:end_frame, table_ids].T
-            # This DatasetView and lazy operations will only work within context
-            # We're keeping the non-lazy version for now
-            # es_view = DatasetView(es.data)  # es is an instantiated h5py dataset
-            # traces = es_view.lazy_slice[start_frame:end_frame, channel_ids].lazy_transpose()
-        return traces
+        columns = np.array([self._channel_columns[ch] for ch in channel_ids], dtype='int64')
+        with h5py.File(self._path, 'r') as f:
+            return read_channel_traces(f[self._data_path], columns, start_frame, end_frame, time_axis=0)
 
     def get_sampling_frequency(self):
         return self.sampling_frequency
@@ -411,10 +448,13 @@ class NwbRecordingExtractor(se.RecordingExtractor):
         return nwbfile
 
     @staticmethod
-    def add_electrical_series(recording, nwbfile, metadata):
+    def add_electrical_series(recording, nwbfile, metadata, chunk_mb=500, chunk_shape=None, compression=None,
+                              compression_opts=None, dtype=None):
         """
         Auxiliary static method for nwbextractor.
         Adds traces from recording object as ElectricalSeries to nwbfile object.
+        The traces are written in time chunks of 'chunk_mb' Mb (all channels at once), with an optional HDF5
+        chunk shape (frames, channels), compression ('gzip' or 'lzf') and dtype.
         """
         # ElectricalSeries
         if 'ElectricalSeries' not in metadata['Ecephys']:
@@ -448,14 +488,11 @@ class NwbRecordingExtractor(se.RecordingExtractor):
                 scalar_conversion = 1.
                 channel_conversion = gains * 1e-6
 
-            def data_generator(recording, channels_ids):
-                #  generates data chunks for iterator
-                for id in channels_ids:
-                    data = recording.get_traces(channel_ids=[id]).flatten()
-                    yield data
-
-            data = data_generator(recording=recording, channels_ids=curr_ids)
-            ephys_data = DataChunkIterator(data=data, iter_axis=1)
+            ephys_data = TracesChunkIterator(recording=recording, channel_ids=curr_ids, chunk_mb=chunk_mb,
+                                             dtype=dtype, chunk_shape=chunk_shape)
+            if compression is not None or chunk_shape is not None:
+                ephys_data = H5DataIO(data=ephys_data, chunks=chunk_shape, compression=compression,
+                                      compression_opts=compression_opts)
             acquisition_name = es['name']
 
             # To get traces in Volts = data*channel_conversion*conversion
@@ -503,7 +540,8 @@ class NwbRecordingExtractor(se.RecordingExtractor):
         return nwbfile
 
     @staticmethod
-    def write_recording(recording, save_path, metadata=None):
+    def write_recording(recording, save_path, metadata=None, chunk_mb=500, chunk_shape=None, compression=None,
+                        compression_opts=None, dtype=None):
         '''
 
         Parameters
@@ -512,6 +550,16 @@ class NwbRecordingExtractor(se.RecordingExtractor):
         save_path: str
         metadata: dict
             metadata info for constructing the nwb file (optional).
+        chunk_mb: int
+            Size in Mb of the time chunks (all channels) in which the traces are read and written (default 500Mb)
+        chunk_shape: tuple
+            HDF5 chunk shape (frames, channels) of the traces dataset. If None, it is chosen by h5py
+        compression: str
+            HDF5 compression of the traces: 'gzip', 'lzf' or None (default)
+        compression_opts: int
+            Compression options (e.g. the gzip level, 0-9)
+        dtype: dtype
+            The dtype of the written traces. If None, the dtype of the recording is used
         '''
         assert HAVE_NWB, NwbRecordingExtractor.installation_mesg
 
@@ -565,7 +613,12 @@ class NwbRecordingExtractor(se.RecordingExtractor):
             nwbfile = se.NwbRecordingExtractor.add_electrical_series(
                 recording=recording,
                 nwbfile=nwbfile,
-                metadata=metadata
+                metadata=metadata,
+                chunk_mb=chunk_mb,
+                chunk_shape=chunk_shape,
+                compression=compression,
+                compression_opts=compression_opts,
+                dtype=dtype
             )
 
             # Add epochs
@@ -618,23 +671,48 @@ class NwbSortingExtractor(se.SortingExtractor):
                 self._sampling_frequency = sampling_frequency
 
             # get all units ids
-            units_ids = nwbfile.units.id[:]
+            units = nwbfile.units
+            self._unit_ids = [int(i) for i in units.id[:]]
+
+            # the spike times of all units are read once and kept as a ragged (CSR) array: the spike frames of the
+            # i-th unit are self._spike_frames[self._spike_offsets[i]:self._spike_offsets[i + 1]], sorted in time
+            spike_times_index = units['spike_times_index']
+            self._spike_offsets = np.append(0, spike_times_index.data[:]).astype('int64')
+            spike_frames = self.time_to_frame(np.asarray(spike_times_index.target.data[:]))
+            spike_unit_idxs = np.repeat(np.arange(len(self._unit_ids)), np.diff(self._spike_offsets))
+            if np.any((np.diff(spike_frames) < 0) & (np.diff(spike_unit_idxs) == 0)):
+                spike_order = np.lexsort((spike_frames, spike_unit_idxs))
+                spike_frames = spike_frames[spike_order]
+            else:
+                spike_order = None
+            self._spike_frames = spike_frames
 
             # store units properties and spike features to dictionaries
-            all_pr_ft = list(nwbfile.units.colnames)
-            all_names = [i.name for i in nwbfile.units.columns]
+            all_pr_ft = list(units.colnames)
+            all_names = [i.name for i in units.columns]
             for item in all_pr_ft:
                 if item == 'spike_times':
                     continue
                 # test if item is a unit_property or a spike_feature
                 if item + '_index' in all_names:  # if it has index, it is a spike_feature
-                    for id in units_ids:
-                        ind = list(units_ids).index(id)
-                        self.set_unit_spike_features(id, item, nwbfile.units[item][ind])
+                    feature_index = units[item + '_index']
+                    feature_offsets = np.append(0, feature_index.data[:]).astype('int64')
+                    if np.array_equal(feature_offsets, self._spike_offsets):
+                        # one value per spike: the whole column is set at once, in the spike order
+                        values = np.asarray(feature_index.target.data[:])
+                        if spike_order is not None:
+                            values = values[spike_order]
+                        self.set_units_spike_features(item, values, spike_labels=np.repeat(
+                            self._unit_ids, np.diff(self._spike_offsets)))
+                    else:
+                        for ind, id in enumerate(self._unit_ids):
+                            self.set_unit_spike_features(id, item, units[item][ind])
+                elif isinstance(units[item], DynamicTableRegion):
+                    for ind, id in enumerate(self._unit_ids):
+                        self.set_unit_property(id, item, units[item][ind])
                 else:  # if it is unit_property
-                    for id in units_ids:
-                        ind = list(units_ids).index(id)
-                        self.set_unit_property(id, item, nwbfile.units[item][ind])
+                    self.set_units_property(unit_ids=self._unit_ids, property_name=item,
+                                            values=units[item].data[:])
 
             # Fill epochs dictionary
             self._epochs = {}
@@ -655,27 +733,19 @@ class NwbSortingExtractor(se.SortingExtractor):
         unit_ids: array_like
             A list of the unit ids in the sorted result (ints).
         '''
-        check_nwb_install()
-        with NWBHDF5IO(self._path, 'r') as io:
-            nwbfile = io.read()
-            unit_ids = [int(i) for i in nwbfile.units.id[:]]
-        return unit_ids
+        return list(self._unit_ids)
 
     @check_valid_unit_id
     def get_unit_spike_train(self, unit_id, start_frame=None, end_frame=None):
         start_frame, end_frame = self._cast_start_end_frame(start_frame, end_frame)
-        if start_frame is None:
-            start_frame = 0
-        if end_frame is None:
-            end_frame = np.Inf
-        check_nwb_install()
-        with NWBHDF5IO(self._path, 'r') as io:
-            nwbfile = io.read()
-            # chosen unit and interval
-            times = nwbfile.units['spike_times'][list(nwbfile.units.id[:]).index(unit_id)][:]
-            # spike times are measured in samples
-            frames = self.time_to_frame(times)
-        return frames[(frames > start_frame) & (frames < end_frame)]
+        unit_idx = self._get_unit_index()[unit_id]
+        frames = self._spike_frames[self._spike_offsets[unit_idx]:self._spike_offsets[unit_idx + 1]]
+        return get_spike_train_range(frames, start_frame, end_frame)
+
+    def get_all_spike_trains(self):
+        # the spike frames are stored grouped by unit, following get_unit_ids()
+        self._cache_spike_trains(self._spike_frames, self._spike_offsets)
+        return self._spike_frames, self._spike_offsets
 
     def time_to_frame(self, time):
         return np.round(time * self.get_sampling_frequency()).astype('int')
@@ -730,10 +800,9 @@ class NwbSortingExtractor(se.SortingExtractor):
 
             # Units properties
             for pr in all_properties:
-                unit_ids = [int(k) for k, v in sorting._properties.items()
-                            if pr in v]
-                vals = [v[pr] for k, v in sorting._properties.items()
-                        if pr in v]
+                has_property = sorting._get_units_property_mask(pr, ids)
+                unit_ids = [int(u) for (u, has_pr) in zip(ids, has_property) if has_pr]
+                vals = list(sorting.get_units_property(unit_ids=unit_ids, property_name=pr))
                 set_dynamic_table_property(
                     dynamic_table=nwbfile.units,
                     row_ids=unit_ids,
@@ -769,7 +838,7 @@ class NwbSortingExtractor(se.SortingExtractor):
                 spikes_index = np.cumsum(nspks_list).tolist()
                 set_dynamic_table_property(
                     dynamic_table=nwbfile.units,
-                    row_ids=ids,
+                    row_ids=[int(k) for k in ids],
                     property_name=ft,
                     values=flatten_vals,
                     index=spikes_index,
@@ -1,6 +1,7 @@
 from spikeextractors import SortingExtractor, RecordingExtractor
 from spikeextractors.extractors.bindatrecordingextractor import BinDatRecordingExtractor
-from spikeextractors.extraction_tools import read_python, write_python, check_valid_unit_id
+from spikeextractors.extraction_tools import read_python, write_python, check_valid_unit_id, get_spike_train_range, \
+    extract_unit_waveforms
 import numpy as np
 from pathlib import Path
 import csv
@@ -54,100 +55,94 @@ class PhySortingExtractor(SortingExtractor):
     mode = 'folder'
     installation_mesg = ""  # error message when not installed
 
-    def __init__(self, folder_path, exclude_cluster_groups=None, load_waveforms=False, verbose=False):
+    def __init__(self, folder_path, exclude_cluster_groups=None, load_waveforms=False, verbose=False, memmap=False):
         SortingExtractor.__init__(self)
         phy_folder = Path(folder_path)
 
-        spike_times = np.load(phy_folder / 'spike_times.npy')
-        spike_templates = np.load(phy_folder / 'spike_templates.npy')
+        mmap_mode = 'r' if memmap else None
+        spike_times = np.ravel(np.load(phy_folder / 'spike_times.npy', mmap_mode=mmap_mode))
 
         if (phy_folder /'spike_clusters.npy').is_file():
-            spike_clusters = np.load(phy_folder / 'spike_clusters.npy')
+            spike_clusters = np.ravel(np.load(phy_folder / 'spike_clusters.npy'))
         else:
-            spike_clusters = spike_templates
+            spike_clusters = np.ravel(np.load(phy_folder / 'spike_templates.npy'))
 
         if (phy_folder / 'amplitudes.npy').is_file():
-            amplitudes = np.load(phy_folder / 'amplitudes.npy')
+            amplitudes = np.load(phy_folder / 'amplitudes.npy', mmap_mode=mmap_mode)
         else:
             amplitudes = np.ones(len(spike_times))
 
         if (phy_folder /'pc_features.npy').is_file():
-            pc_features = np.load(phy_folder / 'pc_features.npy')
+            pc_features = np.load(phy_folder / 'pc_features.npy', mmap_mode=mmap_mode)
         else:
             pc_features = None
 
-        clust_id = np.unique(spike_clusters)
+        # spikes are grouped by cluster with a single stable sort, which keeps the order of the files (sorted in
+        # time) within each cluster. The spike times are loaded in memory in this order, also with memmap (which
+        # only applies to the spike features): the spikes of a unit are self._spike_times[start:end], with
+        # (start, end) = self._spike_slices[unit_id]
+        spike_order = np.argsort(spike_clusters, kind='stable')
+        sorted_clusters = spike_clusters[spike_order]
+        grouped_times = spike_times[spike_order].astype('int64')
+        files_sorted = not np.any((grouped_times[1:] < grouped_times[:-1]) &
+                                  (sorted_clusters[1:] == sorted_clusters[:-1]))
+        if not files_sorted:
+            spike_order = np.lexsort((spike_times, spike_clusters))
+            grouped_times = spike_times[spike_order].astype('int64')
+        clust_id = np.unique(sorted_clusters)
         self._unit_ids = list(clust_id)
-        spike_times.astype(int)
         self.params = read_python(str(phy_folder / 'params.py'))
         self._sampling_frequency = self.params['sample_rate']
 
         # set unit quality properties
+        unit_properties = {}
         csv_tsv_files = [x for x in phy_folder.iterdir() if x.suffix == '.csv' or x.suffix == '.tsv']
         for f in csv_tsv_files:
-            if f.suffix == '.csv':
-                with f.open() as csv_file:
-                    csv_reader = csv.reader(csv_file, delimiter=',')
-                    line_count = 0
-                    for row in csv_reader:
-                        if line_count == 0:
-                            tokens = row[0].split("\t")
-                            property_name = tokens[1]
-                        else:
-                            tokens = row[0].split("\t")
-                            if int(tokens[0]) in self.get_unit_ids():
-                                if 'cluster_group' in str(f):
-                                    self.set_unit_property(int(tokens[0]), 'quality', tokens[1])
-                                elif property_name == 'ch_group':
-                                    self.set_unit_property(int(tokens[0]), 'group', tokens[1])
-                                else:
-                                    if isinstance(tokens[1], (int, np.int, float, np.float, str)):
-                                        self.set_unit_property(int(tokens[0]), property_name, tokens[1])
-                            line_count += 1
-            elif f.suffix == '.tsv':
-                with f.open() as csv_file:
-                    csv_reader = csv.reader(csv_file, delimiter='\t')
-                    line_count = 0
-                    for row in csv_reader:
-                        if line_count == 0:
-                            property_name = row[1]
-                        else:
-                            if len(row) == 2:
-                                if int(row[0]) in self.get_unit_ids():
-                                    if 'cluster_group' in str(f):
-                                        self.set_unit_property(int(row[0]), 'quality', row[1])
-                                    elif property_name == 'ch_group':
-                                        self.set_unit_property(int(row[0]), 'group', row[1])
-                                    else:
-                                        if isinstance(row[1], (int, np.int, float, np.float, str)) and len(row) == 2:
-                                            self.set_unit_property(int(row[0]), property_name, row[1])
-                        line_count += 1
-
-        for unit in self.get_unit_ids():
-            if 'quality' not in self.get_unit_property_names(unit):
-                self.set_unit_property(unit, 'quality', 'unsorted')
+            property_name, cluster_ids, values = _read_cluster_table(f)
+            if property_name is None:
+                continue
+            if 'cluster_group' in str(f):
+                property_name = 'quality'
+            elif property_name == 'ch_group':
+                property_name = 'group'
+            valid = np.isin(cluster_ids, clust_id)
+            unit_properties.setdefault(property_name, {}).update(zip(cluster_ids[valid].tolist(), values[valid]))
+
+        quality = unit_properties.setdefault('quality', {})
+        for unit in self._unit_ids:
+            quality.setdefault(unit, 'unsorted')
+        for property_name, values in unit_properties.items():
+            self.set_units_property(unit_ids=list(values.keys()), property_name=property_name,
+                                    values=list(values.values()))
 
         if exclude_cluster_groups is not None:
             if len(exclude_cluster_groups) > 0:
-                included_units = []
-                for u in self.get_unit_ids():
-                    if self.get_unit_property(u, 'quality') not in exclude_cluster_groups:
-                        included_units.append(u)
+                qualities = self.get_units_property(property_name='quality')
+                included_units = [u for (u, q) in zip(self._unit_ids, qualities) if q not in exclude_cluster_groups]
             else:
                 included_units = self._unit_ids
         else:
             included_units = self._unit_ids
 
-        original_units = self._unit_ids
         self._unit_ids = included_units
-        # set features
-        self._spiketrains = []
-        for clust in self._unit_ids:
-            idx = np.where(spike_clusters == clust)[0]
-            self._spiketrains.append(spike_times[idx])
-            self.set_unit_spike_features(clust, 'amplitudes', amplitudes[idx])
-            if pc_features is not None:
-                self.set_unit_spike_features(clust, 'pc_features', pc_features[idx])
+        self._reset_unit_index()
+        keep = np.isin(sorted_clusters, included_units)
+        self._spike_times = grouped_times[keep]
+        starts = np.searchsorted(sorted_clusters[keep], included_units, side='left')
+        ends = np.searchsorted(sorted_clusters[keep], included_units, side='right')
+        self._spike_slices = dict(zip([int(u) for u in included_units], zip(starts.tolist(), ends.tolist())))
+        self._offsets = np.append(starts, len(self._spike_times)).astype('int64')
+
+        # amplitudes and pc features are stored unit by unit in contiguous arrays (memory mapped if memmap)
+        features = {'amplitudes': amplitudes}
+        if pc_features is not None:
+            features['pc_features'] = pc_features
+        for feature_name, values in features.items():
+            if files_sorted:
+                self.set_units_spike_features(feature_name, values, spike_labels=spike_clusters, memmap=memmap)
+            else:
+                self.set_units_spike_features(feature_name, values[spike_order], spike_labels=sorted_clusters,
+                                              memmap=memmap)
 
         if load_waveforms:
             datfile = self.params["dat_path"]
@@ -166,22 +161,20 @@ class PhySortingExtractor(SortingExtractor):
                     channel_groups = np.array([i//4 for i in range(64)])
                 assert len(channel_groups) == recording.get_num_channels()
                 recording.set_channel_groups(channel_groups)
-                for u_i, u in enumerate(self.get_unit_ids()):
-                    if verbose:
-                        print('Computing waveform by group for unit', u)
-                    frames_before = 10
-                    frames_after = 40
-                    spiketrain = self.get_unit_spike_train(u)
-                    if 'group' in self.get_unit_property_names(u):
+                if verbose:
+                    print('Computing waveforms by group')
+                unit_ids = self.get_unit_ids()
+                has_group = self._get_units_property_mask('group', unit_ids)
+                # units without group are extracted on all channels and assigned to the group of their max channel
+                unit_channel_ids = {}
+                for u, grouped in zip(unit_ids, has_group):
+                    if grouped:
                         group_to_match = int(self.get_unit_property(u, 'group'))
-                        matches = np.nonzero(channel_groups == group_to_match)
-                        group_idx = matches[0]
-                        wf = recording.get_snippets(reference_frames=spiketrain,
-                                                    snippet_len=[frames_before, frames_after],
-                                                    channel_ids=group_idx)
-                    else:
-                        wf = recording.get_snippets(reference_frames=spiketrain,
-                                                    snippet_len=[frames_before, frames_after])
+                        unit_channel_ids[u] = list(np.nonzero(channel_groups == group_to_match)[0])
+                waveforms = extract_unit_waveforms(recording, self, unit_ids=unit_ids, snippet_len=[10, 40],
+                                                   unit_channel_ids=unit_channel_ids, memmap=memmap)
+                for u, grouped, wf in zip(unit_ids, has_group, waveforms):
+                    if not grouped:
                         max_chan = np.unravel_index(np.argmin(np.mean(wf, axis=0)), np.mean(wf, axis=0).shape)[0]
                         group = recording.get_channel_groups(int(max_chan))
                         self.set_unit_property(u, 'group', group)
@@ -189,18 +182,20 @@ class PhySortingExtractor(SortingExtractor):
                         wf = wf[:, group_idx]
                     self.set_unit_spike_features(u, 'waveforms', wf)
             else:
-                for u_i, u in enumerate(self.get_unit_ids()):
-                    if verbose:
-                        print('Computing full waveform for unit', u)
-                    frames_before = 0.5 * recording.get_sampling_frequency()
-                    frames_after = 2 * recording.get_sampling_frequency()
-                    spiketrain = self.get_unit_spike_train(u)
-                    wf = recording.get_snippets(reference_frames=spiketrain,
-                                                snippet_len=[int(frames_before), int(frames_after)])
+                if verbose:
+                    print('Computing full waveforms')
+                # 0.5 ms before and 2 ms after each spike
+                frames_before = 0.5 * recording.get_sampling_frequency() / 1000
+                frames_after = 2 * recording.get_sampling_frequency() / 1000
+                unit_ids = self.get_unit_ids()
+                waveforms = extract_unit_waveforms(recording, self, unit_ids=unit_ids,
+                                                   snippet_len=[int(frames_before), int(frames_after)],
+                                                   memmap=memmap)
+                for u, wf in zip(unit_ids, waveforms):
                     self.set_unit_spike_features(u, 'waveforms', wf)
         self._kwargs = {'folder_path': str(Path(folder_path).absolute()),
                         'exclude_cluster_groups': exclude_cluster_groups,
-                        'load_waveforms': load_waveforms, 'verbose': verbose}
+                        'load_waveforms': load_waveforms, 'verbose': verbose, 'memmap': memmap}
 
     def get_unit_ids(self):
         return list(self._unit_ids)
@@ -208,10 +203,30 @@ class PhySortingExtractor(SortingExtractor):
     @check_valid_unit_id
     def get_unit_spike_train(self, unit_id, start_frame=None, end_frame=None):
         start_frame, end_frame = self._cast_start_end_frame(start_frame, end_frame)
-        if start_frame is None:
-            start_frame = 0
-        if end_frame is None:
-            end_frame = np.Inf
-        times = self._spiketrains[self.get_unit_ids().index(unit_id)]
-        inds = np.where((start_frame <= times) & (times < end_frame))
-        return times[inds]
+        start, end = self._spike_slices[unit_id]
+        return get_spike_train_range(self._spike_times[start:end], start_frame, end_frame)
+
+    def get_all_spike_trains(self):
+        # the spikes are stored grouped by unit, following get_unit_ids()
+        self._cache_spike_trains(self._spike_times, self._offsets)
+        return self._spike_times, self._offsets
+
+
+def _read_cluster_table(file_path):
+    # reads a phy cluster table (cluster_*.tsv, or tab separated .csv) column-wise: returns the name of the
+    # property and the arrays of cluster ids and values
+    delimiter = '\t' if file_path.suffix == '.tsv' else ','
+    with file_path.open() as f:
+        rows = list(csv.reader(f, delimiter=delimiter))
+    if file_path.suffix == '.csv':
+        rows = [row[0].split('\t') for row in rows if len(row) > 0]
+    if len(rows) == 0 or len(rows[0]) < 2:
+        return None, None, None
+    property_name = rows[0][1]
+    if file_path.suffix == '.tsv':
+        rows = [row for row in rows[1:] if len(row) == 2]
+    else:
+        rows = [row[:2] for row in rows[1:] if len(row) >= 2]
+    cluster_ids = np.array([int(row[0]) for row in rows], dtype='int64')
+    values = np.array([row[1] for row in rows], dtype=object)
+    return property_name, cluster_ids, values
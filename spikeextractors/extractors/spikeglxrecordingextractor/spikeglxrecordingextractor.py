@@ -1,8 +1,10 @@
 from spikeextractors import RecordingExtractor
-from .readSGLX import readMeta, SampRate, makeMemMapRaw, GainCorrectIM, GainCorrectNI
+from .readSGLX import readMeta, SampRate, makeMemMapRaw, GainCorrectIM, GainCorrectNI, ChannelCountsIM, \
+    ChannelCountsNI
 import numpy as np
+import re
 from pathlib import Path
-from spikeextractors.extraction_tools import check_get_traces_args
+from spikeextractors.extraction_tools import check_get_traces_args, read_channel_traces, get_chunk_size
 
 
 class SpikeGLXRecordingExtractor(RecordingExtractor):
@@ -36,14 +38,16 @@ class SpikeGLXRecordingExtractor(RecordingExtractor):
 
         # Traces in 16-bit format
         rawData = makeMemMapRaw(self._npxfile, meta)
+        self._meta = meta
         self._timeseries = rawData  # [chanList, firstSamp:lastSamp+1]
 
         # sampling rate and ap channels
         self._sampling_frequency = SampRate(meta)
         tot_chan, ap_chan, locations = _parse_spikeglx_metafile(self._metafile, x_pitch, y_pitch)
+        # the saved channels after the ap channels (e.g. the sync channel) stay in the memory map for
+        # get_sync_events: get_traces only reads the indices of self._channels
         if ap_chan < tot_chan:
             self._channels = list(range(int(ap_chan)))
-            self._timeseries = self._timeseries[0:ap_chan, :]
         else:
             self._channels = list(range(int(tot_chan)))  # OriginalChans(meta).tolist()
 
@@ -73,10 +77,43 @@ class SpikeGLXRecordingExtractor(RecordingExtractor):
 
     @check_get_traces_args
     def get_traces(self, channel_ids=None, start_frame=None, end_frame=None):
-        channel_idxs = [self._channels.index(ch) for ch in channel_ids]
+        channel_idxs = self.ids_to_indices(channel_ids)
         recordings = self._timeseries[channel_idxs, start_frame:end_frame]
         return recordings
 
+    def get_sync_events(self, lines=None, dw=0, chunk_size=None, chunk_mb=500, cache=False):
+        '''Finds the rising and falling edges of the lines (bits) of a digital word saved in the file, e.g. the imec
+        sync channel. The digital channel is scanned in chunks, so the recording is never loaded in memory.
+
+        Parameters
+        ----------
+        lines: list or None
+            The lines (0 to 15) of the digital word. If None, all lines are returned
+        dw: int
+            Zero-based index of the digital word in the saved channels (default 0, imec files have only one)
+        chunk_size: None or int
+            Number of frames of each chunk. If None, the chunk size is computed from 'chunk_mb'
+        chunk_mb: None or int
+            Chunk size in Mb (default 500Mb)
+        cache: bool
+            If True, the events are saved in (and later loaded from) a '.sync_dw<dw>.npz' file next to the .bin file.
+            They are recomputed if the size or modification time of the .bin file changed
+
+        Returns
+        -------
+        events: dict
+            For each line, a dict with the frames of the 'rising' and 'falling' edges
+        '''
+        digital_channel = _get_digital_channel(self._meta, dw)
+        cache_file = None
+        if cache:
+            cache_file = self._basepath / (self._npxfile.stem + '.sync_dw{}.npz'.format(dw))
+        return _get_sync_events(lambda start_frame, end_frame:
+                                self._timeseries[digital_channel, start_frame:end_frame],
+                                self._timeseries.shape[1], lines,
+                                get_chunk_size(self, chunk_size, chunk_mb, num_channels=1), cache_file,
+                                [self._npxfile])
+
     @staticmethod
     def write_recording(recording, save_path, dtype=None, transpose=False):
         save_path = Path(save_path)
@@ -90,6 +127,266 @@ class SpikeGLXRecordingExtractor(RecordingExtractor):
                 np.array(recording.get_traces(), dtype=dtype).tofile(f)
 
 
+class SpikeGLXSessionRecordingExtractor(RecordingExtractor):
+    extractor_name = 'SpikeGLXSessionRecordingExtractor'
+    has_default_locations = True
+    installed = True  # check at class level if installed or not
+    is_writable = False
+    mode = 'folder'
+    installation_mesg = ""  # error message when not installed
+
+    def __init__(self, folder_path, stream='ap', probe_ids=None, x_pitch=21, y_pitch=20):
+        '''Recording extractor of a SpikeGLX session split in several files (gates '_g0', '_g1', ... and triggers
+        '_t0', '_t1', ...) and several imec probes. The .bin files of each probe are found from their .meta files
+        in 'folder_path' (and its subfolders), sorted by gate and trigger, memory mapped and concatenated in time.
+        The neural channels of all probes are exposed in a single recording, and the probe of each channel is its
+        channel group. Only metadata are read at initialization.
+
+        Parameters
+        ----------
+        folder_path: str
+            The folder of the SpikeGLX session
+        stream: str
+            'ap' or 'lf' (default 'ap')
+        probe_ids: list or None
+            The imec probes to load (e.g. [0, 1]). If None, all the probes found in the folder are loaded
+        x_pitch: float
+            The x pitch of the probe contacts in um (default 21)
+        y_pitch: float
+            The y pitch of the probe contacts in um (default 20)
+        '''
+        assert stream in ['ap', 'lf'], "'stream' should be 'ap' or 'lf'"
+        RecordingExtractor.__init__(self)
+        if stream == 'ap':
+            self.is_filtered = True
+        self._folder_path = Path(folder_path)
+        bin_files = _find_spikeglx_session_files(self._folder_path, stream)
+        if probe_ids is None:
+            probe_ids = sorted(bin_files.keys())
+        assert len(probe_ids) > 0, "No SpikeGLX '{}' files found in {}".format(stream, folder_path)
+        for probe_id in probe_ids:
+            assert probe_id in bin_files, "No SpikeGLX '{}' files found for probe {}".format(stream, probe_id)
+        self._probe_ids = list(probe_ids)
+
+        self._bin_files = []
+        self._num_saved_channels = []
+        # first frame of each segment (file) of each probe in the concatenated recording
+        self._segment_starts = []
+        self._sync_channels = []
+        channel_probes, channel_locals, gains, locations = [], [], [], []
+        sampling_frequencies = []
+        for i, probe_id in enumerate(self._probe_ids):
+            metas = [readMeta(bin_file) for bin_file in bin_files[probe_id]]
+            num_saved_channels = int(metas[0]['nSavedChans'])
+            for bin_file, meta in zip(bin_files[probe_id], metas):
+                assert int(meta['nSavedChans']) == num_saved_channels, \
+                    "{} has a different number of channels".format(bin_file)
+            num_frames = [int(meta['fileSizeBytes']) // (2 * num_saved_channels) for meta in metas]
+            ap_channels, lf_channels, sync_channels = ChannelCountsIM(metas[0])
+            num_channels = ap_channels + lf_channels
+            # the sync channel is saved after the neural channels
+            self._sync_channels.append(num_channels if sync_channels > 0 else None)
+            self._bin_files.append(bin_files[probe_id])
+            self._num_saved_channels.append(num_saved_channels)
+            self._segment_starts.append(np.concatenate(([0], np.cumsum(num_frames))).astype('int64'))
+            sampling_frequencies.append(SampRate(metas[0]))
+
+            channel_probes.append(np.full(num_channels, i, dtype='int64'))
+            channel_locals.append(np.arange(num_channels, dtype='int64'))
+            gains.append(GainCorrectIM(None, list(range(num_channels)), metas[0]) * 1e6)
+            _, _, probe_locations = _parse_spikeglx_metafile(bin_files[probe_id][0].with_suffix('.meta'),
+                                                             x_pitch, y_pitch)
+            locations.append(probe_locations[:num_channels])
+
+        # probes are assumed to be synchronized: the first probe gives the sampling frequency and the recording is
+        # as long as the shortest probe
+        self._sampling_frequency = sampling_frequencies[0]
+        self._num_frames = int(min(starts[-1] for starts in self._segment_starts))
+        self._channel_probes = np.concatenate(channel_probes)
+        self._channel_locals = np.concatenate(channel_locals)
+        self._channels = list(range(len(self._channel_probes)))
+
+        self.set_channel_groups([self._probe_ids[p] for p in self._channel_probes])
+        self.set_channel_gains(self._channels, np.concatenate(gains))
+        if all(len(loc) == len(ch) for loc, ch in zip(locations, channel_locals)):
+            self.set_channel_locations(np.concatenate([np.array(loc, dtype='float').reshape(-1, 2)
+                                                       for loc in locations]))
+        self._kwargs = {'folder_path': str(self._folder_path.absolute()), 'stream': stream,
+                        'probe_ids': probe_ids, 'x_pitch': x_pitch, 'y_pitch': y_pitch}
+
+    def get_channel_ids(self):
+        return self._channels
+
+    def get_num_frames(self):
+        return self._num_frames
+
+    def get_sampling_frequency(self):
+        return self._sampling_frequency
+
+    @check_get_traces_args
+    def get_traces(self, channel_ids=None, start_frame=None, end_frame=None):
+        channel_idxs = self.ids_to_indices(channel_ids)
+        probes = self._channel_probes[channel_idxs]
+        if len(np.unique(probes)) <= 1:
+            probe = probes[0] if len(probes) > 0 else 0
+            return self._get_probe_traces(probe, self._channel_locals[channel_idxs], start_frame, end_frame)
+        traces = np.empty((len(channel_idxs), end_frame - start_frame), dtype='int16')
+        for probe in np.unique(probes):
+            mask = probes == probe
+            traces[mask] = self._get_probe_traces(probe, self._channel_locals[channel_idxs[mask]],
+                                                  start_frame, end_frame)
+        return traces
+
+    def get_sync_events(self, probe_id=None, lines=None, chunk_size=None, chunk_mb=500, cache=False):
+        '''Finds the rising and falling edges of the lines (bits) of the sync channel of a probe over the whole
+        session. The sync channel is scanned in chunks, so the session is never loaded in memory.
+
+        Parameters
+        ----------
+        probe_id: int or None
+            The imec probe. If None, the first probe is used
+        lines: list or None
+            The lines (0 to 15) of the sync channel. If None, all lines are returned
+        chunk_size: None or int
+            Number of frames of each chunk. If None, the chunk size is computed from 'chunk_mb'
+        chunk_mb: None or int
+            Chunk size in Mb (default 500Mb)
+        cache: bool
+            If True, the events are saved in (and later loaded from) a '.session_sync.npz' file next to the first
+            .bin file of the probe. They are recomputed if the .bin files of the probe, or their sizes or modification
+            times, changed
+
+        Returns
+        -------
+        events: dict
+            For each line, a dict with the frames of the 'rising' and 'falling' edges (in the concatenated session)
+        '''
+        probe = 0 if probe_id is None else self._probe_ids.index(probe_id)
+        sync_channel = self._sync_channels[probe]
+        if sync_channel is None:
+            raise ValueError("No sync channel saved for probe {}".format(self._probe_ids[probe]))
+        cache_file = None
+        if cache:
+            first_file = self._bin_files[probe][0]
+            cache_file = first_file.parent / (first_file.stem + '.session_sync.npz')
+        return _get_sync_events(lambda start_frame, end_frame:
+                                self._get_probe_traces(probe, [sync_channel], start_frame, end_frame)[0],
+                                int(self._segment_starts[probe][-1]), lines,
+                                get_chunk_size(self, chunk_size, chunk_mb, num_channels=1), cache_file,
+                                self._bin_files[probe])
+
+    def _get_segment(self, probe, segment):
+        # mapped copy-on-write for each read: the returned views are writable without modifying the .bin file or
+        # the views returned by other reads
+        starts = self._segment_starts[probe]
+        return np.memmap(self._bin_files[probe][segment], dtype='int16', mode='c',
+                         shape=(self._num_saved_channels[probe], starts[segment + 1] - starts[segment]),
+                         order='F').view(np.ndarray)
+
+    def _get_probe_traces(self, probe, channel_idxs, start_frame, end_frame):
+        # the segments of the frames are found by binary search: a range within one segment is a view of its file
+        starts = self._segment_starts[probe]
+        if end_frame <= start_frame:
+            return np.zeros((len(channel_idxs), 0), dtype='int16')
+        first = np.searchsorted(starts, start_frame, side='right') - 1
+        last = np.searchsorted(starts, end_frame - 1, side='right') - 1
+        if first == last:
+            return read_channel_traces(self._get_segment(probe, first), channel_idxs,
+                                       start_frame - starts[first], end_frame - starts[first])
+        traces = np.empty((len(channel_idxs), end_frame - start_frame), dtype='int16')
+        for segment in range(first, last + 1):
+            seg_start = max(start_frame, starts[segment])
+            seg_end = min(end_frame, starts[segment + 1])
+            traces[:, seg_start - start_frame:seg_end - start_frame] = \
+                read_channel_traces(self._get_segment(probe, segment), channel_idxs,
+                                    seg_start - starts[segment], seg_end - starts[segment])
+        return traces
+
+
+def _find_spikeglx_session_files(folder_path, stream):
+    # returns {probe_id: [bin files sorted by run, gate and trigger]} from the names of the .meta files, e.g.
+    # 'run_g0_t1.imec0.ap.meta' (probe 0, gate 0, trigger 1). 3A files ('run_g0_t0.imec.ap.meta') are probe 0
+    pattern = re.compile(r'^(.*)_g(\d+)_t(\d+)\.imec(\d*)\.' + stream + r'\.meta$')
+    segments = {}
+    for meta_file in Path(folder_path).rglob('*.' + stream + '.meta'):
+        match = pattern.match(meta_file.name)
+        if match is None:
+            continue
+        run, gate, trigger, probe = match.groups()
+        probe = int(probe) if probe != '' else 0
+        bin_file = meta_file.with_suffix('.bin')
+        assert bin_file.exists(), "Missing SpikeGLX binary file {}".format(bin_file)
+        segments.setdefault(probe, []).append((run, int(gate), int(trigger), bin_file))
+    return {probe: [seg[-1] for seg in sorted(segs)] for probe, segs in segments.items()}
+
+
+def _get_digital_channel(meta, dw):
+    # index of the digital word 'dw' in the saved channels (as in readSGLX.ExtractDigital)
+    if meta['typeThis'] == 'imec':
+        ap_channels, lf_channels, sync_channels = ChannelCountsIM(meta)
+        if dw >= sync_channels:
+            raise ValueError("No imec sync channel saved")
+        return ap_channels + lf_channels + dw
+    else:
+        mn_channels, ma_channels, xa_channels, dw_channels = ChannelCountsNI(meta)
+        if dw >= dw_channels:
+            raise ValueError("Maximum digital word in file = {}".format(dw_channels - 1))
+        return mn_channels + ma_channels + xa_channels + dw
+
+
+def _get_sync_events(read_word, num_frames, lines, chunk_size, cache_file=None, source_files=()):
+    # finds the edges of the 16 lines of a digital word, read in chunks with read_word(start_frame, end_frame).
+    # Only the frames where the word changes are unpacked in bits: the edges are the differences of the bits.
+    # The cache file is used only if the source files (names, sizes and modification times) are unchanged
+    if lines is None:
+        lines = list(range(16))
+    files = np.array([str(Path(source_file).absolute()) for source_file in source_files], dtype='U')
+    stats = [Path(source_file).stat() for source_file in source_files]
+    sizes = np.array([stat.st_size for stat in stats], dtype='int64')
+    mtimes = np.array([stat.st_mtime_ns for stat in stats], dtype='int64')
+    if cache_file is not None and Path(cache_file).is_file():
+        with np.load(cache_file) as cached:
+            if int(cached['num_frames']) == num_frames and 'files' in cached.files and \
+                    np.array_equal(cached['files'], files) and np.array_equal(cached['sizes'], sizes) and \
+                    np.array_equal(cached['mtimes'], mtimes):
+                return {line: {'rising': cached['rising_{}'.format(line)], 'falling': cached['falling_{}'.format(line)]}
+                        for line in lines}
+
+    bits = np.arange(16, dtype='uint16')
+    rising = [[] for _ in bits]
+    falling = [[] for _ in bits]
+    previous = None
+    for start_frame in range(0, num_frames, chunk_size):
+        end_frame = min(start_frame + chunk_size, num_frames)
+        word = np.asarray(read_word(start_frame, end_frame)).view('uint16')
+        if previous is None:
+            previous = word[0]
+        changes = np.empty(len(word), dtype='uint16')
+        changes[0] = word[0] ^ previous
+        np.bitwise_xor(word[1:], word[:-1], out=changes[1:])
+        frames = np.flatnonzero(changes)
+        if len(frames) > 0:
+            after = (word[frames, None] >> bits) & 1
+            before = ((word[frames] ^ changes[frames])[:, None] >> bits) & 1
+            edges = after.astype('int8') - before.astype('int8')
+            for bit in bits:
+                rising[bit].append(frames[edges[:, bit] == 1] + start_frame)
+                falling[bit].append(frames[edges[:, bit] == -1] + start_frame)
+        previous = word[-1]
+
+    events = {}
+    for bit in bits:
+        events[int(bit)] = {'rising': np.concatenate(rising[bit] + [np.zeros(0, dtype='int64')]),
+                            'falling': np.concatenate(falling[bit] + [np.zeros(0, dtype='int64')])}
+    if cache_file is not None:
+        arrays = {}
+        for line, line_events in events.items():
+            arrays['rising_{}'.format(line)] = line_events['rising']
+            arrays['falling_{}'.format(line)] = line_events['falling']
+        np.savez(cache_file, num_frames=num_frames, files=files, sizes=sizes, mtimes=mtimes, **arrays)
+    return {line: events[line] for line in lines}
+
+
 def _parse_spikeglx_metafile(metafile, x_pitch, y_pitch):
     tot_channels = None
     ap_channels = None
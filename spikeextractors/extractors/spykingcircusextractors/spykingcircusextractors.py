@@ -2,7 +2,7 @@ from spikeextractors import SortingExtractor
 from spikeextractors.extractors.numpyextractors import NumpyRecordingExtractor
 import numpy as np
 from pathlib import Path
-from spikeextractors.extraction_tools import check_valid_unit_id
+from spikeextractors.extraction_tools import check_valid_unit_id, sort_spike_train, get_spike_train_range
 
 try:
     import h5py
@@ -105,7 +105,7 @@ class SpykingCircusSortingExtractor(SortingExtractor):
         self._spiketrains = []
         self._unit_ids = []
         for temp in f_results['spiketimes'].keys():
-            self._spiketrains.append(np.array(f_results['spiketimes'][temp]).astype('int64'))
+            self._spiketrains.append(sort_spike_train(np.array(f_results['spiketimes'][temp]).astype('int64')))
             self._unit_ids.append(int(temp.split('_')[-1]))
 
         self._kwargs = {'folder_path': str(Path(folder_path).absolute())}
@@ -116,13 +116,8 @@ class SpykingCircusSortingExtractor(SortingExtractor):
     @check_valid_unit_id
     def get_unit_spike_train(self, unit_id, start_frame=None, end_frame=None):
         start_frame, end_frame = self._cast_start_end_frame(start_frame, end_frame)
-        if start_frame is None:
-            start_frame = 0
-        if end_frame is None:
-            end_frame = np.Inf
-        times = self._spiketrains[self.get_unit_ids().index(unit_id)]
-        inds = np.where((start_frame <= times) & (times < end_frame))
-        return times[inds]
+        times = self._spiketrains[self._get_unit_index()[unit_id]]
+        return get_spike_train_range(times, start_frame, end_frame)
 
     @staticmethod
     def write_sorting(sorting, save_path):
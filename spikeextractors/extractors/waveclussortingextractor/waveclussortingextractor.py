@@ -7,7 +7,7 @@ from scipy.spatial.distance import cdist
 import numpy as np
 
 from spikeextractors.extractors.matsortingextractor.matsortingextractor import MATSortingExtractor, HAVE_MAT
-from spikeextractors.extraction_tools import check_valid_unit_id
+from spikeextractors.extraction_tools import check_valid_unit_id, sort_spike_train, get_spike_train_range
 
 PathType = Union[str, Path]
 
@@ -30,25 +30,17 @@ class WaveClusSortingExtractor(MATSortingExtractor):
         self._spike_trains = {}
         for uid in self._unit_ids:
             mask = (classes == uid)
-            self._spike_trains[uid] = np.rint(spike_times[mask]*(sample_rate/1000))
-        self._unsorted_train = np.rint(spike_times[classes == 0] * (sample_rate / 1000))
+            self._spike_trains[uid] = sort_spike_train(np.rint(spike_times[mask]*(sample_rate/1000)))
+        self._unsorted_train = sort_spike_train(np.rint(spike_times[classes == 0] * (sample_rate / 1000)))
 
     @check_valid_unit_id
     def get_unit_spike_train(self, unit_id, start_frame=None, end_frame=None):
         start_frame, end_frame = self._cast_start_end_frame(start_frame, end_frame)
-
-        start_frame = start_frame or 0
-        end_frame = end_frame or np.infty
-        st = self._spike_trains[unit_id]
-        return st[(st >= start_frame) & (st < end_frame)]
+        return get_spike_train_range(self._spike_trains[unit_id], start_frame, end_frame)
 
     def get_unit_ids(self):
         return self._unit_ids.tolist()
 
     def get_unsorted_spike_train(self, start_frame=None, end_frame=None):
         start_frame, end_frame = self._cast_start_end_frame(start_frame, end_frame)
-
-        start_frame = start_frame or 0
-        end_frame = end_frame or np.infty
-        u = self._unsorted_train
-        return u[(u >= start_frame) & (u < end_frame)]
+        return get_spike_train_range(self._unsorted_train, start_frame, end_frame)
@@ -1,5 +1,6 @@
 from .recordingextractor import RecordingExtractor
 from .extraction_tools import check_get_traces_args
+from .baseextractor import _to_property_column
 import numpy as np
 
 # Concatenates the given recordings by channel
@@ -87,6 +88,38 @@ class MultiRecordingChannelExtractor(RecordingExtractor):
         channel_id_recording = self._channel_map[channel_id]['channel_id']
         property_names = recording.get_channel_property_names(channel_id_recording)
         return property_names
+
+    def set_channels_property(self, property_name, values, channel_ids=None):
+        if channel_ids is None:
+            channel_ids = self.get_channel_ids()
+        if len(channel_ids) != len(values):
+            raise ValueError("channel_ids and values must have same length")
+        for channel_id, value in zip(channel_ids, values):
+            self.set_channel_property(channel_id, property_name, value)
+
+    def get_channels_property(self, property_name, channel_ids=None):
+        if channel_ids is None:
+            channel_ids = self.get_channel_ids()
+        values = [self.get_channel_property(channel_id, property_name) for channel_id in channel_ids]
+        return _to_property_column(values, len(values))
+
+    def get_shared_channel_property_names(self, channel_ids=None):
+        if channel_ids is None:
+            channel_ids = self.get_channel_ids()
+        property_names = set(self.get_channel_property_names(channel_ids[0]))
+        for channel_id in channel_ids[1:]:
+            property_names = property_names.intersection(self.get_channel_property_names(channel_id))
+        return sorted(property_names)
+
+    def _get_channels_property_names(self, channel_ids):
+        property_names = set()
+        for channel_id in channel_ids:
+            property_names.update(self.get_channel_property_names(channel_id))
+        return sorted(property_names.difference(['location', 'group']))
+
+    def _get_channels_property_mask(self, property_name, channel_ids):
+        return np.array([property_name in self.get_channel_property_names(channel_id) for channel_id in channel_ids],
+                        dtype='bool')
     
 def concatenate_recordings_by_channel(recordings, groups=None):
     '''
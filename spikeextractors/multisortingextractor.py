@@ -70,6 +70,45 @@ class MultiSortingExtractor(SortingExtractor):
         unit_id_sorting = self._unit_map[unit_id]['unit_id']
         self._sortings[sorting_id].clear_unit_property(unit_id_sorting, property_name)
 
+    def set_units_property(self, *, unit_ids=None, property_name, values):
+        if unit_ids is None:
+            unit_ids = self.get_unit_ids()
+        if len(unit_ids) != len(values):
+            raise ValueError("unit_ids and values must have same length")
+        for unit_id, value in zip(unit_ids, values):
+            self.set_unit_property(unit_id, property_name, value)
+
+    def get_units_property(self, *, unit_ids=None, property_name):
+        if unit_ids is None:
+            unit_ids = self.get_unit_ids()
+        values = [self.get_unit_property(unit_id, property_name) for unit_id in unit_ids]
+        return values
+
+    def get_shared_unit_property_names(self, unit_ids=None):
+        if unit_ids is None:
+            unit_ids = self.get_unit_ids()
+        if len(unit_ids) == 0:
+            return []
+        property_names = set(self.get_unit_property_names(unit_ids[0]))
+        for unit_id in unit_ids[1:]:
+            property_names = property_names.intersection(self.get_unit_property_names(unit_id))
+        return sorted(property_names)
+
+    def _get_units_property_names(self, unit_ids):
+        property_names = set()
+        for unit_id in unit_ids:
+            property_names.update(self.get_unit_property_names(unit_id))
+        return sorted(property_names)
+
+    def _get_units_property_mask(self, property_name, unit_ids):
+        return np.array([property_name in self.get_unit_property_names(unit_id) for unit_id in unit_ids], dtype='bool')
+
+    def clear_units_property(self, property_name, unit_ids=None):
+        if unit_ids is None:
+            unit_ids = self.get_unit_ids()
+        for unit_id in unit_ids:
+            self.clear_unit_property(unit_id, property_name)
+
     def get_unit_spike_features(self, unit_id, feature_name, start_frame=None, end_frame=None):
         start_frame, end_frame = self._cast_start_end_frame(start_frame, end_frame)
         if unit_id not in self._unit_map.keys():
@@ -5,8 +5,8 @@ import shutil
 import random
 from pathlib import Path
 from .extraction_tools import load_probe_file, save_to_probe_file, write_to_binary_dat_format, \
-    write_to_h5_dataset_format, get_sub_extractors_by_property, cast_start_end_frame
-from .baseextractor import BaseExtractor
+    write_to_h5_dataset_format, get_sub_extractors_by_property, cast_start_end_frame, get_chunk_size
+from .baseextractor import BaseExtractor, _to_property_list
 
 
 class RecordingExtractor(ABC, BaseExtractor):
@@ -111,6 +111,58 @@ class RecordingExtractor(ABC, BaseExtractor):
         '''
         return len(self.get_channel_ids())
 
+    def ids_to_indices(self, channel_ids):
+        '''This function returns the indices of the given channel ids in the list of channel ids
+        of the recording (i.e. the position of each channel id in get_channel_ids()).
+
+        Parameters
+        ----------
+        channel_ids: array_like or int
+            The channel ids (ints) for which the indices will be returned
+
+        Returns
+        -------
+        channel_idxs: numpy.ndarray
+            A 1D array with the index of each channel id
+        '''
+        channel_index = self._get_channel_index()
+        if isinstance(channel_ids, (int, np.integer)):
+            channel_ids = [channel_ids]
+        try:
+            return np.array([channel_index[ch] for ch in channel_ids], dtype='int64')
+        except (KeyError, TypeError):
+            invalid_ids = [ch for ch in channel_ids if not self._is_valid_channel_id(ch)]
+            raise ValueError(str(invalid_ids) + " are not valid channel_ids")
+
+    def _get_channel_index(self):
+        # the channel_id -> index dictionary is cached until _reset_channel_index() is called, so that lookups do not
+        # read the channel ids. Channel properties are stored by index: when the dictionary is rebuilt, they are
+        # moved to the new positions of their channel ids
+        channel_index = getattr(self, '_channel_index_cache', None)
+        if channel_index is not None and self._channel_index_valid:
+            return channel_index
+        channel_ids = self.get_channel_ids()
+        if isinstance(channel_ids, np.ndarray):
+            channel_ids = channel_ids.tolist()
+        new_index = {ch: i for i, ch in enumerate(channel_ids)}
+        if channel_index is not None and len(self._properties) > 0:
+            self._remap_property_columns([channel_index.get(ch, -1) for ch in channel_ids], len(channel_index))
+        self._channel_index_cache = new_index
+        self._channel_index_valid = True
+        return new_index
+
+    def _reset_channel_index(self):
+        # must be called by extractors whose channel ids change after they have been looked up: the
+        # channel_id -> index dictionary is rebuilt at the next lookup
+        self._channel_index_valid = False
+
+    def _is_valid_channel_id(self, channel_id):
+        try:
+            return channel_id in self._get_channel_index()
+        except TypeError:
+            # unhashable
+            return False
+
     def get_dtype(self):
         return self.get_traces(channel_ids=[self.get_channel_ids()[0]], start_frame=0, end_frame=1).dtype
 
@@ -146,11 +198,15 @@ class RecordingExtractor(ABC, BaseExtractor):
         # Default implementation
         return time * self.get_sampling_frequency()
 
-    def get_snippets(self, reference_frames, snippet_len, channel_ids=None):
+    def get_snippets(self, reference_frames, snippet_len, channel_ids=None, out=None, chunk_mb=500):
         '''This function returns data snippets from the given channels that
         are starting on the given frames and are the length of the given snippet
         lengths before and after.
 
+        Reference frames are sorted and the recording is read in large contiguous blocks
+        (one get_traces call per block). Snippets are gathered from each block and stored
+        in the order of the given reference frames.
+
         Parameters
         ----------
         snippet_len: int or tuple
@@ -164,6 +220,12 @@ class RecordingExtractor(ABC, BaseExtractor):
         channel_ids: array_like
             A list or array of channel ids (ints) from which each trace will be
             extracted
+        out: np.array or np.memmap or None
+            Preallocated array of shape (len(reference_frames), num_channels, snippet_len) to be
+            filled with the snippets (e.g. allocated with the 'allocate_array' function). If None,
+            a new array is allocated
+        chunk_mb: None or int
+            Maximum size in Mb of each block of traces read from the recording (default 500Mb)
 
         Returns
         ----------
@@ -183,32 +245,116 @@ class RecordingExtractor(ABC, BaseExtractor):
 
         if channel_ids is None:
             channel_ids = self.get_channel_ids()
+        if isinstance(channel_ids, (int, np.integer)):
+            channel_ids = [channel_ids]
 
+        reference_frames = np.asarray(reference_frames)
         num_snippets = len(reference_frames)
         num_channels = len(channel_ids)
         num_frames = self.get_num_frames()
         snippet_len_total = int(snippet_len_before + snippet_len_after)
-        snippets = np.zeros((num_snippets, num_channels, snippet_len_total), dtype=self.get_dtype())
-
-        for i in range(num_snippets):
-            snippet_chunk = np.zeros((num_channels, snippet_len_total), dtype=self.get_dtype())
-            if 0 <= reference_frames[i] < num_frames:
-                snippet_range = np.array([int(reference_frames[i]) - snippet_len_before,
-                                          int(reference_frames[i]) + snippet_len_after])
-                snippet_buffer = np.array([0, snippet_len_total], dtype='int')
-                # The following handles the out-of-bounds cases
-                if snippet_range[0] < 0:
-                    snippet_buffer[0] -= snippet_range[0]
-                    snippet_range[0] -= snippet_range[0]
-                if snippet_range[1] >= num_frames:
-                    snippet_buffer[1] -= snippet_range[1] - num_frames
-                    snippet_range[1] -= snippet_range[1] - num_frames
-                snippet_chunk[:, snippet_buffer[0]:snippet_buffer[1]] = self.get_traces(channel_ids=channel_ids,
-                                                                                        start_frame=snippet_range[0],
-                                                                                        end_frame=snippet_range[1])
-            snippets[i] = snippet_chunk
+        dtype = self.get_dtype()
+
+        if out is None:
+            snippets = np.zeros((num_snippets, num_channels, snippet_len_total), dtype=dtype)
+        else:
+            assert out.shape == (num_snippets, num_channels, snippet_len_total), \
+                f"'out' must have shape {(num_snippets, num_channels, snippet_len_total)}"
+            snippets = out
+        if num_snippets == 0:
+            return snippets
+
+        # snippets with out-of-bounds reference frames are filled with zeros
+        valid = (reference_frames >= 0) & (reference_frames < num_frames)
+        if out is not None and not np.all(valid):
+            snippets[~valid] = 0
+        valid_idxs = np.where(valid)[0]
+        frames = reference_frames[valid_idxs].astype('int64')
+        order = np.argsort(frames, kind='stable')
+        frames = frames[order]
+        snippet_idxs = valid_idxs[order]
+
+        if chunk_mb is not None:
+            max_frames = max(int(chunk_mb * 1e6) // (max(num_channels, 1) * np.dtype(dtype).itemsize), 1)
+        else:
+            max_frames = num_frames
+        snippet_offsets = np.arange(snippet_len_total)
+
+        i_start = 0
+        while i_start < len(frames):
+            i_end = int(np.searchsorted(frames, frames[i_start] + max_frames, side='left'))
+            i_end = max(i_end, i_start + 1)
+            block_frames = frames[i_start:i_end]
+            # block boundaries can extend outside of the recording: out-of-bounds samples stay zero
+            block_start = int(block_frames[0]) - snippet_len_before
+            block_end = int(block_frames[-1]) + snippet_len_after
+            read_start = max(block_start, 0)
+            read_end = min(block_end, num_frames)
+            block = np.zeros((num_channels, block_end - block_start), dtype=dtype)
+            if read_end > read_start:
+                block[:, read_start - block_start:read_end - block_start] = \
+                    self.get_traces(channel_ids=channel_ids, start_frame=read_start, end_frame=read_end)
+            gather_idxs = (block_frames - snippet_len_before - block_start)[:, None] + snippet_offsets
+            snippets[snippet_idxs[i_start:i_end]] = np.transpose(block[:, gather_idxs], (1, 0, 2))
+            i_start = i_end
         return snippets
 
+    def iter_traces(self, chunk_size=None, chunk_mb=None, margin=0, channel_ids=None):
+        '''This generator iterates over the recording in chunks of frames and yields the traces of each chunk.
+        It can be used to stream recordings that do not fit in memory (e.g. to write them to file).
+
+        If 'margin' is greater than 0, each chunk of traces is extended by 'margin' frames before and after the
+        chunk (e.g. for filters or detectors). Margins falling outside the recording are filled with zeros, so that
+        the traces of the chunk are always traces[:, margin:margin + end_frame - start_frame].
+
+        Parameters
+        ----------
+        chunk_size: None or int
+            Number of frames of each chunk
+        chunk_mb: None or int
+            If 'chunk_size' is None, the chunk size is computed so that each chunk is of 'chunk_mb' Mb.
+            If both 'chunk_size' and 'chunk_mb' are None, the traces are returned in a single chunk
+        margin: int
+            Number of frames added before and after each chunk (default 0)
+        channel_ids: array_like
+            A list or 1D array of channel ids (ints) from which the traces will be extracted.
+            If None, all channels are used
+
+        Yields
+        ------
+        start_frame: int
+            The starting frame of the chunk (inclusive, margin excluded)
+        end_frame: int
+            The ending frame of the chunk (exclusive, margin excluded)
+        traces: numpy.ndarray
+            A 2D array with the traces of the chunk (including margins).
+            Dimensions are: (num_channels x (end_frame - start_frame + 2 * margin))
+        '''
+        if channel_ids is None:
+            channel_ids = self.get_channel_ids()
+        if isinstance(channel_ids, (int, np.integer)):
+            channel_ids = [channel_ids]
+        num_frames = self.get_num_frames()
+        margin = int(margin)
+
+        chunk_size = get_chunk_size(self, chunk_size=chunk_size, chunk_mb=chunk_mb, num_channels=len(channel_ids))
+
+        for start_frame in range(0, num_frames, chunk_size):
+            end_frame = min(start_frame + chunk_size, num_frames)
+            if margin == 0:
+                traces = self.get_traces(channel_ids=channel_ids, start_frame=start_frame, end_frame=end_frame)
+            else:
+                read_start = max(start_frame - margin, 0)
+                read_end = min(end_frame + margin, num_frames)
+                chunk_traces = self.get_traces(channel_ids=channel_ids, start_frame=read_start, end_frame=read_end)
+                if read_start == start_frame - margin and read_end == end_frame + margin:
+                    traces = chunk_traces
+                else:
+                    traces = np.zeros((len(channel_ids), end_frame - start_frame + 2 * margin),
+                                      dtype=chunk_traces.dtype)
+                    traces[:, read_start - start_frame + margin:read_end - start_frame + margin] = chunk_traces
+            yield start_frame, end_frame, traces
+
     def set_channel_locations(self, locations, channel_ids=None):
         '''This function sets the location properties of each specified channel
         id with the corresponding locations of the passed in locations list.
@@ -225,23 +371,22 @@ class RecordingExtractor(ABC, BaseExtractor):
         if isinstance(channel_ids, (int, np.integer)):
             channel_ids = [channel_ids]
             locations = [locations]
-        if self._key_properties['location'] is None:
-            self._key_properties['location'] = np.empty((self.get_num_channels(), 3), dtype='float')
-        if len(channel_ids) == len(locations):
-            for i in range(len(channel_ids)):
-                if isinstance(locations[i], (list, np.ndarray, tuple)):
-                    location = np.asarray(locations[i])
-                    channel_idx = list(self.get_channel_ids()).index(channel_ids[i])
-                    if len(location) == 2:
-                        self._key_properties['location'][channel_idx, :2] = location
-                    elif len(location) == 3:
-                        self._key_properties['location'][channel_idx] = location
-                    else:
-                        raise TypeError("'location' must be 2d ior 3d")
-                else:
-                    raise TypeError("'location' must be an array like object")
-        else:
+        if len(channel_ids) != len(locations):
             raise ValueError("channel_ids and locations must have same length")
+        if len(channel_ids) == 0:
+            return
+        try:
+            locations = np.asarray(locations, dtype='float')
+        except (TypeError, ValueError):
+            raise TypeError("'location' must be an array like object")
+        if locations.ndim != 2:
+            raise TypeError("'location' must be an array like object")
+        if locations.shape[1] not in (2, 3):
+            raise TypeError("'location' must be 2d ior 3d")
+        channel_idxs = self.ids_to_indices(channel_ids)
+        if self._key_properties['location'] is None:
+            self._key_properties['location'] = np.full((self.get_num_channels(), 3), np.nan, dtype='float')
+        self._key_properties['location'][channel_idxs, :locations.shape[1]] = locations
 
     def get_channel_locations(self, channel_ids=None, locations_2d=True):
         '''This function returns the location of each channel specifed by
@@ -270,7 +415,7 @@ class RecordingExtractor(ABC, BaseExtractor):
             locations[:] = np.nan
             self._key_properties['location'] = locations
         locations = np.array(locations)
-        channel_idxs = np.array([list(self.get_channel_ids()).index(ch) for ch in channel_ids])
+        channel_idxs = self.ids_to_indices(channel_ids)
         if locations_2d:
             locations = np.array(locations)[:, :2]
         return locations[channel_idxs]
@@ -292,17 +437,17 @@ class RecordingExtractor(ABC, BaseExtractor):
             channel_ids = [channel_ids]
         if isinstance(groups, (int, np.integer)):
             groups = [groups]
+        if len(channel_ids) != len(groups):
+            raise ValueError("channel_ids and groups must have same length")
+        if len(channel_ids) == 0:
+            return
+        groups = np.asarray(groups)
+        if groups.ndim != 1 or not np.issubdtype(groups.dtype, np.integer):
+            raise TypeError("'group' must be an int")
+        channel_idxs = self.ids_to_indices(channel_ids)
         if self._key_properties['group'] is None:
             self._key_properties['group'] = np.zeros(self.get_num_channels(), dtype='int')
-        if len(channel_ids) == len(groups):
-            for i in range(len(channel_ids)):
-                if isinstance(groups[i], (int, np.integer)):
-                    channel_idx = list(self.get_channel_ids()).index(channel_ids[i])
-                    self._key_properties['group'][channel_idx] = int(groups[i])
-                else:
-                    raise TypeError("'group' must be an int")
-        else:
-            raise ValueError("channel_ids and groups must have same length")
+        self._key_properties['group'][channel_idxs] = groups
 
     def get_channel_groups(self, channel_ids=None):
         '''This function returns the group of each channel specifed by
@@ -328,7 +473,7 @@ class RecordingExtractor(ABC, BaseExtractor):
             groups = np.zeros(self.get_num_channels(), dtype='int')
             self._key_properties['group'] = groups
         groups = np.array(groups)
-        channel_idxs = np.array([list(self.get_channel_ids()).index(ch) for ch in channel_ids])
+        channel_idxs = self.ids_to_indices(channel_ids)
         return groups[channel_idxs]
 
     def set_channel_gains(self, channel_ids, gains):
@@ -344,20 +489,17 @@ class RecordingExtractor(ABC, BaseExtractor):
             If a list, each channel will be given a gain from the list
         '''
         if isinstance(gains, (int, np.integer, float, np.float64)):
-            gain = float(gains)
-            for i in range(len(channel_ids)):
-                self.set_channel_property(channel_ids[i], 'gain', gain)
+            gains = np.full(len(channel_ids), float(gains))
         elif isinstance(gains, (list, np.ndarray)):
-            if len(channel_ids) == len(gains):
-                for i in range(len(channel_ids)):
-                    if isinstance(gains[i], (int, np.integer, float, np.float64)):
-                        self.set_channel_property(channel_ids[i], 'gain', float(gains[i]))
-                    else:
-                        raise TypeError("all gains must be floats or ints")
-            else:
+            if len(channel_ids) != len(gains):
                 raise ValueError("channel_ids and gains must have same length")
+            gains = np.asarray(gains)
+            if gains.ndim != 1 or not (np.issubdtype(gains.dtype, np.integer)
+                                       or np.issubdtype(gains.dtype, np.floating)):
+                raise TypeError("all gains must be floats or ints")
         else:
             raise TypeError("gains must be a int/float or a list of int/floats")
+        self.set_channels_property('gain', gains.astype('float'), channel_ids)
 
     def get_channel_gains(self, channel_ids=None):
         '''This function returns the gain of each channel specifed by
@@ -374,13 +516,62 @@ class RecordingExtractor(ABC, BaseExtractor):
             Returns a list of corresonding gains (floats) for the given
             channel_ids
         '''
+        return self.get_channels_property('gain', channel_ids).tolist()
+
+    def set_channels_property(self, property_name, values, channel_ids=None):
+        '''This function adds a property dataset to the given channels under the
+        property name. The values are stored in a single array per property.
+
+        Parameters
+        ----------
+        property_name: str
+            A property stored by the RecordingExtractor (location, etc.)
+        values: array_like
+            The data associated with the given property name, one value per channel
+        channel_ids: array_like or None
+            The channel ids (ints) for which the property will be added. If None, all channel ids are assumed
+        '''
+        if not isinstance(property_name, str):
+            raise TypeError(str(property_name) + " must be a string")
         if channel_ids is None:
             channel_ids = self.get_channel_ids()
-        gains = []
-        for channel_id in channel_ids:
-            gain = self.get_channel_property(channel_id, 'gain')
-            gains.append(gain)
-        return gains
+        if property_name in self._key_properties.keys():
+            getattr(self, 'set_channel_' + property_name + 's')(values, channel_ids)
+            return
+        channel_idxs = self.ids_to_indices(channel_ids)
+        if len(values) != len(channel_idxs):
+            raise ValueError("channel_ids and values must have same length")
+        self._set_property_column(property_name, channel_idxs, values, self.get_num_channels())
+
+    def get_channels_property(self, property_name, channel_ids=None):
+        '''This function returns the data stored under the property name for
+        the given channels.
+
+        Parameters
+        ----------
+        property_name: str
+            A property stored by the RecordingExtractor (location, etc.)
+        channel_ids: array_like or None
+            The channel ids (ints) for which the property will be returned. If None, all channel ids are assumed
+
+        Returns
+        ----------
+        property_data: np.array
+            The data associated with the given property name. The first axis corresponds to the channel_ids
+        '''
+        if not isinstance(property_name, str):
+            raise TypeError(str(property_name) + " must be a string")
+        if channel_ids is None:
+            channel_ids = self.get_channel_ids()
+        if property_name in self._key_properties.keys():
+            return getattr(self, 'get_channel_' + property_name + 's')(channel_ids)
+        channel_idxs = self.ids_to_indices(channel_ids)
+        num_channels = self.get_num_channels()
+        mask = self._get_property_mask(property_name, channel_idxs, num_channels)
+        if not np.all(mask):
+            missing_ids = [ch for (ch, has_property) in zip(channel_ids, mask) if not has_property]
+            raise RuntimeError(str(property_name) + " has not been added to channels " + str(missing_ids))
+        return self._get_property_entry(property_name, num_channels)['values'][channel_idxs]
 
     def set_channel_property(self, channel_id, property_name, value):
         '''This function adds a property dataset to the given channel under the
@@ -396,21 +587,14 @@ class RecordingExtractor(ABC, BaseExtractor):
             The data associated with the given property name. Could be many
             formats as specified by the user
         '''
+        if not isinstance(channel_id, (int, np.integer)):
+            raise TypeError(str(channel_id) + " must be an int")
+        if not self._is_valid_channel_id(channel_id):
+            raise ValueError(str(channel_id) + " is not a valid channel_id")
         if property_name in self._key_properties.keys():
-            fun = eval(f"self.set_channel_{property_name}s")
-            fun(value, channel_id)
-        if isinstance(channel_id, (int, np.integer)):
-            if channel_id in self.get_channel_ids():
-                if channel_id not in self._properties.keys():
-                    self._properties[channel_id] = {}
-                if isinstance(property_name, str):
-                    self._properties[channel_id][property_name] = value
-                else:
-                    raise TypeError(str(property_name) + " must be a string")
-            else:
-                raise ValueError(str(channel_id) + " is not a valid channel_id")
+            getattr(self, 'set_channel_' + property_name + 's')(value, channel_id)
         else:
-            raise TypeError(str(channel_id) + " must be an int")
+            self.set_channels_property(property_name, [value], [channel_id])
 
     def get_channel_property(self, channel_id, property_name):
         '''This function returns the data stored under the property name from
@@ -429,19 +613,14 @@ class RecordingExtractor(ABC, BaseExtractor):
             The data associated with the given property name. Could be many
             formats as specified by the user
         '''
-        if property_name in self._key_properties.keys():
-            return eval(f"self.get_channel_{property_name}s")(channel_id)[0]
         if not isinstance(channel_id, (int, np.integer)):
             raise TypeError(str(channel_id) + " must be an int")
-        if channel_id not in self.get_channel_ids():
+        if not self._is_valid_channel_id(channel_id):
             raise ValueError(str(channel_id) + " is not a valid channel_id")
-        if channel_id not in self._properties.keys():
-            raise ValueError('no properties found for channel' + str(channel_id))
-        if property_name not in self._properties[channel_id]:
-            raise RuntimeError(str(property_name) + " has not been added to channel " + str(channel_id))
-        if not isinstance(property_name, str):
-            raise TypeError(str(property_name) + " must be a string")
-        return self._properties[channel_id][property_name]
+        values = self.get_channels_property(property_name, [channel_id])
+        if property_name in self._key_properties.keys():
+            return values[0]
+        return _to_property_list(values)[0]
 
     def get_channel_property_names(self, channel_id):
         '''Get a list of property names for a given channel.
@@ -456,10 +635,9 @@ class RecordingExtractor(ABC, BaseExtractor):
             The list of property names
         '''
         if isinstance(channel_id, (int, np.integer)):
-            if channel_id in self.get_channel_ids():
-                if channel_id not in self._properties.keys():
-                    self._properties[channel_id] = {}
-                property_names = list(self._properties[channel_id].keys())
+            if self._is_valid_channel_id(channel_id):
+                channel_idxs = self.ids_to_indices(channel_id)
+                property_names = self._get_property_names(channel_idxs, self.get_num_channels())
                 if np.any(np.logical_not(np.isnan(self.get_channel_locations(channel_id)))):
                     property_names.extend(['location'])
                 property_names.extend(['group'])
@@ -483,11 +661,11 @@ class RecordingExtractor(ABC, BaseExtractor):
         '''
         if channel_ids is None:
             channel_ids = self.get_channel_ids()
-        curr_property_name_set = set(self.get_channel_property_names(channel_id=channel_ids[0]))
-        for channel_id in channel_ids[1:]:
-            curr_channel_property_name_set = set(self.get_channel_property_names(channel_id=channel_id))
-            curr_property_name_set = curr_property_name_set.intersection(curr_channel_property_name_set)
-        property_names = list(curr_property_name_set)
+        channel_idxs = self.ids_to_indices(channel_ids)
+        property_names = self._get_property_names(channel_idxs, self.get_num_channels(), shared=True)
+        if np.all(np.any(np.logical_not(np.isnan(self.get_channel_locations(channel_ids))), axis=1)):
+            property_names.extend(['location'])
+        property_names.extend(['group'])
         return sorted(property_names)
 
     def copy_channel_properties(self, recording, channel_ids=None):
@@ -505,11 +683,35 @@ class RecordingExtractor(ABC, BaseExtractor):
             channel_ids = recording.get_channel_ids()
         if isinstance(channel_ids, (int, np.integer)):
             channel_ids = [channel_ids]
-        for channel_id in channel_ids:
-            curr_property_names = recording.get_channel_property_names(channel_id=channel_id)
-            for curr_property_name in curr_property_names:
-                value = recording.get_channel_property(channel_id=channel_id, property_name=curr_property_name)
-                self.set_channel_property(channel_id=channel_id, property_name=curr_property_name, value=value)
+        self._copy_channel_properties(recording, recording_channel_ids=channel_ids, channel_ids=channel_ids)
+
+    def _copy_channel_properties(self, recording, recording_channel_ids, channel_ids):
+        # properties set on all channels are copied with one array slice each
+        shared_property_names = recording.get_shared_channel_property_names(recording_channel_ids)
+        for property_name in shared_property_names:
+            values = recording.get_channels_property(property_name, recording_channel_ids)
+            self.set_channels_property(property_name, values, channel_ids)
+        # locations and properties set on a subset of the channels only
+        if 'location' not in shared_property_names:
+            locations = recording.get_channel_locations(recording_channel_ids, locations_2d=False)
+            has_location = np.any(np.logical_not(np.isnan(locations)), axis=1)
+            if np.any(has_location):
+                self.set_channel_locations(locations[has_location],
+                                           [ch for (ch, has_loc) in zip(channel_ids, has_location) if has_loc])
+        for property_name in recording._get_channels_property_names(recording_channel_ids):
+            if property_name not in shared_property_names:
+                mask = recording._get_channels_property_mask(property_name, recording_channel_ids)
+                values = recording.get_channels_property(property_name,
+                                                         [ch for (ch, m) in zip(recording_channel_ids, mask) if m])
+                self.set_channels_property(property_name, values, [ch for (ch, m) in zip(channel_ids, mask) if m])
+
+    def _get_channels_property_names(self, channel_ids):
+        # names of the properties (besides location and group) set on at least one of the channels
+        return self._get_property_names(self.ids_to_indices(channel_ids), self.get_num_channels())
+
+    def _get_channels_property_mask(self, property_name, channel_ids):
+        # True for the channels that have the property
+        return self._get_property_mask(property_name, self.ids_to_indices(channel_ids), self.get_num_channels())
 
     def clear_channel_property(self, channel_id, property_name):
         '''This function clears the channel property for the given property.
@@ -521,9 +723,8 @@ class RecordingExtractor(ABC, BaseExtractor):
         property_name: string
             The name of the property to be cleared
         '''
-        if channel_id in self._properties.keys():
-            if property_name in self._properties[channel_id]:
-                del self._properties[channel_id][property_name]
+        if self._is_valid_channel_id(channel_id):
+            self.clear_channels_property(property_name, [channel_id])
 
     def clear_channels_property(self, property_name, channel_ids=None):
         '''This function clears the channels' properties for the given property.
@@ -537,8 +738,8 @@ class RecordingExtractor(ABC, BaseExtractor):
         '''
         if channel_ids is None:
             channel_ids = self.get_channel_ids()
-        for channel_id in channel_ids:
-            self.clear_channel_property(channel_id, property_name)
+        channel_idxs = self.ids_to_indices(channel_ids)
+        self._clear_property_column(property_name, channel_idxs, self.get_num_channels())
 
     def add_epoch(self, epoch_name, start_frame, end_frame):
         '''This function adds an epoch to your recording extractor that tracks
@@ -688,7 +889,8 @@ class RecordingExtractor(ABC, BaseExtractor):
         save_to_probe_file(self, probe_file, grouping_property=grouping_property, radius=radius,
                            graph=graph, geometry=geometry, verbose=verbose)
 
-    def write_to_binary_dat_format(self, save_path, time_axis=0, dtype=None, chunk_size=None, chunk_mb=500):
+    def write_to_binary_dat_format(self, save_path, time_axis=0, dtype=None, chunk_size=None, chunk_mb=500,
+                                   n_jobs=1):
         '''Saves the traces of this recording extractor into binary .dat format.
 
         Parameters
@@ -706,9 +908,11 @@ class RecordingExtractor(ABC, BaseExtractor):
             If 'auto' the file is saved in chunks of ~ 500Mb
         chunk_mb: None or int
             Chunk size in Mb (default 500Mb)
+        n_jobs: int
+            Number of threads used to write chunks in parallel (default 1). If -1, all cpus are used
         '''
         write_to_binary_dat_format(self, save_path=save_path, time_axis=time_axis, dtype=dtype, chunk_size=chunk_size,
-                                   chunk_mb=chunk_mb)
+                                   chunk_mb=chunk_mb, n_jobs=n_jobs)
 
     def write_to_h5_dataset_format(self, dataset_path, save_path=None, file_handle=None,
                                    time_axis=0, dtype=None, chunk_size=None, chunk_mb=500):
@@ -6,7 +6,7 @@ import tempfile
 from pathlib import Path
 import shutil
 from .extraction_tools import get_sub_extractors_by_property
-from .baseextractor import BaseExtractor
+from .baseextractor import BaseExtractor, _to_property_column, _to_property_list
 
 
 class SortingExtractor(ABC, BaseExtractor):
@@ -22,6 +22,9 @@ class SortingExtractor(ABC, BaseExtractor):
         BaseExtractor.__init__(self)
         self._epochs = {}
         self._sampling_frequency = None
+        # unit_id -> whether its spike train is sorted, recorded when spike features are set (see
+        # _is_spike_train_sorted)
+        self._sorted_spike_trains = {}
         self.id = np.random.randint(low=0, high=9223372036854775807, dtype='int64')
 
     def __del__(self):
@@ -96,6 +99,87 @@ class SortingExtractor(ABC, BaseExtractor):
         spike_trains = [self.get_unit_spike_train(uid, start_frame, end_frame) for uid in unit_ids]
         return spike_trains
 
+    def get_all_spike_trains(self):
+        '''This function returns the spike trains of all units in a compressed sparse row (CSR) layout:
+        the spike frames of all units are concatenated unit by unit (following get_unit_ids()) and the
+        spike train of the i-th unit is spike_times[offsets[i]:offsets[i + 1]].
+        For extractors storing all spikes as (times, labels) arrays, it is computed once and cached until
+        clear_spike_trains_cache() is called (or the unit ids change). Extractors storing the spikes already
+        grouped by unit override it to return their arrays. Otherwise, it is built from get_unit_spike_train()
+        at each call.
+
+        Returns
+        ----------
+        spike_times: numpy.ndarray
+            An 1D array with the spike frames of all units, grouped by unit
+        offsets: numpy.ndarray
+            An 1D array (num_units + 1) with the position of the first spike of each unit in spike_times
+        '''
+        unit_ids = self.get_unit_ids()
+        if isinstance(unit_ids, np.ndarray):
+            unit_ids = unit_ids.tolist()
+        cache = getattr(self, '_spike_trains_cache', None)
+        if cache is not None and cache['unit_ids'] == unit_ids:
+            return cache['spike_times'], cache['offsets']
+        spike_times_labels = self._get_spike_times_and_labels()
+        if spike_times_labels is not None:
+            spike_times, offsets = _group_spikes_by_unit(spike_times_labels[0], spike_times_labels[1], unit_ids)
+            self._cache_spike_trains(spike_times, offsets)
+        else:
+            spike_trains = [np.asarray(self.get_unit_spike_train(unit_id)) for unit_id in unit_ids]
+            offsets = np.zeros(len(unit_ids) + 1, dtype='int64')
+            offsets[1:] = np.cumsum([len(spike_train) for spike_train in spike_trains])
+            if len(spike_trains) > 0:
+                spike_times = np.concatenate(spike_trains).astype('int64')
+            else:
+                spike_times = np.array([], dtype='int64')
+        return spike_times, offsets
+
+    def _cache_spike_trains(self, spike_times, offsets):
+        # caches the CSR spike trains of get_all_spike_trains() for the current unit ids, so that the spike vector
+        # of to_spike_vector() is computed once. Overrides of get_all_spike_trains() returning stored arrays call it
+        # to share the cache
+        cache = getattr(self, '_spike_trains_cache', None)
+        if cache is None or cache['spike_times'] is not spike_times or cache['offsets'] is not offsets:
+            unit_ids = self.get_unit_ids()
+            if isinstance(unit_ids, np.ndarray):
+                unit_ids = unit_ids.tolist()
+            self._spike_trains_cache = {'unit_ids': list(unit_ids), 'spike_times': spike_times, 'offsets': offsets,
+                                        'spike_vector': None}
+
+    def clear_spike_trains_cache(self):
+        '''This function clears the cached spike trains of get_all_spike_trains() and to_spike_vector().
+        It must be called by extractors when the spike times returned by _get_spike_times_and_labels() change.
+        '''
+        self._spike_trains_cache = None
+
+    def to_spike_vector(self):
+        '''This function returns all the spikes of the sorting as a single spike vector sorted by time.
+        It is cached whenever the spike trains of get_all_spike_trains() are cached.
+
+        Returns
+        ----------
+        spike_times: numpy.ndarray
+            An 1D array with the sorted spike frames of all units
+        spike_unit_indices: numpy.ndarray
+            An 1D array with the index of the unit (in get_unit_ids()) of each spike
+        '''
+        spike_times, offsets = self.get_all_spike_trains()
+        cache = getattr(self, '_spike_trains_cache', None)
+        if cache is not None and cache['spike_times'] is spike_times and cache['spike_vector'] is not None:
+            return cache['spike_vector']
+        spike_unit_indices = np.repeat(np.arange(len(offsets) - 1, dtype='int64'), np.diff(offsets))
+        order = np.argsort(spike_times, kind='stable')
+        spike_vector = (spike_times[order], spike_unit_indices[order])
+        if cache is not None and cache['spike_times'] is spike_times:
+            cache['spike_vector'] = spike_vector
+        return spike_vector
+
+    def _get_spike_times_and_labels(self):
+        # Extractors storing all spikes as (times, labels) arrays return them here, so that get_all_spike_trains()
+        # groups them at once instead of calling get_unit_spike_train() for each unit
+        return None
+
     def get_sampling_frequency(self):
         '''
         It returns the sampling frequency.
@@ -116,6 +200,58 @@ class SortingExtractor(ABC, BaseExtractor):
         '''
         self._sampling_frequency = sampling_frequency
 
+    def ids_to_indices(self, unit_ids):
+        '''This function returns the indices of the given unit ids in the list of unit ids
+        of the sorting (i.e. the position of each unit id in get_unit_ids()).
+
+        Parameters
+        ----------
+        unit_ids: array_like or int
+            The unit ids (ints) for which the indices will be returned
+
+        Returns
+        -------
+        unit_idxs: numpy.ndarray
+            A 1D array with the index of each unit id
+        '''
+        unit_index = self._get_unit_index()
+        if isinstance(unit_ids, (int, np.integer)):
+            unit_ids = [unit_ids]
+        try:
+            return np.array([unit_index[u] for u in unit_ids], dtype='int64')
+        except (KeyError, TypeError):
+            invalid_ids = [u for u in unit_ids if not self._is_valid_unit_id(u)]
+            raise ValueError(str(invalid_ids) + " are not valid unit_ids")
+
+    def _get_unit_index(self):
+        # the unit_id -> index dictionary is cached until _reset_unit_index() is called, so that lookups do not read
+        # the unit ids. Unit properties are stored by index: when the dictionary is rebuilt, they are moved to the
+        # new positions of their unit ids
+        unit_index = getattr(self, '_unit_index_cache', None)
+        if unit_index is not None and self._unit_index_valid:
+            return unit_index
+        unit_ids = self.get_unit_ids()
+        if isinstance(unit_ids, np.ndarray):
+            unit_ids = unit_ids.tolist()
+        new_index = {u: i for i, u in enumerate(unit_ids)}
+        if unit_index is not None and len(self._properties) > 0:
+            self._remap_property_columns([unit_index.get(u, -1) for u in unit_ids], len(unit_index))
+        self._unit_index_cache = new_index
+        self._unit_index_valid = True
+        return new_index
+
+    def _reset_unit_index(self):
+        # must be called by extractors whose unit ids change after they have been looked up (e.g. units added or
+        # excluded after setting properties): the unit_id -> index dictionary is rebuilt at the next lookup
+        self._unit_index_valid = False
+
+    def _is_valid_unit_id(self, unit_id):
+        try:
+            return unit_id in self._get_unit_index()
+        except TypeError:
+            # unhashable
+            return False
+
     def set_unit_spike_features(self, unit_id, feature_name, value, indexes=None):
         '''This function adds a unit features data set under the given features
         name to the given unit.
@@ -135,11 +271,14 @@ class SortingExtractor(ABC, BaseExtractor):
             assumed that value has the same length as the spike train.
         '''
         if isinstance(unit_id, (int, np.integer)):
-            if unit_id in self.get_unit_ids():
+            if self._is_valid_unit_id(unit_id):
                 if unit_id not in self._features.keys():
                     self._features[unit_id] = {}
+                self._detach_feature_array(unit_id, feature_name)
+                spike_train = self.get_unit_spike_train(unit_id)
+                self._sorted_spike_trains[unit_id] = _is_sorted(spike_train)
                 if indexes is None:
-                    if isinstance(feature_name, str) and len(value) == len(self.get_unit_spike_train(unit_id)):
+                    if isinstance(feature_name, str) and len(value) == len(spike_train):
                         self._features[unit_id][feature_name] = value
                     else:
                         if not isinstance(feature_name, str):
@@ -164,6 +303,66 @@ class SortingExtractor(ABC, BaseExtractor):
         else:
             raise ValueError(str(unit_id) + " must be an int")
 
+    def set_units_spike_features(self, feature_name, values, unit_ids=None, spike_labels=None, memmap=False):
+        '''This function adds a features data set under the given features name to several units at once.
+        The features of all the spikes are stored in one contiguous array, ordered unit by unit, and each
+        unit gets a view on its own slice (no copy per unit).
+
+        Parameters
+        ----------
+        feature_name: str
+            The name of the feature to be stored
+        values: array_like
+            The feature values of all the spikes (first axis). If spike_labels is None, values must be ordered
+            unit by unit (following unit_ids), with as many values as spikes for each unit.
+        unit_ids: list
+            The unit ids for which the features will be set. If None, all units are used
+        spike_labels: array_like
+            The unit id of each value (e.g. the spike clusters of the sorter output). The values of each unit
+            must follow the order of its spike train. Values of units not in unit_ids are discarded
+        memmap: bool
+            If True and values need to be reordered, the contiguous array is memory-mapped in the temporary
+            folder of the extractor
+        '''
+        if not isinstance(feature_name, str):
+            raise ValueError("feature_name must be a string")
+        if unit_ids is None:
+            unit_ids = self.get_unit_ids()
+        self.ids_to_indices(unit_ids)
+        num_spikes = np.zeros(len(unit_ids), dtype='int64')
+        for i, unit_id in enumerate(unit_ids):
+            spike_train = self.get_unit_spike_train(unit_id)
+            num_spikes[i] = len(spike_train)
+            self._sorted_spike_trains[unit_id] = _is_sorted(spike_train)
+        if spike_labels is None:
+            if len(values) != np.sum(num_spikes):
+                raise ValueError("feature values should have the same length as the spike trains")
+            ends = np.cumsum(num_spikes)
+            starts = ends - num_spikes
+            if memmap and not isinstance(values, np.memmap):
+                values = self.allocate_array(memmap=True, array=np.asarray(values), name='features_' + feature_name)
+        else:
+            spike_labels = np.asarray(spike_labels)
+            if len(values) != len(spike_labels):
+                raise ValueError("feature values should have the same length as spike_labels")
+            order = np.argsort(spike_labels, kind='stable')
+            order = order[np.isin(spike_labels[order], unit_ids)]
+            sorted_labels = spike_labels[order]
+            if len(order) != len(spike_labels) or np.any(order[1:] < order[:-1]):
+                # gather the values unit by unit
+                sorted_values = self.allocate_array(memmap=memmap, shape=(len(order),) + np.shape(values)[1:],
+                                                    dtype=np.asarray(values[:1]).dtype,
+                                                    name='features_' + feature_name if memmap else None)
+                chunk_size = 100000
+                for i in range(0, len(order), chunk_size):
+                    sorted_values[i:i + chunk_size] = values[order[i:i + chunk_size]]
+                values = sorted_values
+            starts = np.searchsorted(sorted_labels, unit_ids, side='left')
+            ends = np.searchsorted(sorted_labels, unit_ids, side='right')
+            if not np.array_equal(ends - starts, num_spikes):
+                raise ValueError("feature values should have the same length as the spike trains")
+        self._set_feature_array(feature_name, values, unit_ids, starts, ends)
+
     def get_unit_spike_features(self, unit_id, feature_name, start_frame=None, end_frame=None):
         '''This function extracts the specified spike features from the specified unit.
         It will return spike features from within three ranges:
@@ -197,7 +396,7 @@ class SortingExtractor(ABC, BaseExtractor):
         '''
         start_frame, end_frame = self._cast_start_end_frame(start_frame, end_frame)
         if isinstance(unit_id, (int, np.integer)):
-            if unit_id in self.get_unit_ids():
+            if self._is_valid_unit_id(unit_id):
                 if unit_id not in self._features.keys():
                     self._features[unit_id] = {}
                 if isinstance(feature_name, str):
@@ -211,33 +410,36 @@ class SortingExtractor(ABC, BaseExtractor):
                             # keep memmap objects
                             return self._features[unit_id][feature_name]
                         else:
-                            if len(self._features[unit_id][feature_name]) == len(spike_train):
-                                spike_indices = np.where(np.logical_and(spike_train >= start_frame,
-                                                                        spike_train < end_frame))
-                            elif len(self._features[unit_id][feature_name]) < len(spike_train):
+                            features = self._features[unit_id][feature_name]
+                            value_idxs = None
+                            if len(features) < len(spike_train):
                                 if not feature_name.endswith('idxs'):
                                     # retrieve features on the correct idxs
                                     assert feature_name + '_idxs' in self.get_unit_spike_feature_names(unit_id=unit_id)
-                                    feature_name_idxs = feature_name + '_idxs'
-                                    value_idxs = np.array(self.get_unit_spike_features(unit_id=unit_id,
-                                                                                       feature_name=feature_name_idxs))
-                                    spike_train = spike_train[value_idxs]
-                                    spike_indices = np.where(np.logical_and(spike_train >= start_frame,
-                                                                            spike_train < end_frame))
+                                    value_idxs = np.asarray(self._features[unit_id][feature_name + '_idxs'])
                                 else:
                                     # retrieve idxs features
-                                    value_idxs = np.array(self.get_unit_spike_features(unit_id=unit_id,
-                                                                                       feature_name=feature_name))
-                                    spike_train = spike_train[value_idxs]
-                                    spike_indices = np.where(np.logical_and(spike_train >= start_frame,
-                                                                            spike_train < end_frame))
-                            else:
+                                    value_idxs = np.asarray(features)
+                            elif len(features) > len(spike_train):
                                 raise ValueError(str(feature_name) + " dimensions are inconsistent for unit "
                                                  + str(unit_id))
-                            if isinstance(self._features[unit_id][feature_name], list):
-                                return list(np.array(self._features[unit_id][feature_name])[spike_indices])
+                            if self._is_spike_train_sorted(unit_id, spike_train):
+                                # sorted spike train: the features are a slice (a view for memmap features), found
+                                # by binary search on the spike train (and on the sorted idxs of partial features)
+                                spike_indices = slice(np.searchsorted(spike_train, start_frame, side='left'),
+                                                      np.searchsorted(spike_train, end_frame, side='left'))
+                                if value_idxs is not None:
+                                    spike_indices = slice(np.searchsorted(value_idxs, spike_indices.start),
+                                                          np.searchsorted(value_idxs, spike_indices.stop))
+                            else:
+                                if value_idxs is not None:
+                                    spike_train = spike_train[value_idxs]
+                                spike_indices = np.where(np.logical_and(spike_train >= start_frame,
+                                                                        spike_train < end_frame))[0]
+                            if isinstance(features, list):
+                                return list(np.array(features)[spike_indices])
                             else:
-                                return np.array(self._features[unit_id][feature_name])[spike_indices]
+                                return np.asarray(features)[spike_indices]
                     else:
                         raise ValueError(str(feature_name) + " has not been added to unit " + str(unit_id))
                 else:
@@ -247,6 +449,13 @@ class SortingExtractor(ABC, BaseExtractor):
         else:
             raise ValueError(str(unit_id) + " must be an int")
 
+    def _is_spike_train_sorted(self, unit_id, spike_train):
+        # the sortedness of the spike train of a unit is checked once, when its features are set (or at the first
+        # query for features loaded otherwise), instead of at each frame range query
+        if unit_id not in self._sorted_spike_trains:
+            self._sorted_spike_trains[unit_id] = _is_sorted(spike_train)
+        return self._sorted_spike_trains[unit_id]
+
     def clear_unit_spike_features(self, unit_id, feature_name):
         '''This function clears the unit spikes features for the given feature.
 
@@ -260,6 +469,7 @@ class SortingExtractor(ABC, BaseExtractor):
         if unit_id in self._features.keys():
             if feature_name in self._features[unit_id]:
                 del self._features[unit_id][feature_name]
+                self._detach_feature_array(unit_id, feature_name)
 
     def clear_units_spike_features(self, feature_name, unit_ids=None):
         '''This function clears the units' spikes features for the given feature.
@@ -337,20 +547,16 @@ class SortingExtractor(ABC, BaseExtractor):
             formats as specified by the user
         '''
         if isinstance(unit_id, (int, np.integer)):
-            if unit_id in self.get_unit_ids():
-                if unit_id not in self._properties.keys():
-                    self._properties[unit_id] = {}
-                if isinstance(property_name, str):
-                    self._properties[unit_id][property_name] = value
-                else:
-                    raise ValueError(str(property_name) + " must be a string")
+            if self._is_valid_unit_id(unit_id):
+                self.set_units_property(unit_ids=[unit_id], property_name=property_name, values=[value])
             else:
                 raise ValueError(str(unit_id) + " is not a valid unit_id")
         else:
             raise ValueError(str(unit_id) + " must be an int")
 
     def set_units_property(self, *, unit_ids=None, property_name, values):
-        '''Sets unit property data for a list of units
+        '''Sets unit property data for a list of units. The values are stored in a
+        single array per property.
 
         Parameters
         ----------
@@ -362,10 +568,14 @@ class SortingExtractor(ABC, BaseExtractor):
         value: list
             The list of values to be set
         '''
+        if not isinstance(property_name, str):
+            raise ValueError(str(property_name) + " must be a string")
         if unit_ids is None:
             unit_ids = self.get_unit_ids()
-        for i, unit in enumerate(unit_ids):
-            self.set_unit_property(unit_id=unit, property_name=property_name, value=values[i])
+        unit_idxs = self.ids_to_indices(unit_ids)
+        if len(values) != len(unit_idxs):
+            raise ValueError("unit_ids and values must have same length")
+        self._set_property_column(property_name, unit_idxs, values, len(self._get_unit_index()))
 
     def get_unit_property(self, unit_id, property_name):
         '''This function returns the data stored under the property name given
@@ -384,23 +594,15 @@ class SortingExtractor(ABC, BaseExtractor):
             formats as specified by the user
         '''
         if isinstance(unit_id, (int, np.integer)):
-            if unit_id in self.get_unit_ids():
-                if unit_id not in self._properties.keys():
-                    self._properties[unit_id] = {}
-                if isinstance(property_name, str):
-                    if property_name in list(self._properties[unit_id].keys()):
-                        return self._properties[unit_id][property_name]
-                    else:
-                        raise ValueError(str(property_name) + " has not been added to unit " + str(unit_id))
-                else:
-                    raise ValueError(str(property_name) + " must be a string")
+            if self._is_valid_unit_id(unit_id):
+                return self.get_units_property(unit_ids=[unit_id], property_name=property_name)[0]
             else:
                 raise ValueError(str(unit_id) + " is not a valid unit_id")
         else:
             raise ValueError(str(unit_id) + " must be an int")
 
     def get_units_property(self, *, unit_ids=None, property_name):
-        '''Returns a list of values stored under the property name corresponding
+        '''Returns the values stored under the property name corresponding
         to a list of units
 
         Parameters
@@ -415,10 +617,47 @@ class SortingExtractor(ABC, BaseExtractor):
         values
             The list of values
         '''
+        if not isinstance(property_name, str):
+            raise ValueError(str(property_name) + " must be a string")
         if unit_ids is None:
             unit_ids = self.get_unit_ids()
-        values = [self.get_unit_property(unit_id=unit, property_name=property_name) for unit in unit_ids]
-        return values
+        unit_idxs = self.ids_to_indices(unit_ids)
+        num_units = len(self._get_unit_index())
+        mask = self._get_property_mask(property_name, unit_idxs, num_units)
+        if not np.all(mask):
+            missing_ids = [u for (u, has_property) in zip(unit_ids, mask) if not has_property]
+            raise ValueError(str(property_name) + " has not been added to units " + str(missing_ids))
+        return _to_property_list(self._get_property_entry(property_name, num_units)['values'][unit_idxs])
+
+    def get_units_property_table(self, unit_ids=None, property_names=None):
+        '''Returns the unit properties of a list of units as a numpy structured array,
+        with one row per unit and one field per property (plus the 'unit_id' field).
+
+        Parameters
+        ----------
+        unit_ids: list
+            The unit ids for which the properties will be returned
+            Defaults to get_unit_ids()
+        property_names: list
+            The names of the properties to export. If None (default), the properties
+            shared by all the units are exported
+        Returns
+        ----------
+        table: np.array
+            The structured array with the unit properties
+        '''
+        if unit_ids is None:
+            unit_ids = self.get_unit_ids()
+        if property_names is None:
+            property_names = self.get_shared_unit_property_names(unit_ids)
+        columns = [('unit_id', np.asarray(unit_ids, dtype='int64'))]
+        for property_name in property_names:
+            values = self.get_units_property(unit_ids=unit_ids, property_name=property_name)
+            columns.append((property_name, _to_property_column(values, len(values))))
+        table = np.zeros(len(unit_ids), dtype=[(name, values.dtype, values.shape[1:]) for (name, values) in columns])
+        for (name, values) in columns:
+            table[name] = values
+        return table
 
     def get_unit_property_names(self, unit_id):
         '''Get a list of property names for a given unit.
@@ -432,11 +671,9 @@ class SortingExtractor(ABC, BaseExtractor):
             The list of property names
         '''
         if isinstance(unit_id, (int, np.integer)):
-            if unit_id in self.get_unit_ids():
-                if unit_id not in self._properties.keys():
-                    self._properties[unit_id] = {}
-                property_names = sorted(self._properties[unit_id].keys())
-                return property_names
+            if self._is_valid_unit_id(unit_id):
+                property_names = self._get_property_names(self.ids_to_indices(unit_id), len(self._get_unit_index()))
+                return sorted(property_names)
             else:
                 raise ValueError(str(unit_id) + " is not a valid unit id")
         else:
@@ -457,11 +694,9 @@ class SortingExtractor(ABC, BaseExtractor):
         if unit_ids is None:
             unit_ids = self.get_unit_ids()
         if len(unit_ids) > 0:
-            curr_property_name_set = set(self.get_unit_property_names(unit_id=unit_ids[0]))
-            for unit_id in unit_ids[1:]:
-                curr_unit_property_name_set = set(self.get_unit_property_names(unit_id=unit_id))
-                curr_property_name_set = curr_property_name_set.intersection(curr_unit_property_name_set)
-            property_names = sorted(list(curr_property_name_set))
+            property_names = self._get_property_names(self.ids_to_indices(unit_ids), len(self._get_unit_index()),
+                                                      shared=True)
+            property_names = sorted(property_names)
         else:
             property_names = []
         return property_names
@@ -479,17 +714,32 @@ class SortingExtractor(ABC, BaseExtractor):
         '''
         if unit_ids is None:
             unit_ids = sorting.get_unit_ids()
-        if isinstance(unit_ids, int):
-            curr_property_names = sorting.get_unit_property_names(unit_id=unit_ids)
-            for curr_property_name in curr_property_names:
-                value = sorting.get_unit_property(unit_id=unit_ids, property_name=curr_property_name)
-                self.set_unit_property(unit_id=unit_ids, property_name=curr_property_name, value=value)
-        else:
-            for unit_id in unit_ids:
-                curr_property_names = sorting.get_unit_property_names(unit_id=unit_id)
-                for curr_property_name in curr_property_names:
-                    value = sorting.get_unit_property(unit_id=unit_id, property_name=curr_property_name)
-                    self.set_unit_property(unit_id=unit_id, property_name=curr_property_name, value=value)
+        if isinstance(unit_ids, (int, np.integer)):
+            unit_ids = [unit_ids]
+        self._copy_unit_properties(sorting, sorting_unit_ids=unit_ids, unit_ids=unit_ids)
+
+    def _copy_unit_properties(self, sorting, sorting_unit_ids, unit_ids):
+        # properties set on all units are copied with one array slice each
+        shared_property_names = sorting.get_shared_unit_property_names(sorting_unit_ids)
+        for property_name in shared_property_names:
+            values = sorting.get_units_property(unit_ids=sorting_unit_ids, property_name=property_name)
+            self.set_units_property(unit_ids=unit_ids, property_name=property_name, values=values)
+        # properties set on a subset of the units only
+        for property_name in sorting._get_units_property_names(sorting_unit_ids):
+            if property_name not in shared_property_names:
+                mask = sorting._get_units_property_mask(property_name, sorting_unit_ids)
+                values = sorting.get_units_property(unit_ids=[u for (u, m) in zip(sorting_unit_ids, mask) if m],
+                                                    property_name=property_name)
+                self.set_units_property(unit_ids=[u for (u, m) in zip(unit_ids, mask) if m],
+                                        property_name=property_name, values=values)
+
+    def _get_units_property_names(self, unit_ids):
+        # names of the properties set on at least one of the units
+        return self._get_property_names(self.ids_to_indices(unit_ids), len(self._get_unit_index()))
+
+    def _get_units_property_mask(self, property_name, unit_ids):
+        # True for the units that have the property
+        return self._get_property_mask(property_name, self.ids_to_indices(unit_ids), len(self._get_unit_index()))
 
     def clear_unit_property(self, unit_id, property_name):
         '''This function clears the unit property for the given property.
@@ -501,9 +751,8 @@ class SortingExtractor(ABC, BaseExtractor):
         property_name: string
             The name of the property to be cleared
         '''
-        if unit_id in self._properties.keys():
-            if property_name in self._properties[unit_id]:
-                del self._properties[unit_id][property_name]
+        if self._is_valid_unit_id(unit_id):
+            self.clear_units_property(property_name, [unit_id])
 
     def clear_units_property(self, property_name, unit_ids=None):
         '''This function clears the units' properties for the given property.
@@ -517,8 +766,7 @@ class SortingExtractor(ABC, BaseExtractor):
         '''
         if unit_ids is None:
             unit_ids = self.get_unit_ids()
-        for unit_id in unit_ids:
-            self.clear_unit_property(unit_id, property_name)
+        self._clear_property_column(property_name, self.ids_to_indices(unit_ids), len(self._get_unit_index()))
 
     def copy_unit_spike_features(self, sorting, unit_ids=None):
         '''Copy unit spike features from another sorting extractor to the current
@@ -729,3 +977,28 @@ class SortingExtractor(ABC, BaseExtractor):
         '''
 
         raise NotImplementedError
+
+
+def _is_sorted(spike_train):
+    spike_train = np.asarray(spike_train)
+    return not np.any(spike_train[1:] < spike_train[:-1])
+
+
+def _group_spikes_by_unit(spike_times, spike_labels, unit_ids):
+    # groups (times, labels) spikes unit by unit following unit_ids (a stable sort keeps the order of the spikes
+    # of each unit) and returns the CSR spike times and offsets. Spikes of labels not in unit_ids are discarded
+    spike_times = np.asarray(spike_times)
+    spike_labels = np.asarray(spike_labels)
+    offsets = np.zeros(len(unit_ids) + 1, dtype='int64')
+    if len(unit_ids) == 0 or len(spike_times) == 0:
+        return np.array([], dtype='int64'), offsets
+    unit_ids = np.asarray(unit_ids)
+    id_order = np.argsort(unit_ids, kind='stable')
+    sorted_ids = unit_ids[id_order]
+    pos = np.minimum(np.searchsorted(sorted_ids, spike_labels), len(sorted_ids) - 1)
+    valid = sorted_ids[pos] == spike_labels
+    spike_unit_indices = id_order[pos[valid]]
+    order = np.argsort(spike_unit_indices, kind='stable')
+    spike_times = spike_times[valid][order].astype('int64')
+    offsets[:] = np.searchsorted(spike_unit_indices[order], np.arange(len(unit_ids) + 1))
+    return spike_times, offsets
@@ -62,38 +62,27 @@ class SubRecordingExtractor(RecordingExtractor):
         frame2 = frame1 - self._start_frame
         return frame2
 
-    def get_snippets(self, *, reference_frames, snippet_len, channel_ids=None):
+    def get_snippets(self, *, reference_frames, snippet_len, channel_ids=None, out=None, chunk_mb=500):
         if channel_ids is None:
             channel_ids = self.get_channel_ids()
         reference_frames_shift = self._start_frame + np.array(reference_frames)
         original_ch_ids = self.get_original_channel_ids(channel_ids)
         return self._parent_recording.get_snippets(reference_frames=reference_frames_shift, snippet_len=snippet_len,
-                                                   channel_ids=original_ch_ids)
+                                                   channel_ids=original_ch_ids, out=out, chunk_mb=chunk_mb)
 
     def copy_channel_properties(self, recording, channel_ids=None):
         if channel_ids is None:
             channel_ids = self.get_channel_ids()
-        if isinstance(channel_ids, int):
-            recording_ch_id = channel_ids
-            if recording is self._parent_recording:
-                recording_ch_id = self.get_original_channel_ids(channel_ids)
-            curr_property_names = recording.get_channel_property_names(channel_id=recording_ch_id)
-            for curr_property_name in curr_property_names:
-                value = recording.get_channel_property(channel_id=recording_ch_id, property_name=curr_property_name)
-                self.set_channel_property(channel_id=channel_ids, property_name=curr_property_name, value=value)
-        else:
-            for channel_id in channel_ids:
-                recording_ch_id = channel_id
-                if recording is self._parent_recording:
-                    recording_ch_id = self.get_original_channel_ids(channel_id)
-                curr_property_names = recording.get_channel_property_names(channel_id=recording_ch_id)
-                for curr_property_name in curr_property_names:
-                    value = recording.get_channel_property(channel_id=recording_ch_id, property_name=curr_property_name)
-                    self.set_channel_property(channel_id=channel_id, property_name=curr_property_name, value=value)
+        if isinstance(channel_ids, (int, np.integer)):
+            channel_ids = [channel_ids]
+        recording_ch_ids = channel_ids
+        if recording is self._parent_recording:
+            recording_ch_ids = self.get_original_channel_ids(channel_ids)
+        self._copy_channel_properties(recording, recording_channel_ids=recording_ch_ids, channel_ids=channel_ids)
 
     def get_original_channel_ids(self, channel_ids):
         if isinstance(channel_ids, (int, np.integer)):
-            if channel_ids in self.get_channel_ids():
+            if channel_ids in self._original_channel_id_lookup:
                 original_ch_ids = self._original_channel_id_lookup[channel_ids]
             else:
                 raise ValueError("Non-valid channel_id")
@@ -101,7 +90,7 @@ class SubRecordingExtractor(RecordingExtractor):
             original_ch_ids = []
             for channel_id in channel_ids:
                 if isinstance(channel_id, (int, np.integer)):
-                    if channel_id in self.get_channel_ids():
+                    if channel_id in self._original_channel_id_lookup:
                         original_ch_id = self._original_channel_id_lookup[channel_id]
                         original_ch_ids.append(original_ch_id)
                     else:
@@ -59,23 +59,12 @@ class SubSortingExtractor(SortingExtractor):
     def copy_unit_properties(self, sorting, unit_ids=None):
         if unit_ids is None:
             unit_ids = self.get_unit_ids()
-        if isinstance(unit_ids, int):
-            sorting_unit_id = unit_ids
-            if sorting is self._parent_sorting:
-                sorting_unit_id = self.get_original_unit_ids(unit_ids)
-            curr_property_names = sorting.get_unit_property_names(unit_id=sorting_unit_id)
-            for curr_property_name in curr_property_names:
-                value = sorting.get_unit_property(unit_id=sorting_unit_id, property_name=curr_property_name)
-                self.set_unit_property(unit_id=unit_ids, property_name=curr_property_name, value=value)
-        else:
-            for unit_id in unit_ids:
-                sorting_unit_id = unit_id
-                if sorting is self._parent_sorting:
-                    sorting_unit_id = self.get_original_unit_ids(unit_id)
-                curr_property_names = sorting.get_unit_property_names(unit_id=sorting_unit_id)
-                for curr_property_name in curr_property_names:
-                    value = sorting.get_unit_property(unit_id=sorting_unit_id, property_name=curr_property_name)
-                    self.set_unit_property(unit_id=unit_id, property_name=curr_property_name, value=value)
+        if isinstance(unit_ids, (int, np.integer)):
+            unit_ids = [unit_ids]
+        sorting_unit_ids = unit_ids
+        if sorting is self._parent_sorting:
+            sorting_unit_ids = self.get_original_unit_ids(unit_ids)
+        self._copy_unit_properties(sorting, sorting_unit_ids=sorting_unit_ids, unit_ids=unit_ids)
 
     def copy_unit_spike_features(self, sorting, unit_ids=None, start_frame=None, end_frame=None):
         start_frame, end_frame = self._cast_start_end_frame(start_frame, end_frame)
@@ -116,7 +105,7 @@ class SubSortingExtractor(SortingExtractor):
 
     def get_original_unit_ids(self, unit_ids):
         if isinstance(unit_ids, (int, np.integer)):
-            if unit_ids in self.get_unit_ids():
+            if unit_ids in self._original_unit_id_lookup:
                 original_unit_ids = self._original_unit_id_lookup[unit_ids]
             else:
                 raise ValueError("Non-valid unit_id")
@@ -124,7 +113,7 @@ class SubSortingExtractor(SortingExtractor):
             original_unit_ids = []
             for unit_id in unit_ids:
                 if isinstance(unit_id, (int, np.integer)):
-                    if unit_id in self.get_unit_ids():
+                    if unit_id in self._original_unit_id_lookup:
                         original_unit_id = self._original_unit_id_lookup[unit_id]
                         original_unit_ids.append(original_unit_id)
                     else:
@@ -6,6 +6,7 @@ import tempfile
 import shutil
 import spikeextractors as se
 from .utils import check_sortings_equal, check_recordings_equal, check_dumping, check_recording_return_types, \
+    create_spikeglx_file, create_phy_folder, check_all_spike_trains, \
     check_sorting_return_types
 from spikeextractors.exceptions import NotDumpableExtractorError
 
@@ -224,13 +225,38 @@ class TestExtractors(unittest.TestCase):
         check_recordings_equal(self.RX, RX_mda)
         check_sorting_return_types(SX_mda)
         check_sortings_equal(self.SX, SX_mda)
+        check_all_spike_trains(SX_mda)
         check_dumping(RX_mda)
         check_dumping(SX_mda)
+        traces = RX_mda.get_traces(channel_ids=[1, 2], start_frame=10, end_frame=100)
+        self.assertFalse(traces.flags.owndata)
+        self.assertTrue(np.allclose(traces, self.RX.get_traces(channel_ids=[1, 2], start_frame=10, end_frame=100)))
+        # traces are writable, without changing the file or the next reads
+        traces -= 1
+        self.assertTrue(np.allclose(RX_mda.get_traces(channel_ids=[1, 2], start_frame=10, end_frame=100),
+                                    self.RX.get_traces(channel_ids=[1, 2], start_frame=10, end_frame=100)))
+        X = se.extractors.mdaextractors.mdaio.DiskReadMda(path1 + '/raw.mda')
+        self.assertTrue(np.allclose(X.readChunk(i1=0, i2=10, N1=X.N1(), N2=90),
+                                    self.RX.get_traces(start_frame=10, end_frame=100)))
+        SX_mda_memmap = se.MdaSortingExtractor(path2, memmap=True)
+        check_sortings_equal(self.SX, SX_mda_memmap)
+        check_dumping(SX_mda_memmap)
 
     def test_biocam_extractor(self):
         path1 = self.test_dir + '/raw.brw'
-        se.BiocamRecordingExtractor.write_recording(self.RX, path1)
+        se.BiocamRecordingExtractor.write_recording(self.RX, path1, chunk_size=7)
         RX_biocam = se.BiocamRecordingExtractor(path1)
+        self.assertTrue(np.allclose(RX_biocam.get_traces(channel_ids=[2, 0, 3]),
+                                    self.RX.get_traces(channel_ids=[2, 0, 3])))
+        # strided reads through h5py
+        from spikeextractors.extractors.biocamrecordingextractor.biocamrecordingextractor import \
+            _read_interleaved_channels
+        traces = _read_interleaved_channels(RX_biocam._rf['3BData/Raw'], 3, 20, RX_biocam.get_num_channels(), [3])
+        self.assertTrue(np.allclose(traces.T, RX_biocam.get_traces(channel_ids=[3], start_frame=3, end_frame=20)))
+        # traces are writable, without changing the next reads
+        traces = RX_biocam.get_traces(channel_ids=[0, 1])
+        traces -= 1
+        self.assertTrue(np.allclose(RX_biocam.get_traces(channel_ids=[0, 1]), self.RX.get_traces(channel_ids=[0, 1])))
         check_recording_return_types(RX_biocam)
         check_recordings_equal(self.RX, RX_biocam)
         check_dumping(RX_biocam)
@@ -268,6 +294,16 @@ class TestExtractors(unittest.TestCase):
         check_recordings_equal(self.RX, RX_exdir)
         check_dumping(RX_exdir)
 
+        path_lfp = self.test_dir + '/lfp.exdir'
+        RX_groups = se.SubRecordingExtractor(self.RX)
+        RX_groups.set_channel_groups([0, 0, 1, 1])
+        se.ExdirRecordingExtractor.write_recording(RX_groups, path_lfp, lfp=True, chunk_size=7, n_jobs=2)
+        import exdir
+        ephys = exdir.File(path_lfp)['processing']['electrophysiology']
+        for ch, group in zip(RX_groups.get_channel_ids(), RX_groups.get_channel_groups()):
+            data = ephys['channel_group_' + str(group)]['LFP']['LFP_timeseries_' + str(ch)]['data']
+            self.assertTrue(np.allclose(data[:], RX_groups.get_traces(channel_ids=[ch])))
+
         path2 = self.test_dir + '/firings.exdir'
         se.ExdirSortingExtractor.write_sorting(self.SX, path2, self.RX)
         SX_exdir = se.ExdirSortingExtractor(path2)
@@ -275,6 +311,57 @@ class TestExtractors(unittest.TestCase):
         check_sortings_equal(self.SX, SX_exdir)
         check_dumping(SX_exdir)
 
+    def test_spikeglx_session_extractor(self):
+        X = self.RX.get_traces()
+        folder = Path(self.test_dir) / 'spikeglx'
+        bounds = [0, 3000, 7000, self.RX.get_num_frames()]
+        # sync line 6 toggles every 1000 frames, line 0 is up on [2990, 3010)
+        sync = ((np.arange(self.RX.get_num_frames()) // 1000) % 2) << 6
+        sync[2990:3010] += 1
+        for probe in [0, 1]:
+            for i, (gate, trigger) in enumerate([(0, 0), (0, 1), (1, 0)]):
+                bin_file = folder / 'run_g{}'.format(gate) / 'run_g{}_imec{}'.format(gate, probe) / \
+                           'run_g{}_t{}.imec{}.ap.bin'.format(gate, trigger, probe)
+                create_spikeglx_file(bin_file, X[:, bounds[i]:bounds[i + 1]] + probe,
+                                     sync=sync[bounds[i]:bounds[i + 1]])
+        RX_sglx = se.SpikeGLXSessionRecordingExtractor(folder)
+        self.assertEqual(RX_sglx.get_num_channels(), 8)
+        self.assertEqual(RX_sglx.get_num_frames(), self.RX.get_num_frames())
+        self.assertEqual(list(RX_sglx.get_channel_groups()), [0] * 4 + [1] * 4)
+        self.assertTrue(np.array_equal(RX_sglx.get_traces(channel_ids=[5, 0, 2], start_frame=2000, end_frame=8000),
+                                       np.vstack((X[1] + 1, X[0], X[2]))[:, 2000:8000]))
+        self.assertTrue(np.array_equal(RX_sglx.get_traces(channel_ids=[0, 1], start_frame=100, end_frame=200),
+                                       X[:2, 100:200]))
+        # traces are writable, without changing the files or the next reads
+        traces = RX_sglx.get_traces(channel_ids=[0, 1], start_frame=100, end_frame=200)
+        traces -= 1
+        self.assertTrue(np.array_equal(RX_sglx.get_traces(channel_ids=[0, 1], start_frame=100, end_frame=200),
+                                       X[:2, 100:200]))
+        self.assertTrue(RX_sglx.is_filtered)
+        check_recording_return_types(RX_sglx)
+        check_dumping(RX_sglx)
+        RX_probe = se.SpikeGLXSessionRecordingExtractor(folder, probe_ids=[1])
+        self.assertTrue(np.array_equal(RX_probe.get_traces(), X + 1))
+
+        for cache in [True, True, False]:
+            events = RX_sglx.get_sync_events(probe_id=1, lines=[0, 6], chunk_size=999, cache=cache)
+            self.assertTrue(np.array_equal(events[6]['rising'], np.arange(1000, 10000, 2000)))
+            self.assertTrue(np.array_equal(events[6]['falling'], np.arange(2000, 10000, 2000)))
+            self.assertTrue(np.array_equal(events[0]['rising'], [2990]))
+            self.assertTrue(np.array_equal(events[0]['falling'], [3010]))
+        # the cache is not used once a file of the session is replaced
+        bin_file = folder / 'run_g1' / 'run_g1_imec1' / 'run_g1_t0.imec1.ap.bin'
+        create_spikeglx_file(bin_file, X[:, bounds[2]:] + 1, sync=np.zeros(bounds[3] - bounds[2], dtype='int64'))
+        os.utime(str(bin_file), ns=(0, 0))
+        events = se.SpikeGLXSessionRecordingExtractor(folder).get_sync_events(probe_id=1, lines=[6], cache=True)
+        self.assertTrue(np.array_equal(events[6]['rising'], np.arange(1000, 7000, 2000)))
+        RX_file = se.SpikeGLXRecordingExtractor(folder / 'run_g0' / 'run_g0_imec0' / 'run_g0_t0.imec0.ap.bin')
+        self.assertTrue(np.array_equal(RX_file.get_traces(), X[:, :3000]))
+        events = RX_file.get_sync_events(chunk_size=100)
+        self.assertTrue(np.array_equal(events[6]['rising'], [1000]))
+        self.assertTrue(np.array_equal(events[0]['rising'], [2990]))
+        self.assertEqual(len(events[0]['falling']), 0)
+
     def test_spykingcircus_extractor(self):
         path1 = self.test_dir + '/sc'
         se.SpykingCircusSortingExtractor.write_sorting(self.SX, path1)
@@ -283,6 +370,68 @@ class TestExtractors(unittest.TestCase):
         check_sortings_equal(self.SX, SX_spy)
         check_dumping(SX_spy)
 
+    def test_phy_extractor(self):
+        folder = Path(self.test_dir) / 'phy'
+        amplitudes, pc_features = create_phy_folder(folder, self.SX, cluster_groups={1: 'good', 2: 'noise'})
+        SX_phy = se.PhySortingExtractor(folder)
+        check_sorting_return_types(SX_phy)
+        check_sortings_equal(self.SX, SX_phy)
+        self.assertTrue(np.array_equal(SX_phy.get_unit_spike_train(2, start_frame=1000, end_frame=5000),
+                                       self.SX.get_unit_spike_train(2, start_frame=1000, end_frame=5000)))
+        self.assertEqual(SX_phy.get_units_property(property_name='quality'), ['good', 'noise', 'unsorted'])
+
+        spike_times = np.ravel(np.load(folder / 'spike_times.npy'))
+        spike_clusters = np.load(folder / 'spike_clusters.npy')
+        for unit_id in SX_phy.get_unit_ids():
+            in_range = (spike_clusters == unit_id) & (spike_times >= 1000) & (spike_times < 5000)
+            self.assertTrue(np.array_equal(SX_phy.get_unit_spike_features(unit_id, 'amplitudes'),
+                                           amplitudes[spike_clusters == unit_id]))
+            self.assertTrue(np.array_equal(SX_phy.get_unit_spike_features(unit_id, 'pc_features', start_frame=1000,
+                                                                          end_frame=5000),
+                                           pc_features[in_range]))
+
+        check_all_spike_trains(SX_phy)
+        # the features are in the contiguous feature store, so they are written with the sorting
+        self.assertEqual(sorted(SX_phy._feature_arrays.keys()), ['amplitudes', 'pc_features'])
+        path_nwb = self.test_dir + '/phy_sorting.nwb'
+        se.NwbSortingExtractor.write_sorting(sorting=SX_phy, save_path=path_nwb)
+        SX_nwb = se.NwbSortingExtractor(path_nwb, sampling_frequency=SX_phy.get_sampling_frequency())
+        for unit_id in SX_phy.get_unit_ids():
+            self.assertTrue(np.allclose(SX_nwb.get_unit_spike_features(unit_id, 'amplitudes'),
+                                        amplitudes[spike_clusters == unit_id]))
+
+        SX_phy_exclude = se.PhySortingExtractor(folder, exclude_cluster_groups=['noise'])
+        self.assertEqual(SX_phy_exclude.get_unit_ids(), [1, 3])
+        check_all_spike_trains(SX_phy_exclude)
+        self.assertTrue(np.array_equal(SX_phy_exclude.get_unit_spike_features(3, 'amplitudes'),
+                                       amplitudes[spike_clusters == 3]))
+
+        SX_phy_memmap = se.PhySortingExtractor(folder, memmap=True)
+        check_sortings_equal(SX_phy, SX_phy_memmap)
+        for unit_id in SX_phy.get_unit_ids():
+            for feature_name in ['amplitudes', 'pc_features']:
+                self.assertTrue(np.array_equal(SX_phy_memmap.get_unit_spike_features(unit_id, feature_name, 1000),
+                                               SX_phy.get_unit_spike_features(unit_id, feature_name, 1000)))
+        check_dumping(SX_phy_memmap)
+
+        # spikes not sorted in time in the files
+        folder = Path(self.test_dir) / 'phy_unsorted'
+        create_phy_folder(folder, self.SX)
+        order = np.random.RandomState(0).permutation(len(spike_times))
+        np.save(str(folder / 'spike_times.npy'), spike_times[order])
+        np.save(str(folder / 'spike_clusters.npy'), spike_clusters[order])
+        np.save(str(folder / 'amplitudes.npy'), amplitudes[order])
+        np.save(str(folder / 'pc_features.npy'), pc_features[order])
+        SX_phy_unsorted = se.PhySortingExtractor(folder)
+        check_sortings_equal(SX_phy, SX_phy_unsorted)
+        for unit_id in SX_phy.get_unit_ids():
+            # the features follow the spikes of the unit sorted in time
+            in_unit = spike_clusters[order] == unit_id
+            time_order = np.argsort(spike_times[order][in_unit], kind='stable')
+            for feature_name, values in [('amplitudes', amplitudes), ('pc_features', pc_features)]:
+                self.assertTrue(np.array_equal(SX_phy_unsorted.get_unit_spike_features(unit_id, feature_name),
+                                               values[order][in_unit][time_order]))
+
     def test_multi_sub_recording_extractor(self):
         RX_multi = se.MultiRecordingTimeExtractor(
             recordings=[self.RX, self.RX, self.RX],
@@ -371,7 +520,32 @@ class TestExtractors(unittest.TestCase):
         se.NwbSortingExtractor.write_sorting(sorting=self.SX, save_path=path2)
         SX_nwb = se.NwbSortingExtractor(path1)
         check_sortings_equal(self.SX, SX_nwb)
+        check_all_spike_trains(SX_nwb)
         check_dumping(SX_nwb)
+        # start_frame is inclusive and end_frame exclusive
+        train1 = self.example_info['train1']
+        for start_frame, end_frame in [(train1[10], train1[50]), (None, train1[5]), (train1[-5], None)]:
+            self.assertTrue(np.array_equal(SX_nwb.get_unit_spike_train(1, start_frame, end_frame),
+                                           self.SX.get_unit_spike_train(1, start_frame, end_frame)))
+        self.assertTrue(np.array_equal(SX_nwb.get_unit_spike_train(1, start_frame=train1[10])[0], train1[10]))
+        for unit_id, spike_train in zip([3, 2], SX_nwb.get_units_spike_train([3, 2], 2000, 6000)):
+            full_train = self.SX.get_unit_spike_train(unit_id)
+            self.assertTrue(np.array_equal(spike_train, full_train[(full_train >= 2000) & (full_train < 6000)]))
+
+        # chunked and compressed traces
+        path3 = self.test_dir + '/compressed.nwb'
+        se.NwbRecordingExtractor.write_recording(self.RX, path3, chunk_mb=0.01, chunk_shape=(1000, 2),
+                                                 compression='gzip', compression_opts=4, dtype='int32')
+        import h5py
+        with h5py.File(path3, 'r') as f:
+            data = f['acquisition/ElectricalSeries/data']
+            self.assertEqual(data.chunks, (1000, 2))
+            self.assertEqual(data.compression, 'gzip')
+            self.assertEqual(data.dtype, np.dtype('int32'))
+        RX_nwb = se.NwbRecordingExtractor(path3)
+        check_recordings_equal(self.RX, RX_nwb)
+        self.assertTrue(np.array_equal(RX_nwb.get_traces(channel_ids=[3, 0], start_frame=500, end_frame=2500),
+                                       self.RX.get_traces(channel_ids=[3, 0], start_frame=500, end_frame=2500)))
 
     def test_nixio_extractor(self):
         path1 = os.path.join(self.test_dir, 'raw.nix')
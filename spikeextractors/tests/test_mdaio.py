@@ -0,0 +1,75 @@
+import unittest
+import tempfile
+import shutil
+import os
+import threading
+import numpy as np
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from spikeextractors.extractors.mdaextractors.mdaio import DiskReadMda, RemoteBlockCache, writemda32
+import spikeextractors.extractors.mdaextractors.mdaio as mdaio
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    def do_GET(self):
+        path = self.translate_path(self.path)
+        with open(path, 'rb') as f:
+            data = f.read()
+        start, end = self.headers['Range'].split('=')[1].split('-')
+        if int(start) >= len(data):
+            self.send_error(416)
+            return
+        data = data[int(start):int(end) + 1]
+        self.send_response(206)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestMdaio(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.X = np.random.RandomState(0).randn(4, 5000).astype('float32')
+        writemda32(self.X, os.path.join(self.test_dir, 'raw.mda'))
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), partial(RangeRequestHandler, directory=self.test_dir))
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = 'http://127.0.0.1:{}/raw.mda'.format(self.server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.test_dir)
+
+    def test_remote_block_cache(self):
+        cache = RemoteBlockCache(block_size=4096, max_size=10 * 4096, num_prefetch=2)
+        mdaio._remote_block_cache = cache
+        try:
+            X = DiskReadMda(self.url)
+            assert X.dims() == [4, 5000]
+            for i in range(0, 5000, 300):
+                n = min(300, 5000 - i)
+                assert np.array_equal(X.readChunk(i1=0, i2=i, N1=4, N2=n), self.X[:, i:i + n])
+            # each block was downloaded once, and the oldest ones were evicted
+            num_blocks = (X._header.header_size + self.X.nbytes - 1) // 4096 + 1
+            assert cache.num_downloads == num_blocks
+            assert cache._size <= cache.max_size
+            chunk = X.readChunk(i1=0, i2=4900, N1=4, N2=100)
+            assert np.array_equal(chunk, self.X[:, 4900:])
+            assert chunk.flags.writeable
+            assert cache.num_downloads == num_blocks
+            # the evicted block files are removed, and the folder with clear()
+            cache_dir = cache._cache_dir
+            assert len(os.listdir(cache_dir)) == len(cache._blocks)
+            cache.clear()
+            assert not os.path.exists(cache_dir)
+            assert np.array_equal(X.readChunk(i1=0, i2=0, N1=4, N2=10), self.X[:, :10])
+        finally:
+            cache.clear()
+            mdaio._remote_block_cache = None
+
+
+if __name__ == '__main__':
+    unittest.main()
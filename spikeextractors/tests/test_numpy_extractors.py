@@ -1,5 +1,8 @@
 import numpy as np
 import unittest
+import tempfile
+import shutil
+from pathlib import Path
 import spikeextractors as se
 
 
@@ -46,6 +49,79 @@ class TestNumpyExtractors(unittest.TestCase):
         # get_snippets
         snippets = self.RX.get_snippets(reference_frames=[0, 30, 50], snippet_len=20)
         self.assertTrue(np.allclose(snippets[1], self._X[:, 20:40]))
+        # get_snippets - unsorted, out-of-bounds and small blocks
+        frames = [9995, 30, -1, 5, 50, 10000]
+        snippets = self.RX.get_snippets(reference_frames=frames, snippet_len=(10, 10), channel_ids=[1, 3],
+                                        chunk_mb=0.0001)
+        self.assertTrue(np.allclose(snippets[0, :, :15], self._X[[1, 3], 9985:]))
+        self.assertTrue(np.allclose(snippets[0, :, 15:], 0))
+        self.assertTrue(np.allclose(snippets[1], self._X[[1, 3], 20:40]))
+        self.assertTrue(np.allclose(snippets[2], 0))
+        self.assertTrue(np.allclose(snippets[3, :, :5], 0))
+        self.assertTrue(np.allclose(snippets[3, :, 5:], self._X[[1, 3], :15]))
+        self.assertTrue(np.allclose(snippets[4], self._X[[1, 3], 40:60]))
+        self.assertTrue(np.allclose(snippets[5], 0))
+        out = self.RX.allocate_array(memmap=True, shape=(len(frames), 2, 20), dtype=self._X.dtype)
+        out[:] = 1
+        snippets_out = self.RX.get_snippets(reference_frames=frames, snippet_len=(10, 10), channel_ids=[1, 3],
+                                            out=out)
+        self.assertTrue(snippets_out is out)
+        self.assertTrue(np.allclose(out, snippets))
+
+    def test_channel_ids_to_indices(self):
+        self.assertTrue(np.array_equal(self.RX.ids_to_indices([3, 0, 2]), [3, 0, 2]))
+        self.assertTrue(np.array_equal(self.RX.ids_to_indices(1), [1]))
+        with self.assertRaises(ValueError):
+            self.RX.ids_to_indices([0, 10])
+        sub_RX = se.SubRecordingExtractor(self.RX, channel_ids=[3, 1], renamed_channel_ids=[10, 20])
+        self.assertTrue(np.array_equal(sub_RX.ids_to_indices([20, 10]), [1, 0]))
+        # the index is cached until it is reset by the extractor changing its channel ids
+        sub_RX._renamed_channel_ids = [20, 10]
+        self.assertTrue(np.array_equal(sub_RX.ids_to_indices([20, 10]), [1, 0]))
+        sub_RX._reset_channel_index()
+        self.assertTrue(np.array_equal(sub_RX.ids_to_indices([20, 10]), [0, 1]))
+
+    def test_channel_properties(self):
+        self.RX.set_channels_property('quality', np.array([0.1, 0.2, 0.3, 0.4]))
+        self.RX.set_channels_property('label', ['a', 'bb'], channel_ids=[3, 1])
+        self.RX.set_channel_property(0, 'label', {'name': 'c'})
+        self.RX.set_channel_gains([0, 1, 2, 3], 2)
+        self.assertTrue(np.allclose(self.RX.get_channels_property('quality', [2, 0]), [0.3, 0.1]))
+        self.assertEqual(self.RX.get_channel_property(1, 'label'), 'bb')
+        self.assertEqual(self.RX.get_channel_property(0, 'label'), {'name': 'c'})
+        self.assertEqual(self.RX.get_channel_gains(), [2., 2., 2., 2.])
+        self.assertEqual(self.RX.get_channel_property_names(2), ['gain', 'group', 'location', 'quality'])
+        self.assertEqual(self.RX.get_shared_channel_property_names(), ['gain', 'group', 'location', 'quality'])
+        self.assertEqual(self.RX.get_shared_channel_property_names([0, 1, 3]),
+                         ['gain', 'group', 'label', 'location', 'quality'])
+        with self.assertRaises(RuntimeError):
+            self.RX.get_channels_property('label')
+        self.RX.set_channel_property(0, 'group', 5)
+        self.assertEqual(self.RX.get_channels_property('group', [0, 1]).tolist(), [5, 0])
+
+        sub_RX = se.SubRecordingExtractor(self.RX, channel_ids=[3, 0, 2], renamed_channel_ids=[10, 11, 12])
+        self.assertTrue(np.allclose(sub_RX.get_channels_property('quality'), [0.4, 0.1, 0.3]))
+        self.assertEqual(sub_RX.get_channel_property(10, 'label'), 'a')
+        self.assertEqual(sub_RX.get_channel_property_names(12), ['gain', 'group', 'location', 'quality'])
+        self.assertEqual(sub_RX.get_channel_groups().tolist(), [0, 5, 0])
+        self.assertTrue(np.allclose(sub_RX.get_channel_locations(), self._geom[[3, 0, 2]]))
+        # properties follow their channels when the channel ids are reordered
+        sub_RX._renamed_channel_ids = [12, 11, 10]
+        sub_RX._reset_channel_index()
+        self.assertEqual([sub_RX.get_channel_property(ch, 'quality') for ch in [10, 11, 12]], [0.4, 0.1, 0.3])
+        self.assertEqual(sub_RX.get_channel_property(10, 'label'), 'a')
+
+        # values are returned as they were set
+        self.RX.set_channel_property(2, 'position', [1, 2])
+        self.RX.set_channel_property(3, 'position', [3, 4])
+        self.RX.set_channel_property(2, 'count', 3)
+        self.assertEqual(self.RX.get_channel_property(2, 'position'), [1, 2])
+        self.assertIsInstance(self.RX.get_channel_property(2, 'count'), int)
+
+        self.RX.clear_channels_property('quality', [0, 1])
+        self.assertEqual(self.RX.get_channel_property_names(0), ['gain', 'group', 'label', 'location'])
+        self.RX.clear_channels_property('quality')
+        self.assertTrue('quality' not in self.RX.get_channel_property_names(3))
 
     def test_sorting_extractor(self):
         unit_ids = [1, 2, 3]
@@ -55,6 +131,129 @@ class TestNumpyExtractors(unittest.TestCase):
         st = self.SX.get_unit_spike_train(unit_id=1)
         self.assertTrue(np.allclose(st, self._train1))
 
+    def test_spike_vector(self):
+        unit_ids = self.SX.get_unit_ids()
+        spike_times, offsets = self.SX.get_all_spike_trains()
+        self.assertEqual(len(offsets), len(unit_ids) + 1)
+        for i, unit_id in enumerate(unit_ids):
+            self.assertTrue(np.array_equal(spike_times[offsets[i]:offsets[i + 1]],
+                                           self.SX.get_unit_spike_train(unit_id)))
+        spike_trains = self.SX.get_units_spike_train(unit_ids=[3, 1], start_frame=100, end_frame=5000)
+        self.assertTrue(np.array_equal(spike_trains[1], self.SX.get_unit_spike_train(1, 100, 5000)))
+        times, unit_indices = self.SX.to_spike_vector()
+        self.assertTrue(np.all(np.diff(times) >= 0))
+        self.assertEqual(np.sum(unit_indices == 0), len(self._train1))
+        # the cache is reset when units are added
+        self.SX.add_unit(unit_id=4, times=np.arange(5))
+        spike_times, offsets = self.SX.get_all_spike_trains()
+        self.assertTrue(np.array_equal(spike_times[offsets[3]:offsets[4]], np.arange(5)))
+        # spike trains changed under the same unit ids are not stale
+        self.SX.add_unit(unit_id=4, times=np.arange(5) + 5)
+        self.assertTrue(np.array_equal(self.SX.get_units_spike_train(unit_ids=[4])[0], np.arange(5) + 5))
+        spike_times, offsets = self.SX.get_all_spike_trains()
+        self.assertTrue(np.array_equal(spike_times[offsets[3]:offsets[4]], np.arange(5) + 5))
+
+        times, unit_indices = self.SX.to_spike_vector()
+        self.assertEqual(len(times), 3 * len(self._train1) + 5)
+
+        test_dir = Path(tempfile.mkdtemp())
+        se.NpzSortingExtractor.write_sorting(self.SX, test_dir / 'sorting.npz')
+        SX = se.NpzSortingExtractor(test_dir / 'sorting.npz')
+        self.assertTrue(np.array_equal(SX.to_spike_vector()[0], times))
+        spike_times, offsets = SX.get_all_spike_trains()
+        for i, unit_id in enumerate(SX.get_unit_ids()):
+            self.assertTrue(np.array_equal(spike_times[offsets[i]:offsets[i + 1]], SX.get_unit_spike_train(unit_id)))
+        shutil.rmtree(test_dir)
+
+    def test_spike_train_range(self):
+        train = np.array([5, 1, 3, 3, 9])
+        sorted_train = se.extraction_tools.sort_spike_train(train)
+        self.assertEqual(sorted_train.tolist(), [1, 3, 3, 5, 9])
+        self.assertTrue(se.extraction_tools.sort_spike_train(sorted_train) is sorted_train)
+        self.assertEqual(se.extraction_tools.get_spike_train_range(sorted_train, 3, 9).tolist(), [3, 3, 5])
+        self.assertEqual(se.extraction_tools.get_spike_train_range(sorted_train, end_frame=0).tolist(), [])
+        self.assertTrue(se.extraction_tools.get_spike_train_range(sorted_train) is sorted_train)
+        # sorted and unsorted trains give the same spikes
+        self.SX.add_unit(unit_id=4, times=np.sort(self._train1))
+        self.assertTrue(np.array_equal(self.SX.get_unit_spike_train(4, 100, 5000),
+                                       np.sort(self.SX.get_unit_spike_train(1, 100, 5000))))
+
+    def test_unit_properties(self):
+        self.SX.set_units_property(property_name='snr', values=[5., 6., 7.])
+        self.SX.set_units_property(unit_ids=[3, 1], property_name='quality', values=['good', 'noise'])
+        self.SX.set_unit_property(2, 'template', np.zeros((2, 3)))
+        self.assertTrue(np.allclose(self.SX.get_units_property(unit_ids=[3, 1], property_name='snr'), [7., 5.]))
+        self.assertEqual(self.SX.get_unit_property(1, 'quality'), 'noise')
+        self.assertEqual(self.SX.get_unit_property_names(2), ['snr', 'template'])
+        self.assertEqual(self.SX.get_shared_unit_property_names([1, 3]), ['quality', 'snr'])
+        with self.assertRaises(ValueError):
+            self.SX.get_units_property(property_name='quality')
+
+        table = self.SX.get_units_property_table(unit_ids=[3, 1])
+        self.assertEqual(table.dtype.names, ('unit_id', 'quality', 'snr'))
+        self.assertEqual(table['unit_id'].tolist(), [3, 1])
+        self.assertEqual(table['quality'].tolist(), ['good', 'noise'])
+
+        # properties follow their units when units are added
+        self.SX.add_unit(unit_id=0, times=np.arange(10))
+        self.assertEqual(self.SX.get_unit_property_names(0), [])
+        self.assertTrue(np.allclose(self.SX.get_units_property(unit_ids=[1, 2, 3], property_name='snr'),
+                                    [5., 6., 7.]))
+
+        sub_SX = se.SubSortingExtractor(self.SX, unit_ids=[3, 2], renamed_unit_ids=[30, 20])
+        self.assertTrue(np.allclose(sub_SX.get_units_property(property_name='snr'), [7., 6.]))
+        self.assertEqual(sub_SX.get_unit_property(30, 'quality'), 'good')
+        self.assertEqual(sub_SX.get_unit_property(20, 'template').shape, (2, 3))
+
+        self.SX.clear_units_property('snr')
+        self.assertEqual(self.SX.get_unit_property_names(1), ['quality'])
+
+        # values are returned as they were set
+        self.SX.set_unit_property(1, 'peak', [1, 2])
+        self.SX.set_unit_property(3, 'peak', [3, 4])
+        self.SX.set_unit_property(1, 'count', 3)
+        self.assertEqual(self.SX.get_unit_property(1, 'peak'), [1, 2])
+        self.assertEqual(self.SX.get_units_property(unit_ids=[1, 3], property_name='peak'), [[1, 2], [3, 4]])
+        self.assertIsInstance(self.SX.get_unit_property(1, 'count'), int)
+
+    def test_units_spike_features(self):
+        test_dir = Path(tempfile.mkdtemp())
+        se.NpzSortingExtractor.write_sorting(self.SX, test_dir / 'sorting.npz')
+        SX = se.NpzSortingExtractor(test_dir / 'sorting.npz')
+        unit_ids = SX.get_unit_ids()
+        labels = np.concatenate([[u] * len(SX.get_unit_spike_train(u)) for u in unit_ids])
+        features = np.arange(2 * len(labels)).reshape(-1, 2)
+        # features in the spike train order of each unit, with the units interleaved
+        shuffled_labels = labels[np.random.RandomState(0).permutation(len(labels))]
+        shuffled_features = np.zeros_like(features)
+        for unit_id in unit_ids:
+            shuffled_features[shuffled_labels == unit_id] = features[labels == unit_id]
+        SX.set_units_spike_features('feat', shuffled_features, spike_labels=shuffled_labels, memmap=True)
+        for unit_id in unit_ids:
+            self.assertTrue(np.array_equal(SX.get_unit_spike_features(unit_id, 'feat'), features[labels == unit_id]))
+        train = SX.get_unit_spike_train(2)
+        sf, ef = np.sort(train)[[20, 120]]
+        self.assertTrue(np.array_equal(SX.get_unit_spike_features(2, 'feat', start_frame=sf, end_frame=ef),
+                                       features[labels == 2][(train >= sf) & (train < ef)]))
+        SX.set_unit_spike_features(1, 'feat', np.zeros((len(SX.get_unit_spike_train(1)), 2)))
+        # features of some spikes, on sorted (Npz) and unsorted (Numpy) spike trains
+        for sorting, unit_id in [(SX, 3), (self.SX, 1)]:
+            train = sorting.get_unit_spike_train(unit_id)
+            idxs = np.arange(0, len(train), 3)
+            sorting.set_unit_spike_features(unit_id, 'partial', idxs * 10, indexes=idxs[::-1].copy())
+            in_range = (train[np.sort(idxs)] >= 2000) & (train[np.sort(idxs)] < 6000)
+            self.assertTrue(np.array_equal(sorting.get_unit_spike_features(unit_id, 'partial', 2000, 6000),
+                                           (idxs * 10)[::-1][in_range]))
+
+        SX.dump_to_pickle(test_dir / 'sorting.pkl')
+        self.assertTrue((test_dir / 'sorting_features' / 'feat.npy').is_file())
+        SX_loaded = se.load_extractor_from_pickle(test_dir / 'sorting.pkl')
+        self.assertTrue(isinstance(SX_loaded.get_unit_spike_features(3, 'feat'), np.memmap))
+        self.assertTrue(np.array_equal(SX_loaded.get_unit_spike_features(3, 'feat'), features[labels == 3]))
+        self.assertTrue(np.allclose(SX_loaded.get_unit_spike_features(1, 'feat'), 0))
+        del SX_loaded
+        shutil.rmtree(test_dir)
+
 
 if __name__ == '__main__':
     unittest.main()
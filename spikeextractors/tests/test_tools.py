@@ -54,6 +54,30 @@ class TestTools(unittest.TestCase):
         assert len(np.unique(RX_loaded_no_groups.get_channel_groups())) == 1
         assert len(np.unique(RX_loaded_groups.get_channel_groups())) == RX.get_num_channels() // n_group
 
+    def test_iter_traces(self):
+        nb_sample = self.RX.get_num_frames()
+
+        chunks = list(self.RX.iter_traces(chunk_size=999))
+        assert len(chunks) == nb_sample // 999 + 1
+        assert chunks[0][:2] == (0, 999)
+        assert chunks[-1][:2] == (nb_sample // 999 * 999, nb_sample)
+        assert np.allclose(np.concatenate([traces for _, _, traces in chunks], axis=1), self.RX.get_traces())
+
+        margin = 10
+        for start_frame, end_frame, traces in self.RX.iter_traces(chunk_size=999, margin=margin, channel_ids=[1, 5]):
+            assert traces.shape == (2, end_frame - start_frame + 2 * margin)
+            assert np.allclose(traces[:, margin:margin + end_frame - start_frame],
+                               self._X[[1, 5], start_frame:end_frame])
+            if start_frame == 0:
+                assert np.allclose(traces[:, :margin], 0)
+            else:
+                assert np.allclose(traces[:, :margin], self._X[[1, 5], start_frame - margin:start_frame])
+            if end_frame == nb_sample:
+                assert np.allclose(traces[:, -margin:], 0)
+
+        chunks = list(self.RX.iter_traces())
+        assert len(chunks) == 1
+
     def test_write_dat_file(self):
         nb_sample = self.RX.get_num_frames()
         nb_chan = self.RX.get_num_channels()
@@ -88,5 +112,96 @@ class TestTools(unittest.TestCase):
         assert np.allclose(data, self.RX.get_traces())
         del (data)  # this close the file
 
+        # time_axis=0 chunk_size=99 n_jobs=4
+        self.RX.write_to_binary_dat_format(self.test_dir + 'rec.dat', time_axis=0, dtype='float32', chunk_size=99,
+                                           n_jobs=4)
+        data = np.memmap(open(self.test_dir + 'rec.dat'), dtype='float32', mode='r', shape=(nb_sample, nb_chan)).T
+        assert np.allclose(data, self.RX.get_traces())
+        del (data)  # this close the file
+
+        # file_handle with header n_jobs=3
+        header = b'header'
+        with open(self.test_dir + 'rec.dat', 'wb') as f:
+            f.write(header)
+            se.write_to_binary_dat_format(self.RX, file_handle=f, dtype='int16', chunk_size=1000, n_jobs=3)
+            f.write(header)
+        data = np.memmap(open(self.test_dir + 'rec.dat'), dtype='int16', mode='r', offset=len(header),
+                         shape=(nb_sample, nb_chan)).T
+        assert np.array_equal(data, self.RX.get_traces().astype('int16'))
+        del (data)  # this close the file
+        with open(self.test_dir + 'rec.dat', 'rb') as f:
+            assert f.read().endswith(header)
+
+    def test_memmap_h5_dataset(self):
+        import h5py
+        with h5py.File(self.test_dir + '/rec.h5', 'w') as f:
+            f.create_dataset('contiguous', data=self._X)
+            f.create_dataset('chunked', data=self._X, chunks=(4, 1000))
+        with h5py.File(self.test_dir + '/rec.h5', 'r') as f:
+            data = se.memmap_h5_dataset(f['contiguous'])
+            assert isinstance(data, np.ndarray)
+            assert np.array_equal(data[[5, 1, 3], 100:200], self._X[[5, 1, 3], 100:200])
+            # copy-on-write: the array is writable and the file is not modified
+            data[0] += 1
+            assert np.array_equal(f['contiguous'][0], self._X[0])
+            assert isinstance(se.memmap_h5_dataset(f['chunked']), h5py.Dataset)
+            del data
+
+    def test_read_channel_traces(self):
+        import h5py
+        with h5py.File(self.test_dir + '/rec.h5', 'w') as f:
+            f.create_dataset('traces', data=self._X, chunks=(4, 1000))
+            f.create_dataset('traces_t', data=self._X.T, chunks=(1000, 4))
+        with h5py.File(self.test_dir + '/rec.h5', 'r') as f:
+            for channel_idxs in [[3, 4, 5], [0, 4, 8, 12], [31, 1, 1, 20, 21, 2], []]:
+                for request_cost in [0, 2 ** 16, 2 ** 30]:
+                    traces = se.read_channel_traces(f['traces'], channel_idxs, 100, 2100, request_cost=request_cost)
+                    assert np.array_equal(traces, self._X[channel_idxs, 100:2100])
+                    traces = se.read_channel_traces(f['traces_t'], channel_idxs, 100, 2100, time_axis=0,
+                                                    request_cost=request_cost)
+                    assert np.array_equal(traces, self._X[channel_idxs, 100:2100])
+
+    def test_extract_unit_waveforms(self):
+        SX = se.NumpySortingExtractor()
+        nb_sample = self.RX.get_num_frames()
+        SX.add_unit(1, np.array([3, 500, 2000, 5000, nb_sample - 5]))
+        SX.add_unit(2, np.arange(100, 9000, 100))
+        self.RX.set_channel_groups([i // 8 for i in range(self.RX.get_num_channels())])
+        SX.set_units_property(property_name='group', values=[0, 3])
+
+        for kwargs in [dict(chunk_size=1000), dict(chunk_size=999, n_jobs=3, memmap=True)]:
+            waveforms = se.extract_unit_waveforms(self.RX, SX, snippet_len=(10, 20), **kwargs)
+            for unit_id, wf in zip(SX.get_unit_ids(), waveforms):
+                assert np.allclose(wf, self.RX.get_snippets(SX.get_unit_spike_train(unit_id), (10, 20)))
+
+        waveforms, spike_idxs, channel_ids = se.extract_unit_waveforms(self.RX, SX, snippet_len=20,
+                                                                       grouping_property='group',
+                                                                       unit_channel_ids={2: [5, 1]},
+                                                                       max_spikes_per_unit=10, return_idxs=True)
+        assert waveforms[0].shape == (5, 8, 20)
+        assert waveforms[1].shape == (10, 2, 20)
+        assert channel_ids == [list(range(8)), [5, 1]]
+        spike_train = SX.get_unit_spike_train(2)[spike_idxs[1]]
+        assert np.allclose(waveforms[1], self.RX.get_snippets(spike_train, 20, channel_ids=[5, 1]))
+
+    def test_compute_unit_templates(self):
+        SX = se.NumpySortingExtractor()
+        SX.add_unit(1, np.arange(50, 9900, 37))
+        SX.add_unit(2, np.array([5, 300, 9990]))
+        waveforms = se.extract_unit_waveforms(self.RX, SX, snippet_len=(10, 20))
+        templates = se.compute_unit_templates(self.RX, SX, snippet_len=(10, 20), mode=['mean', 'std', 'median'],
+                                              chunk_size=500, n_jobs=2)
+        for i, unit_id in enumerate(SX.get_unit_ids()):
+            assert np.allclose(templates['mean'][i], np.mean(waveforms[i], axis=0))
+            assert np.allclose(templates['std'][i], np.std(waveforms[i], axis=0))
+            assert np.allclose(templates['median'][i], np.median(waveforms[i], axis=0))
+            assert np.allclose(SX.get_unit_property(unit_id, 'template'), templates['mean'][i])
+            assert 'template_std' in SX.get_unit_property_names(unit_id)
+
+        # the median is computed on a reservoir of spikes
+        median = se.compute_unit_templates(self.RX, SX, snippet_len=(10, 20), mode='median',
+                                           max_spikes_for_median=10, save_as_property=False)
+        assert median[0].shape == (self.RX.get_num_channels(), 30)
+
 if __name__ == '__main__':
     unittest.main()
@@ -58,6 +58,16 @@ def check_sorting_return_types(SX):
         assert (all(isinstance(x, int) or isinstance(x, np.integer) for x in train))
 
 
+def check_all_spike_trains(SX):
+    # the CSR spike trains follow get_unit_ids() and the spike vector is computed once
+    spike_times, offsets = SX.get_all_spike_trains()
+    for i, unit_id in enumerate(SX.get_unit_ids()):
+        assert np.array_equal(spike_times[offsets[i]:offsets[i + 1]], SX.get_unit_spike_train(unit_id))
+    spike_vector = SX.to_spike_vector()
+    assert np.all(np.diff(spike_vector[0]) >= 0)
+    assert SX.to_spike_vector() is spike_vector
+
+
 def check_sortings_equal(SX1, SX2):
     # get_unit_ids
     ids1 = np.sort(np.array(SX1.get_unit_ids()))
@@ -142,3 +152,56 @@ def check_dumping(extractor):
         os.remove('spikeinterface_recording.pkl')
     if Path('spikeinterface_sorting.pkl').is_file():
         os.remove('spikeinterface_sorting.pkl')
+
+
+def create_spikeglx_file(bin_file, traces, sync=None, sampling_frequency=30000.):
+    # writes a minimal imec .ap.bin/.meta pair: 'traces' are the AP channels and 'sync' the optional sync channel
+    bin_file = Path(bin_file)
+    bin_file.parent.mkdir(parents=True, exist_ok=True)
+    num_channels, num_frames = traces.shape
+    data = traces if sync is None else np.vstack((traces, sync))
+    data.T.astype('int16').tofile(str(bin_file))
+    meta = {'typeThis': 'imec', 'imSampRate': sampling_frequency, 'imAiRangeMax': 0.6,
+            'nSavedChans': data.shape[0], 'fileSizeBytes': data.size * 2, 'snsSaveChanSubset': 'all',
+            'snsApLfSy': '{},0,{}'.format(num_channels, int(sync is not None)),
+            'imroTbl': '(0,{})'.format(num_channels) + ''.join('({} 0 0 500 250)'.format(ch)
+                                                               for ch in range(num_channels)),
+            'snsShankMap': '(1,2,480)' + ''.join('(0:{}:{}:1)'.format(ch % 2, ch) for ch in range(num_channels))}
+    with bin_file.with_suffix('.meta').open('w') as f:
+        for key, value in meta.items():
+            f.write('{}={}\n'.format(key, value))
+
+
+def create_phy_folder(folder, sorting, cluster_groups=None, num_pcs=3, num_channels=4, seed=0):
+    # writes a minimal phy output folder from a sorting: spikes in time order, one template per unit, random
+    # amplitudes and pc features. Returns the amplitudes and pc features (in the order of the spikes)
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    unit_ids = sorting.get_unit_ids()
+    spike_trains = [np.asarray(sorting.get_unit_spike_train(u), dtype='uint64') for u in unit_ids]
+    spike_times = np.concatenate(spike_trains)
+    spike_clusters = np.repeat(np.asarray(unit_ids, dtype='int32'), [len(st) for st in spike_trains])
+    order = np.argsort(spike_times, kind='stable')
+    spike_times = spike_times[order]
+    spike_clusters = spike_clusters[order]
+    random_state = np.random.RandomState(seed=seed)
+    amplitudes = random_state.uniform(0, 1, len(spike_times))
+    pc_features = random_state.normal(0, 1, (len(spike_times), num_pcs, num_channels)).astype('float32')
+    np.save(str(folder / 'spike_times.npy'), spike_times[:, np.newaxis])
+    np.save(str(folder / 'spike_clusters.npy'), spike_clusters)
+    np.save(str(folder / 'spike_templates.npy'), spike_clusters)
+    np.save(str(folder / 'amplitudes.npy'), amplitudes)
+    np.save(str(folder / 'pc_features.npy'), pc_features)
+    if cluster_groups is not None:
+        with (folder / 'cluster_group.tsv').open('w') as f:
+            f.write('cluster_id\tgroup\n')
+            for unit_id, group in cluster_groups.items():
+                f.write('{}\t{}\n'.format(unit_id, group))
+    with (folder / 'params.py').open('w') as f:
+        f.write("dat_path = r'{}'\n".format(folder / 'recording.dat'))
+        f.write('n_channels_dat = {}\n'.format(num_channels))
+        f.write("dtype = 'int16'\n")
+        f.write('offset = 0\n')
+        f.write('sample_rate = {}\n'.format(float(sorting.get_sampling_frequency())))
+        f.write('hp_filtered = False\n')
+    return amplitudes, pc_features